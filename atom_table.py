@@ -0,0 +1,284 @@
+"""
+Table editor of the atoms of a structure
+
+AtomTableModel presents a structure.Structure to a QTableView without copying
+it: each cell is read from, and edited in, the structure's arrays, so the
+model holds no per-atom Python objects and the view only asks for the rows it
+paints.  Edits are made through the QuantumEspressoInputFile, so that they are
+undone and journaled like the inputs, and are reported as ranges of rows.
+"""
+
+from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QTableView, QVBoxLayout, QWidget)
+from PyQt5.QtCore import (QAbstractTableModel, QModelIndex, Qt, pyqtSignal)
+
+import numpy as np
+
+from qe_input import ATOM_NAME, UNITS_NAME, atom_row
+from structure import UNITS
+
+
+
+COLUMNS = ("Species", "x", "y", "z", "Move x", "Move y", "Move z")
+
+#first column of the coordinates, and of the if_pos flags
+POSITION_COLUMN = 1
+IF_POS_COLUMN = 4
+
+#height in pixels of every row; a fixed height lets the view skip measuring rows
+ROW_HEIGHT = 22
+
+
+
+class AtomTableModel(QAbstractTableModel):
+    """
+    This class is a table model over the arrays of the Structure of a QuantumEspressoInputFile
+    """
+
+    #emitted with the first and last row of each edit
+    atoms_changed = pyqtSignal(int, int)
+
+    #emitted with the name under which the input file records each edit, as qe_input.ATOM_NAME or UNITS_NAME
+    value_changed = pyqtSignal(str)
+
+    def __init__(self, input_file, parent = None):
+        super(AtomTableModel, self).__init__(parent)
+
+        self.input_file = input_file
+        self.structure = input_file.structure
+
+    def rowCount(self, parent = QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return self.structure.nat
+
+    def columnCount(self, parent = QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return len(COLUMNS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Vertical:
+            return section + 1
+
+        if POSITION_COLUMN <= section < IF_POS_COLUMN:
+            return COLUMNS[section] + " (" + self.structure.units + ")"
+
+        return COLUMNS[section]
+
+    def flags(self, index):
+
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        if index.column() >= IF_POS_COLUMN:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role = Qt.DisplayRole):
+
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        column = index.column()
+        structure = self.structure
+
+        if column == 0:
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return structure.species[ structure.types[row] ].name
+
+        elif column < IF_POS_COLUMN:
+            value = float( structure.positions[row, column - POSITION_COLUMN] )
+            if role == Qt.DisplayRole:
+                return "%.8f" % value
+            if role == Qt.EditRole:
+                return value
+            if role == Qt.TextAlignmentRole:
+                return Qt.AlignRight | Qt.AlignVCenter
+
+        elif role == Qt.CheckStateRole:
+            if structure.if_pos is None or structure.if_pos[row, column - IF_POS_COLUMN]:
+                return Qt.Checked
+            return Qt.Unchecked
+
+        return None
+
+    def setData(self, index, value, role = Qt.EditRole):
+
+        if not index.isValid():
+            return False
+
+        row = index.row()
+        column = index.column()
+        structure = self.structure
+
+        #the atom's line of Structure.atom_text(): units, species, position and if_pos flags
+        parts = structure.atom_text(row).split()
+
+        if column == 0 and role == Qt.EditRole:
+            if str(value) not in [ s.name for s in structure.species ]:
+                return False
+            parts[1] = str(value)
+
+        elif column < IF_POS_COLUMN and role == Qt.EditRole:
+            try:
+                parts[1 + column] = repr( float(value) )
+            except (TypeError, ValueError):
+                return False
+
+        elif column >= IF_POS_COLUMN and role == Qt.CheckStateRole:
+            parts[1 + column] = "1" if value == Qt.Checked else "0"
+
+        else:
+            return False
+
+        self.input_file.set_atom( row, " ".join(parts) )
+
+        self.dataChanged.emit(index, index, [role])
+        self.atoms_changed.emit(row, row)
+        self.value_changed.emit(ATOM_NAME % row)
+
+        return True
+
+    def set_positions(self, first, positions):
+        """
+        Replace the positions of the atoms from row first onwards, in the current units
+        """
+
+        positions = np.asarray(positions, dtype = np.float64).reshape(-1, 3)
+        last = first + len(positions) - 1
+        if first < 0 or last >= self.structure.nat:
+            raise IndexError('Rows out of range: ' + str(first) + " to " + str(last))
+
+        #the rows are set as one step of the history
+        history = self.input_file.history
+        if history is not None:
+            history.begin_group()
+        try:
+            for row, position in enumerate(positions.tolist(), first):
+                parts = self.structure.atom_text(row).split()
+                parts[2:5] = [ repr(v) for v in position ]
+                self.input_file.set_atom( row, " ".join(parts) )
+        finally:
+            if history is not None:
+                history.end_group()
+
+        self.emit_rows_changed(first, last)
+        for row in range(first, last + 1):
+            self.value_changed.emit(ATOM_NAME % row)
+
+    def set_units(self, units):
+        """
+        Convert the positions of the structure to other units
+        """
+
+        if units == self.structure.units:
+            return
+
+        self.input_file.set_position_units(units)
+
+        self.show_change(UNITS_NAME)
+        self.value_changed.emit(UNITS_NAME)
+
+    def show_change(self, name):
+        """
+        Show a change to the structure made by the input file, such as by undo, given the name it recorded it by
+        """
+
+        if name == UNITS_NAME:
+            self.headerDataChanged.emit(Qt.Horizontal, POSITION_COLUMN, IF_POS_COLUMN - 1)
+            self.emit_rows_changed(0, self.structure.nat - 1)
+        else:
+            row = atom_row(name)
+            self.emit_rows_changed(row, row)
+
+    def set_structure(self, structure):
+
+        self.beginResetModel()
+        self.structure = structure
+        self.endResetModel()
+
+        self.atoms_changed.emit(0, structure.nat - 1)
+
+    def emit_rows_changed(self, first, last):
+
+        if last < first:
+            return
+
+        self.dataChanged.emit( self.index(first, 0), self.index(last, len(COLUMNS) - 1) )
+        self.atoms_changed.emit(first, last)
+
+
+
+class AtomEditor(QWidget):
+    """
+    This class is a widget holding the table of atoms and the units of their positions
+    """
+
+    def __init__(self, input_file, parent = None):
+        super(AtomEditor, self).__init__(parent)
+
+        self.model = AtomTableModel(input_file, self)
+
+        self.units = QComboBox()
+        for units in UNITS:
+            self.units.addItem(units, units)
+        self.show_units()
+        self.units.currentIndexChanged.connect(self.on_units_changed)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+
+        #rows of one fixed height, so that only the visible rows are ever measured or painted
+        header = self.view.verticalHeader()
+        header.setSectionResizeMode(QHeaderView.Fixed)
+        header.setDefaultSectionSize(ROW_HEIGHT)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+
+        units_layout = QHBoxLayout()
+        units_layout.addWidget( QLabel("Position Units:") )
+        units_layout.addWidget(self.units)
+        units_layout.addStretch()
+
+        self.layout = QVBoxLayout(self)
+        self.layout.addLayout(units_layout)
+        self.layout.addWidget(self.view)
+
+    def set_structure(self, structure):
+
+        self.model.set_structure(structure)
+        self.show_units()
+
+    def show_change(self, name):
+        """
+        Show a change to the structure made by the input file, given the name it recorded it by
+        """
+
+        self.model.show_change(name)
+        if name == UNITS_NAME:
+            self.show_units()
+
+    def show_units(self):
+        """
+        Show the units of the structure's positions, without converting them
+        """
+
+        self.units.blockSignals(True)
+        self.units.setCurrentIndex( self.units.findData(self.model.structure.units) )
+        self.units.blockSignals(False)
+
+    def on_units_changed(self, index):
+
+        try:
+            self.model.set_units( self.units.itemData(index) )
+        except ValueError: #such as crystal coordinates without a cell
+            self.show_units()
@@ -0,0 +1,352 @@
+"""
+Crash-safe autosave of the form
+
+Autosave keeps a journal of the inputs of a QuantumEspressoInputFile, of the
+edits made to its structure, and of the groups opened in the form.  The UI thread only notes which inputs changed, in a
+dictionary under a lock; a background thread appends the changes as one JSON
+line per batch, with a single fsync per batch, and periodically compacts the
+journal into a snapshot of the whole state.  A journal left behind by a crash
+is replayed by read_journal(), which ignores a last line torn by the crash.
+
+Each input file has its own journal, named after its path and modification time,
+and a new form has another, so a journal is only restored into the form of the
+input it was written for.  A session locks its journal, so that a second window
+on the same input neither restores nor appends to it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from history import MISSING
+from qe_input import UNITS_NAME, is_structure_name
+from schema import cache_directory
+
+
+
+#seconds the writer waits after a change for further changes, so that they share one write and fsync
+BATCH_INTERVAL = 0.5
+
+#number of appended records after which the journal is compacted into a snapshot
+COMPACT_RECORDS = 1000
+
+#lock files of the journals locked by this process, by journal path
+_locks = {}
+
+
+
+def journal_path(input_path = None):
+    """
+    Return the path of the journal of the form of the pw.x input at input_path, or of a new form
+
+    An input modified since its journal was written has a new journal, so that changes made to
+    the old file are not restored into the new one.
+    """
+
+    if input_path is None:
+        name = "new"
+    else:
+        path = os.path.abspath(input_path)
+        source = "%s\0%r" % ( path, os.path.getmtime(path) )
+        name = hashlib.sha1( source.encode("utf-8") ).hexdigest()[:16]
+
+    return os.path.join( cache_directory(), "autosave-" + name + ".journal" )
+
+def lock_journal(path):
+    """
+    Lock the journal at path for this process, and return whether it was free
+
+    The lock is released by unlock_journal(), or when the process exits.
+    """
+
+    if path in _locks:
+        return True
+
+    os.makedirs( os.path.dirname( os.path.abspath(path) ), exist_ok = True )
+    f = open(path + ".lock", "a")
+
+    try:
+        import fcntl
+    except ImportError: #no advisory locks, as on Windows; sessions of one input share its journal
+        _locks[path] = f
+        return True
+
+    try:
+        fcntl.flock( f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB )
+    except OSError: #held by another session
+        f.close()
+        return False
+
+    _locks[path] = f
+    return True
+
+def unlock_journal(path):
+
+    f = _locks.pop(path, None)
+    if f is not None:
+        f.close()
+
+
+
+class Autosave():
+    """
+    This class appends the changes to the inputs and open groups of a form to a journal, on a background thread
+    """
+
+    def __init__(self, input_file, path = None, groups = (), batch_interval = BATCH_INTERVAL,
+                 compact_records = COMPACT_RECORDS):
+
+        self.path = path or journal_path()
+        self.batch_interval = batch_interval
+        self.compact_records = compact_records
+
+        #changes noted by the UI thread and not yet written, guarded by self.condition
+        self.condition = threading.Condition()
+        self.pending_inputs = {}
+        self.pending_groups = []
+        self.stopping = False
+
+        #state as written to the journal, owned by the writer thread; compaction writes it
+        #out whole without reading the live inputs
+        self.inputs = { name: value for name, value in input_file.inputs.items() if name not in input_file.defaults }
+        self.inputs.update(input_file.structure_changes)
+        self.groups = list(groups)
+
+        #records appended since the last compaction, and fsyncs made, by the writer thread
+        self.records = 0
+        self.syncs = 0
+
+        #the first error the writer met; autosave stops, but the form carries on
+        self.error = None
+
+        self.stream = None
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target = self.run, name = "autosave", daemon = True)
+        self.thread.start()
+
+    def note_input(self, name, value):
+        """
+        Note that an input has changed; value is MISSING if the input was removed
+        """
+
+        with self.condition:
+            self.pending_inputs[name] = value
+            self.condition.notify()
+
+    def note_inputs(self, inputs):
+        """
+        Note the current value of every input of a dictionary
+        """
+
+        with self.condition:
+            self.pending_inputs.update(inputs)
+            self.condition.notify()
+
+    def note_groups(self, group_names):
+        """
+        Note that groups have been opened
+        """
+
+        with self.condition:
+            self.pending_groups.extend(group_names)
+            self.condition.notify()
+
+    def close(self, discard = False):
+        """
+        Write any pending changes and stop the writer; if discard is True, remove the journal
+        """
+
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+        self.stopped.set()
+        self.thread.join()
+
+        if discard:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+        unlock_journal(self.path)
+
+    def run(self):
+
+        try:
+            os.makedirs( os.path.dirname( os.path.abspath(self.path) ), exist_ok = True )
+            self.compact()
+
+            while True:
+
+                with self.condition:
+                    while not ( self.pending_inputs or self.pending_groups or self.stopping ):
+                        self.condition.wait()
+                    stopping = self.stopping
+
+                #let a burst of changes accumulate, so that it costs one write and one fsync
+                if not stopping:
+                    self.stopped.wait(self.batch_interval)
+
+                with self.condition:
+                    inputs, self.pending_inputs = self.pending_inputs, {}
+                    groups, self.pending_groups = self.pending_groups, []
+                    stopping = self.stopping
+
+                if inputs or groups:
+                    self.append(inputs, groups)
+
+                if stopping:
+                    break
+
+                if self.records >= self.compact_records:
+                    self.compact()
+
+        except (OSError, TypeError, ValueError) as error:
+            self.error = error
+
+        finally:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+    def append(self, inputs, groups):
+        """
+        Append one record of changes to the journal
+        """
+
+        record = { "set": {}, "unset": [] }
+
+        for name, value in inputs.items():
+            if value is MISSING:
+                record["unset"].append(name)
+                self.inputs.pop(name, None)
+            else:
+                record["set"][name] = value
+                self.inputs[name] = value
+
+        groups = [ name for name in groups if name not in self.groups ]
+        if groups:
+            record["groups"] = groups
+            self.groups.extend(groups)
+
+        self.write( json.dumps(record) )
+        self.records += 1
+
+    def compact(self):
+        """
+        Replace the journal with a single snapshot of the state written so far
+        """
+
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        record = { "reset": True, "set": self.inputs, "unset": [], "groups": self.groups }
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding = "utf-8") as f:
+            f.write( json.dumps(record) + "\n" )
+            f.flush()
+            os.fsync( f.fileno() )
+        os.replace(temp_path, self.path)
+        sync_directory(self.path)
+
+        self.syncs += 1
+        self.records = 0
+
+        self.stream = open(self.path, "a", encoding = "utf-8")
+
+    def write(self, line):
+
+        self.stream.write(line + "\n")
+        self.stream.flush()
+        os.fsync( self.stream.fileno() )
+        self.syncs += 1
+
+def sync_directory(path):
+    """
+    Make a rename within the directory of path durable, where the platform allows it
+    """
+
+    try:
+        fd = os.open( os.path.dirname( os.path.abspath(path) ), os.O_RDONLY )
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+
+def read_journal(path = None):
+    """
+    Replay a journal, and return the inputs and the names of the open groups it records,
+    or None if there is no journal
+
+    A last line cut short by a crash is ignored.
+    """
+
+    path = path or journal_path()
+
+    try:
+        f = open(path, "r", encoding = "utf-8")
+    except OSError:
+        return None
+
+    inputs = {}
+    groups = []
+
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError: #torn by a crash while it was being written
+                break
+
+            if record.get("reset"):
+                inputs = {}
+                groups = []
+
+            inputs.update( record.get("set", {}) )
+            for name in record.get("unset", ()):
+                inputs.pop(name, None)
+            groups.extend( name for name in record.get("groups", ()) if name not in groups )
+
+    return inputs, groups
+
+def restore(input_file, path = None):
+    """
+    Set the inputs of input_file from a journal, and return the names of the groups to open,
+    or None if there is no journal
+
+    Edits to the structure are made to the structure built from the cards of input_file, or
+    dropped if its cards cannot be read as one.
+    """
+
+    journal = read_journal(path)
+    if journal is None:
+        return None
+
+    inputs, groups = journal
+    structure = { name: inputs.pop(name) for name in list(inputs) if is_structure_name(name) }
+    input_file.inputs.update(inputs)
+
+    if structure:
+        try:
+            if input_file.structure is None:
+                input_file.load_structure()
+        except (KeyError, ValueError, IndexError): #no cards, or cards that are not a structure
+            pass
+        if input_file.structure is not None:
+            #each atom is held with the units of its position, so the units can be set first
+            for name in sorted( structure, key = lambda name: name != UNITS_NAME ):
+                input_file.apply_structure_value( name, structure[name], strict = False )
+
+    return groups
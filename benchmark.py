@@ -0,0 +1,1433 @@
+"""
+Benchmarks for the Quantum ESPRESSO input form
+
+Run all benchmarks with "python benchmark.py", or a subset by name, e.g.
+"python benchmark.py keystroke"
+"""
+
+import io
+import os
+import sys
+import time
+
+#the benchmarks do not need a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+
+_app = None
+
+def get_app():
+    """
+    Return the QApplication, creating it on first use
+    """
+
+    global _app
+
+    if _app is None:
+        from PyQt5.QtWidgets import QApplication
+        _app = QApplication.instance() or QApplication(sys.argv)
+
+    return _app
+
+
+def time_call(function, repeat):
+    """
+    Return the mean wall time of function() in seconds
+    """
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    return ( time.perf_counter() - start ) / repeat
+
+
+def open_boxes(dialog, count):
+    """
+    Follow the next_group_box chain until count group boxes exist
+    """
+
+    while len(dialog.group_boxes) < count:
+        dialog.create_box( dialog.group_boxes[-1].next_group_box )
+
+
+def find_field(dialog, input_name):
+
+    for group_box in dialog.group_boxes:
+        for w in group_box.widgets:
+            if w.input_name == input_name:
+                return w
+
+
+#--------------------------------------------------------#
+# Keystroke cost vs. number of open group boxes
+#--------------------------------------------------------#
+def benchmark_keystroke(repeat = 200):
+    """
+    Compare the cost of one keystroke in a text field under the full re-scan
+    (Dialog.on_window_update) and the dependency-indexed update (Dialog.on_input_changed)
+    """
+
+    import form
+    import window
+
+    get_app()
+
+    #count how many widgets and group boxes have their show conditions evaluated
+    evaluations = [0]
+    evaluate = form.InputForm.evaluate
+    def counting_evaluate(self, item):
+        evaluations[0] += 1
+        return evaluate(self, item)
+    form.InputForm.evaluate = counting_evaluate
+
+    print("cost of one update vs. number of open group boxes")
+    print("%6s %13s %6s %16s %6s %17s %6s" % ("boxes", "rescan (us)", "evals", "tot_charge (us)", "evals",
+                                            "calculation (us)", "evals"))
+
+    try:
+        seen = set()
+        for count in range(1, 14):
+            dialog = window.Dialog( window.QuantumEspressoInputFile() )
+            open_boxes(dialog, count)
+
+            #hidden group boxes open the next box automatically
+            if len(dialog.group_boxes) in seen:
+                dialog.deleteLater()
+                continue
+            seen.add( len(dialog.group_boxes) )
+
+            row = [ len(dialog.group_boxes) ]
+            for update in [ dialog.on_window_update,
+                            lambda: dialog.on_input_changed("tot_charge"),
+                            lambda: dialog.on_input_changed("calculation") ]:
+                evaluations[0] = 0
+                row.append( time_call(update, repeat) * 1e6 )
+                row.append( evaluations[0] // repeat )
+
+            print("%6i %13.1f %6i %16.1f %6i %17.1f %6i" % tuple(row))
+            dialog.deleteLater()
+    finally:
+        form.InputForm.evaluate = evaluate
+
+
+
+#--------------------------------------------------------#
+# Compiled vs. interpreted show conditions
+#--------------------------------------------------------#
+def interpret_condition(condition, inputs):
+    """
+    The original recursive interpreter for show conditions, kept as the baseline
+    """
+
+    try:
+        try:
+            input = inputs[ condition[0] ]
+        except KeyError:
+            input = None
+
+        if condition[1] == "==":
+            return input == condition[2]
+        elif condition[1] == "!=":
+            return input != condition[2]
+
+    except TypeError: #the condition must be a list of conditions
+        c1 = interpret_condition(condition[0], inputs)
+        c2 = interpret_condition(condition[2], inputs)
+
+        if condition[1] == "or":
+            return (c1 or c2)
+        elif condition[1] == "and":
+            return (c1 and c2)
+
+
+def benchmark_conditions(repeat = 100000):
+    """
+    Compare the compiled show conditions with the recursive interpreter
+    """
+
+    from conditions import compile_condition
+
+    conditions = {
+        "cell: esm_bc": ["assume_isolated","==","esm"],
+        "cell: GUI_variable_cell": ["calculation","==","relax"],
+        "cell dynamics box": [ [ ["calculation","==","relax"], "and",
+                                 ["GUI_variable_cell","==",2] ], "or",
+                               [ ["calculation","==","md"], "and",
+                                 ["GUI_variable_cell","==",2] ] ],
+        "hubbard box": [ ["GUI_exx_corr","==","dft+u"],
+                         "or", ["GUI_exx_corr","==","dft+u+j"] ],
+        "vdw box": [ [ ["vdw_corr","==","grimme-d2"], "or",
+                       ["vdw_corr","==","tkatchenko-scheffler"] ], "or",
+                     ["vdw_corr","==","xdm"] ],
+        }
+
+    inputs = { "calculation": "md", "GUI_variable_cell": 2, "GUI_exx_corr": "none",
+               "vdw_corr": "xdm", "assume_isolated": "none" }
+
+    print("show condition evaluation cost")
+    print("%-24s %17s %15s %8s" % ("condition", "interpreted (ns)", "compiled (ns)", "speedup"))
+
+    for name, condition in conditions.items():
+        predicate = compile_condition(condition).predicate
+        assert predicate(inputs) == interpret_condition(condition, inputs)
+
+        interpreted_time = time_call(lambda: interpret_condition(condition, inputs), repeat)
+        compiled_time = time_call(lambda: predicate(inputs), repeat)
+
+        print("%-24s %17.0f %15.0f %7.1fx" % (name, interpreted_time * 1e9, compiled_time * 1e9,
+                                             interpreted_time / compiled_time))
+
+
+
+
+#--------------------------------------------------------#
+# Coalescing of text-entry updates
+#--------------------------------------------------------#
+def benchmark_typing(characters = 2000):
+    """
+    Type and paste into the text fields, and count the update passes that result
+    """
+
+    import window
+
+    app = get_app()
+
+    dialog = window.Dialog( window.QuantumEspressoInputFile() )
+    open_boxes(dialog, 4)
+
+    passes = [0]
+    on_input_changed = dialog.on_input_changed
+    def counting_on_input_changed(input_name, trigger = None):
+        passes[0] += 1
+        on_input_changed(input_name, trigger)
+    dialog.on_input_changed = counting_on_input_changed
+
+    print("update passes for bursts of text entry")
+    print("%-36s %10s %8s %10s" % ("burst", "changes", "passes", "time (ms)"))
+
+    line_edit = find_field(dialog, "ecutwfc").widget
+    def type_text():
+        for i in range(characters):
+            line_edit.insert("1")
+
+    plain_text = find_field(dialog, "GUI_lattice_vector").widget
+    lattice = "  0.5  0.5  0.0\n" * 3
+    def paste_lattice():
+        for i in range(characters // 10):
+            plain_text.insertPlainText(lattice)
+
+    for name, burst, changes in [ ("type into ecutwfc", type_text, characters),
+                                  ("paste into GUI_lattice_vector", paste_lattice, characters // 10) ]:
+        passes[0] = 0
+        start = time.perf_counter()
+        burst()
+        app.processEvents()
+        elapsed = time.perf_counter() - start
+
+        print("%-36s %10i %8i %10.1f" % (name, changes, passes[0], elapsed * 1e3))
+
+    dialog.deleteLater()
+
+
+
+
+#--------------------------------------------------------#
+# Toggling a driving combo box
+#--------------------------------------------------------#
+def benchmark_toggle(toggles = 300):
+    """
+    Cycle "calculation" through scf, relax and md with all group boxes open, comparing
+    hidden rows that keep their widgets with rows that are destroyed and rebuilt
+    """
+
+    import window
+    from PyQt5.QtCore import QCoreApplication, QEvent, QObject
+
+    app = get_app()
+
+    #count how many Qt widgets are constructed
+    created = [0]
+    initialize_widget = window.InputField.initialize_widget
+    def counting_initialize_widget(self):
+        created[0] += 1
+        initialize_widget(self)
+    window.InputField.initialize_widget = counting_initialize_widget
+
+    def live_objects(dialog):
+        #run any pending deleteLater calls before counting
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        return len( dialog.findChildren(QObject) )
+
+    print("cost of toggling calculation between scf, relax and md")
+    print("%-10s %16s %16s %14s %13s" % ("mode", "per toggle (us)", "fields rebuilt", "objects before", "objects after"))
+
+    try:
+        for reuse_widgets in [True, False]:
+            dialog = window.Dialog( window.QuantumEspressoInputFile(), reuse_widgets = reuse_widgets )
+            open_boxes(dialog, 13)
+            combo = find_field(dialog, "calculation").widget
+
+            indices = [ combo.findData(value) for value in ["scf", "relax", "md"] ]
+            objects_before = live_objects(dialog)
+            created[0] = 0
+
+            start = time.perf_counter()
+            for i in range(toggles):
+                combo.setCurrentIndex( indices[ i % 3 ] )
+            elapsed = time.perf_counter() - start
+
+            #return to the starting state before counting
+            combo.setCurrentIndex( indices[0] )
+            objects_after = live_objects(dialog)
+
+            print("%-10s %16.1f %16i %14i %13i" % ("reuse" if reuse_widgets else "rebuild", elapsed / toggles * 1e6,
+                                                   created[0], objects_before, objects_after))
+            dialog.deleteLater()
+    finally:
+        window.InputField.initialize_widget = initialize_widget
+
+
+
+
+#--------------------------------------------------------#
+# Loading the form schema
+#--------------------------------------------------------#
+def benchmark_schema(repeat = 50):
+    """
+    Compare validating and processing the schema with loading it from the on-disk cache
+    """
+
+    import json
+    import tempfile
+    import schema
+
+    with open(schema.SCHEMA_PATH) as f:
+        data = f.read()
+
+    def cold():
+        schema.process_schema( json.loads(data) )
+
+    cache_dir = tempfile.mkdtemp()
+    def cached():
+        schema._loaded.clear()
+        schema.load_schema(cache_dir = cache_dir)
+
+    cached()
+
+    print("schema load time")
+    print("%-24s %10.1f us" % ("validate and process", time_call(cold, repeat) * 1e6))
+    print("%-24s %10.1f us" % ("load from disk cache", time_call(cached, repeat) * 1e6))
+
+
+
+
+#--------------------------------------------------------#
+# Headless form resolution
+#--------------------------------------------------------#
+def benchmark_headless(count = 2000):
+    """
+    Resolve the active inputs of many forms without Qt
+    """
+
+    from form import InputForm
+
+    calculations = ["scf", "relax", "md"]
+
+    def resolve(i):
+        form = InputForm()
+        form.input_file.inputs["calculation"] = calculations[ i % 3 ]
+        form.input_file.inputs["ecutwfc"] = str( 20 + i % 40 )
+        form.open_all()
+        return form.active_inputs()
+
+    start = time.perf_counter()
+    for i in range(count):
+        resolve(i)
+    elapsed = time.perf_counter() - start
+
+    print("headless form resolution")
+    print("%i forms in %.2f s: %.0f forms/s" % (count, elapsed, count / elapsed))
+
+
+
+
+#--------------------------------------------------------#
+# Writing pw.x inputs
+#--------------------------------------------------------#
+def benchmark_writer(atoms = 200000):
+    """
+    Write an input with a large ATOMIC_POSITIONS card from a generator, and
+    report the time taken and the peak memory allocated while writing
+    """
+
+    import tracemalloc
+    from qe_input import QuantumEspressoInputFile
+
+    input_file = QuantumEspressoInputFile()
+    input_file.inputs.update( { "calculation": "relax", "ecutwfc": "30", "ibrav": "0",
+                                "GUI_lattice_vector": "10 0 0\n0 10 0\n0 0 10" } )
+
+    def positions():
+        for i in range(atoms):
+            yield "Si %.8f %.8f %.8f" % ( i * 1e-6, 0.5, 0.25 )
+
+    input_file.set_card("ATOMIC_SPECIES", None, [ "Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF" ])
+    input_file.set_card("ATOMIC_POSITIONS", "crystal", positions())
+
+    with open(os.devnull, "w") as stream:
+        tracemalloc.start()
+        start = time.perf_counter()
+        input_file.write(stream)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print("streaming pw.x writer")
+    print("%i atoms written in %.2f s, peak allocation %.1f MB" % (atoms, elapsed, peak / 1e6))
+
+
+
+
+#--------------------------------------------------------#
+# Reading pw.x inputs
+#--------------------------------------------------------#
+def benchmark_reader(atoms = 100000, repeat = 5):
+    """
+    Read a synthetic input with a large ATOMIC_POSITIONS card, split into the
+    time taken by the tokenizer and by mapping the parameters onto the form
+    """
+
+    from pw_reader import build_input_file, read_input, tokenize
+    from schema import load_schema
+
+    lines = [ "&CONTROL", "  calculation = 'relax', prefix = 'bulk'", "/",
+              "&SYSTEM", "  ibrav = 0, nat = %i, ntyp = 1" % atoms, "  ecutwfc = 30.0",
+              "  lda_plus_u = .true., Hubbard_U(1) = 4.0", "/",
+              "&ELECTRONS", "  conv_thr = 1.0d-8", "/", "&IONS", "/",
+              "ATOMIC_SPECIES", "Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF",
+              "CELL_PARAMETERS angstrom", "100 0 0", "0 100 0", "0 0 100",
+              "ATOMIC_POSITIONS crystal" ]
+    lines.extend( "Si %.8f %.8f %.8f" % ( i * 1e-6, 0.5, 0.25 ) for i in range(atoms) )
+    lines.extend( [ "K_POINTS automatic", "1 1 1 0 0 0", "" ] )
+    text = "\n".join(lines)
+
+    schema = load_schema()
+
+    tokenize_time = time_call( lambda: tokenize(text), repeat )
+    namelists, cards = tokenize(text)
+    build_time = time_call( lambda: build_input_file( namelists, dict(cards), schema ), repeat )
+    read_time = time_call( lambda: read_input( io.StringIO(text) ), repeat )
+
+    print("pw.x reader")
+    print("%i atoms, %.1f MB of text" % ( atoms, len(text) / 1e6 ))
+    print("tokenize:        %8.1f ms" % (tokenize_time * 1e3))
+    print("map onto form:   %8.1f ms" % (build_time * 1e3))
+    print("read_input:      %8.1f ms" % (read_time * 1e3))
+
+
+
+
+#--------------------------------------------------------#
+# Opening a complete input
+#--------------------------------------------------------#
+def benchmark_open(repeat = 10):
+    """
+    Time from creating a Dialog over a complete input to its first paint, with every
+    group box built up front and with placeholder boxes materialized as they come into view
+    """
+
+    from qe_input import QuantumEspressoInputFile
+    from window import Dialog
+
+    app = get_app()
+
+    inputs = { "calculation": "relax", "GUI_variable_cell": 2, "GUI_exx_corr": "dft+u",
+               "GUI_efield_type": "tefield", "GUI_charge_type": "monopole", "nspin": "4",
+               "GUI_convergence_standards": "custom", "GUI_convergence_acceleration": "custom" }
+
+    print("opening a complete input")
+
+    for lazy in (False, True):
+
+        def first_paint():
+            input_file = QuantumEspressoInputFile()
+            input_file.inputs.update(inputs)
+            dialog = Dialog(input_file, lazy = lazy)
+            dialog.open_all()
+            dialog.resize(600, 500)
+            dialog.show()
+            app.processEvents()
+            first_paint.boxes = sum( box.materialized for box in dialog.group_boxes )
+            dialog.close()
+            dialog.deleteLater()
+
+        elapsed = time_call(first_paint, repeat)
+        print("%-6s %6.1f ms to first paint, %i boxes built" %
+              ( "lazy" if lazy else "eager", elapsed * 1e3, first_paint.boxes ))
+
+
+
+
+#--------------------------------------------------------#
+# Parameter sweeps
+#--------------------------------------------------------#
+def benchmark_sweep(variants = 10000):
+    """
+    Write a sweep of pw.x inputs with increasing numbers of worker processes
+    """
+
+    import shutil
+    import tempfile
+    from qe_input import QuantumEspressoInputFile
+    from sweep import Sweep, sweep_range, write_sweep
+
+    base = QuantumEspressoInputFile()
+    base.inputs.update( { "calculation": "scf", "ibrav": "2", "ecutwfc": "30" } )
+    base.set_card("ATOMIC_SPECIES", None, [ "Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF" ])
+    base.set_card("ATOMIC_POSITIONS", "alat", [ "Si 0.00 0.00 0.00", "Si 0.25 0.25 0.25" ])
+
+    side = int( round( variants ** 0.25 ) )
+    parameters = { "ecutwfc": sweep_range(20, 20 + 5 * (side - 1), 5),
+                   "ecutrho": sweep_range(160, 160 + 40 * (side - 1), 40),
+                   "degauss": sweep_range(0.005, 0.005 * side, 0.005),
+                   "mixing_beta": sweep_range(0.1, 0.1 * side, 0.1) }
+    sweep = Sweep(base, parameters)
+
+    print("parameter sweep")
+    print("%i variants" % len(sweep))
+
+    workers = 1
+    while workers <= ( os.cpu_count() or 1 ):
+        directory = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            write_sweep(sweep, directory, workers)
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(directory)
+        print("%3i workers: %6.2f s, %6.0f inputs/s" % ( workers, elapsed, len(sweep) / elapsed ))
+        workers *= 2
+
+
+
+
+#--------------------------------------------------------#
+# Atomic structures
+#--------------------------------------------------------#
+def benchmark_structure(atoms = 1000000):
+    """
+    Convert, wrap and write the positions of a large structure
+    """
+
+    import numpy as np
+    from qe_input import QuantumEspressoInputFile
+    from structure import Species, Structure
+
+    rng = np.random.default_rng(0)
+    structure = Structure( [ Species("Si", 28.086, "Si.UPF"), Species("O", 15.999, "O.UPF") ],
+                           rng.integers(0, 2, atoms), rng.random( (atoms, 3) ) * 1.5 - 0.25, "crystal",
+                           cell = [ [50, 0, 0], [0, 50, 0], [5, 0, 50] ] )
+
+    input_file = QuantumEspressoInputFile()
+    input_file.inputs.update( { "calculation": "scf", "ecutwfc": "30" } )
+    input_file.set_structure(structure)
+
+    print("atomic structure")
+    print("%i atoms" % atoms)
+    print("convert to angstrom and back: %6.1f ms" %
+          ( time_call( lambda: ( structure.convert("angstrom"), structure.convert("crystal") ), 5 ) * 1e3 ))
+    print("wrap into the cell:           %6.1f ms" % ( time_call(structure.wrap, 5) * 1e3 ))
+
+    with open(os.devnull, "w") as stream:
+        print("write the input:              %6.1f ms" % ( time_call( lambda: input_file.write(stream), 1 ) * 1e3 ))
+
+
+
+
+#--------------------------------------------------------#
+# Atom table
+#--------------------------------------------------------#
+def benchmark_atoms(atoms = 200000, edits = 1000):
+    """
+    Show the table of a large structure, edit cells across it and scroll through it
+    """
+
+    import numpy as np
+    from qe_input import QuantumEspressoInputFile
+    from structure import Species, Structure
+    from window import Dialog
+
+    app = get_app()
+
+    rng = np.random.default_rng(0)
+    structure = Structure( [ Species("Si", 28.086, "Si.UPF"), Species("O", 15.999, "O.UPF") ],
+                           rng.integers(0, 2, atoms), rng.random( (atoms, 3) ), "crystal",
+                           cell = [ [50, 0, 0], [0, 50, 0], [0, 0, 50] ] )
+
+    input_file = QuantumEspressoInputFile()
+    input_file.set_structure(structure)
+    dialog = Dialog(input_file)
+
+    def show():
+        editor = dialog.edit_structure()
+        dialog.resize(700, 800)
+        dialog.show()
+        app.processEvents()
+        return editor
+
+    start = time.perf_counter()
+    editor = show()
+    show_time = time.perf_counter() - start
+
+    model = editor.model
+    step = max( 1, atoms // edits )
+
+    def edit():
+        for i in range(edits):
+            model.setData( model.index( i * step, 1 ), "0.5" )
+        app.processEvents()
+
+    def scroll():
+        bar = editor.view.verticalScrollBar()
+        for i in range(20):
+            bar.setValue( bar.maximum() * i // 19 )
+            app.processEvents()
+
+    print("atom table")
+    print("%i atoms" % atoms)
+    print("show:                %6.1f ms" % (show_time * 1e3))
+    print("%i edits:         %6.1f ms" % ( edits, time_call(edit, 1) * 1e3 ))
+    print("20 scroll steps:     %6.1f ms" % ( time_call(scroll, 1) * 1e3 ))
+
+    dialog.close()
+
+
+
+
+#--------------------------------------------------------#
+# Structure importers
+#--------------------------------------------------------#
+def benchmark_import(atoms = 100000, frames = 40):
+    """
+    Write an extended XYZ trajectory of several hundred MB, then read its first and last
+    frames, and every frame in turn
+    """
+
+    import tempfile
+    import tracemalloc
+    import numpy as np
+    from importers import iter_xyz, read_xyz
+    from structure import Species, Structure
+
+    rng = np.random.default_rng(0)
+    species = [ Species("Si", 28.085, "Si.UPF"), Species("O", 15.999, "O.UPF") ]
+    types = rng.integers(0, 2, atoms)
+    header = "%i\nLattice=\"50 0 0 0 50 0 0 0 50\" Properties=species:S:1:pos:R:3 frame=%i\n"
+
+    with tempfile.NamedTemporaryFile("w", suffix = ".xyz", delete = False) as f:
+        path = f.name
+        for frame in range(frames):
+            structure = Structure( species, types, rng.random( (atoms, 3) ) * 50, "angstrom" )
+            f.write( header % (atoms, frame) )
+            for chunk in structure.positions_card().lines:
+                f.write(chunk)
+                f.write("\n")
+
+    try:
+        size = os.path.getsize(path)
+
+        first = time_call( lambda: read_xyz(path, 0), 3 )
+
+        last = time_call( lambda: read_xyz(path, frames - 1), 3 )
+
+        #memory is measured separately, since tracing allocations slows the reader down
+        tracemalloc.start()
+        read_xyz(path, frames - 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        count = sum( 1 for structure in iter_xyz(path) )
+        every = time.perf_counter() - start
+
+    finally:
+        os.remove(path)
+
+    print("structure import")
+    print("%i frames of %i atoms, %.0f MB" % ( frames, atoms, size / 1e6 ))
+    print("first frame:  %7.1f ms" % (first * 1e3))
+    print("last frame:   %7.1f ms, peak allocation %.1f MB" % ( last * 1e3, peak / 1e6 ))
+    print("every frame:  %7.1f ms, %.0f MB/s" % ( every * 1e3, size / 1e6 / every ))
+
+
+
+#--------------------------------------------------------#
+# K-points
+#--------------------------------------------------------#
+def benchmark_kpoints(grids = (24, 48, 96), path_points = 100000):
+    """
+    Generate and reduce dense Monkhorst-Pack grids of an fcc lattice, and generate and
+    write a long band path
+    """
+
+    import numpy as np
+    from kpoints import irreducible_grid, lattice_rotations, monkhorst_pack, standard_path
+    from qe_input import QuantumEspressoInputFile
+
+    rotations = lattice_rotations( [ [0, 0.5, 0.5], [0.5, 0, 0.5], [0.5, 0.5, 0] ] )
+
+    print("k-points")
+    print("%i rotations of the fcc lattice" % len(rotations))
+
+    for n in grids:
+        generate = time_call( lambda: monkhorst_pack( (n, n, n), (1, 1, 1) ), 1 )
+        start = time.perf_counter()
+        reduced = irreducible_grid( (n, n, n), (1, 1, 1), rotations )
+        reduce = time.perf_counter() - start
+        print("%3i^3 grid: generate %7.1f ms, reduce %7.1f ms to %i points, weights sum to %.6f" %
+              ( n, generate * 1e3, reduce * 1e3, len(reduced), reduced.weights.sum() ))
+
+    path = time_call( lambda: standard_path("fcc", path_points), 5 )
+
+    input_file = QuantumEspressoInputFile()
+    input_file.inputs.update( { "calculation": "bands", "ecutwfc": "30" } )
+    input_file.set_kpoints( standard_path("fcc", path_points) )
+
+    print("band path of %i points: %6.1f ms" % ( len(input_file.kpoints), path * 1e3 ))
+    with open(os.devnull, "w") as stream:
+        print("write the input:          %6.1f ms" % ( time_call( lambda: input_file.write(stream), 3 ) * 1e3 ))
+
+
+
+
+#--------------------------------------------------------#
+# Incremental validation
+#--------------------------------------------------------#
+def benchmark_validation(edits = 1000):
+    """
+    Type into ecutwfc with every group open, and compare the cost of re-running the rules
+    that read it with re-running every rule, and with the whole update of one edit
+    """
+
+    import window
+    from validation import Validator
+
+    get_app()
+
+    dialog = window.Dialog( window.QuantumEspressoInputFile() )
+    dialog.open_all()
+
+    validator = dialog.validator
+    inputs = dialog.input_file.inputs
+    values = [ str(20 + i % 50) for i in range(edits) ]
+
+    def incremental():
+        for value in values:
+            inputs["ecutwfc"] = value
+            validator.update("ecutwfc")
+
+    #without memoized results, every rule runs on every edit
+    unmemoized = Validator(dialog.input_file)
+    def full():
+        for value in values:
+            inputs["ecutwfc"] = value
+            unmemoized.values.clear()
+            unmemoized.update_all()
+
+    runs = validator.runs
+    incremental_time = time_call(incremental, 1) / edits
+    incremental_runs = ( validator.runs - runs ) / float(edits)
+    full_time = time_call(full, 1) / edits
+
+    field = find_field(dialog, "ecutwfc")
+    def keystrokes():
+        for value in values:
+            field.widget.setText(value)
+            dialog.scheduler.flush()
+    keystroke_time = time_call(keystrokes, 1) / edits
+
+    print("validation cost per edit, %i group boxes open, %i rules" % ( len(dialog.group_boxes), len(validator.rules) ))
+    print("incremental: %7.1f us, %.1f rules run" % ( incremental_time * 1e6, incremental_runs ))
+    print("every rule:  %7.1f us, %i rules run" % ( full_time * 1e6, len(validator.rules) ))
+    print("keystroke with update and inline errors: %7.1f us" % ( keystroke_time * 1e6 ))
+
+
+
+
+#--------------------------------------------------------#
+# Undo history
+#--------------------------------------------------------#
+def benchmark_history(edits = 20000, keystrokes = 8):
+    """
+    Record a long editing session with every group open, and compare the memory of the
+    change log with that of a snapshot of the inputs per step
+    """
+
+    import tracemalloc
+    from form import InputForm
+    from history import History
+
+    form = InputForm()
+    form.open_all()
+    input_file = form.input_file
+
+    names = [ name for name, value in input_file.inputs.items() if isinstance(value, str) ]
+
+    #a fake clock, so that each field's keystrokes are coalesced and fields are edited far apart
+    now = [0.0]
+
+    def session():
+        history = History( max_steps = edits, clock = lambda: now[0] )
+        input_file.history = history
+        for i in range(edits):
+            name = names[ i % len(names) ]
+            now[0] += 10.0
+            for k in range(1, keystrokes + 1):
+                input_file.set_input( name, str(i)[:k] + "." + str(k) )
+                now[0] += 0.1
+        return history
+
+    record = time_call(session, 1)
+
+    #memory is measured separately, since tracing allocations slows recording down
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = session()
+    log = tracemalloc.get_traced_memory()[0] - before
+
+    before = tracemalloc.get_traced_memory()[0]
+    snapshots = [ dict(input_file.inputs) for i in range( min(edits, 2000) ) ]
+    snapshot = ( tracemalloc.get_traced_memory()[0] - before ) * edits / float( len(snapshots) )
+    del snapshots
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    while history.can_undo():
+        input_file.undo()
+    undo = time.perf_counter() - start
+
+    print("undo history")
+    print("%i inputs, %i steps of %i keystrokes each" % ( len(input_file.inputs), edits, keystrokes ))
+    print("record:            %7.2f us per keystroke" % ( record / (edits * keystrokes) * 1e6 ))
+    print("change log:        %7.1f MB" % ( log / 1e6 ))
+    print("snapshot per step: %7.1f MB" % ( snapshot / 1e6 ))
+    print("undo every step:   %7.2f us per step" % ( undo / edits * 1e6 ))
+
+
+
+
+#--------------------------------------------------------#
+# Autosave
+#--------------------------------------------------------#
+def benchmark_autosave(keystrokes = 2000):
+    """
+    Compare the cost of a keystroke with and without the autosave journal, and count the
+    writes and fsyncs that the journal makes for them
+    """
+
+    import tempfile
+    import window
+    from autosave import read_journal
+
+    get_app()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "autosave.journal")
+
+    texts = [ str(i) for i in range(keystrokes) ]
+
+    def type_into(dialog):
+        field = find_field(dialog, "ecutwfc")
+        start = time.perf_counter()
+        for text in texts:
+            field.widget.setText(text)
+            dialog.scheduler.flush()
+        return ( time.perf_counter() - start ) / keystrokes
+
+    try:
+        dialog = window.Dialog( window.QuantumEspressoInputFile() )
+        dialog.open_all()
+        plain = type_into(dialog)
+
+        dialog = window.Dialog( window.QuantumEspressoInputFile(), autosave_path = path )
+        dialog.open_all()
+        journaled = type_into(dialog)
+
+        start = time.perf_counter()
+        dialog.autosave.close()
+        drain = time.perf_counter() - start
+        syncs = dialog.autosave.syncs
+        size = os.path.getsize(path)
+
+        restore = time_call( lambda: read_journal(path), 20 )
+
+    finally:
+        for name in os.listdir(directory):
+            os.remove( os.path.join(directory, name) )
+        os.rmdir(directory)
+
+    print("autosave journal")
+    print("keystroke without autosave: %7.1f us" % ( plain * 1e6 ))
+    print("keystroke with autosave:    %7.1f us" % ( journaled * 1e6 ))
+    print("%i keystrokes written with %i fsyncs, %i bytes, drained on close in %.1f ms" %
+          ( keystrokes, syncs, size, drain * 1e3 ))
+    print("restore:                    %7.1f us" % ( restore * 1e6 ))
+
+
+
+
+#--------------------------------------------------------#
+# Startup
+#--------------------------------------------------------#
+
+#seconds from launching the process to each step of startup, which the startup benchmark asserts
+STARTUP_BUDGETS = { "first paint": 1.0, "form built": 2.0 }
+
+def benchmark_startup(runs = 5):
+    """
+    Launch the form in new processes, and check the time to its first paint and to its
+    built form against STARTUP_BUDGETS; then compare, in this process, the time from
+    creating the Dialog to its first paint with and without deferred group boxes
+    """
+
+    import json
+    import subprocess
+    import tempfile
+    import window
+    from qe_input import QuantumEspressoInputFile
+
+    directory = os.path.dirname( os.path.abspath(__file__) )
+    script = os.path.join(directory, "window.py")
+
+    #an input with every group, a structure and explicit k-points to open
+    input_file = QuantumEspressoInputFile()
+    input_file.inputs.update( { "calculation": "relax", "ecutwfc": "30" } )
+    input_file.set_card( "ATOMIC_SPECIES", None, [ "Si 28.086 Si.UPF" ] )
+    input_file.set_card( "ATOMIC_POSITIONS", "crystal", [ "Si 0.0 0.0 0.0", "Si 0.25 0.25 0.25" ] )
+    with tempfile.NamedTemporaryFile("w", suffix = ".in", delete = False) as f:
+        input_path = f.name
+        input_file.write(f)
+
+    print("startup, from launching the process (ms)")
+    print("%-12s %12s %12s %12s" % ("form", "import Qt", "first paint", "form built"))
+
+    try:
+        for name, arguments in [ ("new", []), ("open input", [input_path]) ]:
+
+            times = {}
+            for run in range(runs):
+                launched = time.time()
+                output = subprocess.run( [ sys.executable, script, "--profile-startup=json" ] + arguments,
+                                         stderr = subprocess.PIPE, universal_newlines = True, check = True ).stderr
+                steps = json.loads( [ line for line in output.splitlines() if line.startswith("{") ][-1] )
+                for label, wall in steps.items():
+                    times.setdefault(label, []).append(wall - launched)
+
+            #the best run, as the least disturbed by other processes
+            best = { label: min(values) for label, values in times.items() }
+            print("%-12s %12.1f %12.1f %12.1f" % ( name, best["import Qt"] * 1e3, best["first paint"] * 1e3,
+                                                  best["form built"] * 1e3 ))
+
+            for label, budget in STARTUP_BUDGETS.items():
+                assert best[label] <= budget, \
+                       "%s of %s form took %.2f s, over its budget of %.2f s" % ( label, name, best[label], budget )
+
+    finally:
+        os.remove(input_path)
+
+    app = get_app()
+
+    print("Dialog created to first paint, in this process (ms)")
+    for defer_boxes in (False, True):
+        start = time.perf_counter()
+        dialog = window.Dialog( window.QuantumEspressoInputFile(), defer_boxes = defer_boxes )
+        dialog.show()
+        while not dialog.painted:
+            app.processEvents()
+        painted = time.perf_counter() - start
+        print("%-16s %7.1f" % ( "deferred boxes" if defer_boxes else "eager boxes", painted * 1e3 ))
+        dialog.close()
+
+
+
+
+#--------------------------------------------------------#
+# Update cycle instrumentation
+#--------------------------------------------------------#
+def benchmark_instrumentation(repeat = 2000):
+    """
+    Compare the cost of update cycles with and without an UpdateRecorder attached, and
+    print the histograms it records
+    """
+
+    import window
+    from instrumentation import print_histograms
+
+    get_app()
+
+    dialog = window.Dialog( window.QuantumEspressoInputFile() )
+    dialog.open_all()
+
+    field = find_field(dialog, "calculation")
+    def cycles():
+        for i in range(repeat):
+            field.widget.setCurrentIndex(i % 4)
+
+    disabled = time_call(cycles, 1) / repeat
+
+    recorder = dialog.record_updates()
+    enabled = time_call(cycles, 1) / repeat
+    dialog.stop_recording()
+
+    print("update cycle instrumentation, %i group boxes open" % len(dialog.group_boxes))
+    print("on_index_changed without recorder: %7.1f us" % ( disabled * 1e6 ))
+    print("on_index_changed with recorder:    %7.1f us" % ( enabled * 1e6 ))
+    print_histograms( recorder.as_dict() )
+
+
+
+
+#--------------------------------------------------------#
+# Per-species parameters
+#--------------------------------------------------------#
+def benchmark_species(ntyp = 64, repeat = 100):
+    """
+    Paste a block of values for every per-species parameter of many species, and compare
+    writing them from the array with writing them from space-separated text
+    """
+
+    import window
+    from pw_writer import format_field
+    from species_parameters import SpeciesParameters, per_species_fields
+
+    get_app()
+
+    fields = per_species_fields( window.InputForm( window.QuantumEspressoInputFile() ).schema )
+
+    block = "\n".join( "\t".join( "%.3f" % ( 0.1 * s + p ) for p in range( len(fields) ) ) for s in range(ntyp) )
+
+    parameters = SpeciesParameters( [ field.input_name for field in fields ], [ field.key for field in fields ], ntyp )
+    paste = time_call( lambda: parameters.paste(block), repeat )
+
+    texts = { field.input_name: parameters.text(field.input_name) for field in fields }
+    def write_text():
+        for field in fields:
+            format_field( field, texts[field.input_name] )
+
+    write_array = time_call( parameters.parameters, repeat )
+    write_texts = time_call( write_text, repeat )
+
+    #a paste into the grid of an open group, which also sets the text inputs and updates the form
+    input_file = window.QuantumEspressoInputFile()
+    input_file.inputs["GUI_exx_corr"] = "dft+u"
+    dialog = window.Dialog(input_file)
+    dialog.open_groups( ["hubbard"] )
+    model = dialog.boxes["hubbard"].species_grid.model
+    hubbard_block = "\n".join( "\t".join( line.split("\t")[:len(model.names)] ) for line in block.split("\n") )
+    grid_paste = time_call( lambda: model.paste(hubbard_block), 10 )
+
+    print("per-species parameters, %i parameters of %i species" % ( len(fields), ntyp ))
+    print("paste the block into the array:      %8.1f us" % ( paste * 1e6 ))
+    print("write from the array:                %8.1f us" % ( write_array * 1e6 ))
+    print("write from space-separated text:     %8.1f us" % ( write_texts * 1e6 ))
+    print("paste %i columns into the grid:       %8.1f ms" % ( len(model.names), grid_paste * 1e3 ))
+
+
+
+
+#--------------------------------------------------------#
+# Local job runner
+#--------------------------------------------------------#
+def benchmark_jobs(jobs = 2000, mock_jobs = 50, workers = (1, 4)):
+    """
+    Run thousands of jobs that exit at once through the job runner, and compare the time
+    per job with starting the same processes directly, then run the stand-in for pw.x
+    """
+
+    import shutil
+    import subprocess
+    import tempfile
+    from jobs import DONE, MOCK_COMMAND, JobRunner
+
+    #a command that does nothing, so that the time per job is the cost of running a job at all
+    command = [ shutil.which("true") or sys.executable ]
+    text = "&CONTROL\n  prefix = 'bench'\n/\n"
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        #the same work as a job, in a plain loop: a directory, an input, an output and a process
+        def direct():
+            for i in range(jobs):
+                job_directory = os.path.join( directory, "direct", "bench.%05i" % i )
+                os.makedirs(job_directory)
+                with open( os.path.join(job_directory, "bench.in"), "w" ) as f:
+                    f.write(text)
+                with open( os.path.join(job_directory, "bench.out"), "wb" ) as output:
+                    subprocess.Popen( command, cwd = job_directory, stdin = subprocess.DEVNULL,
+                                      stdout = output, stderr = subprocess.STDOUT ).wait()
+        direct_time = time_call(direct, 1) / jobs
+
+        results = []
+        for count in workers:
+            runner = JobRunner( os.path.join( directory, "runner%i" % count ), command, count )
+            start = time.perf_counter()
+            for i in range(jobs):
+                runner.submit_text(text, "bench")
+            submitted = time.perf_counter()
+            runner.wait()
+            finished = time.perf_counter()
+            runner.close()
+            results.append( ( count, ( submitted - start ) / jobs, ( finished - start ) / jobs,
+                              sum( job.status == DONE for job in runner.jobs ) ) )
+
+        runner = JobRunner( os.path.join(directory, "mock"), MOCK_COMMAND )
+        start = time.perf_counter()
+        for i in range(mock_jobs):
+            runner.submit_text( text.replace("bench", "mock%i" % i), "mock" )
+        runner.close()
+        mock_time = ( time.perf_counter() - start ) / mock_jobs
+        mock_done = sum( job.status == DONE for job in runner.jobs )
+        with open(runner.jobs[0].output_path) as f:
+            mock_converged = "convergence has been achieved" in f.read()
+
+    finally:
+        shutil.rmtree(directory)
+
+    print("job runner, %i jobs of %s on %i cores" % ( jobs, os.path.basename(command[0]), os.cpu_count() or 1 ))
+    print("started directly, one at a time: %7.2f ms per job" % ( direct_time * 1e3 ))
+    for count, submit, wall, done in results:
+        print("runner, %i workers: submit %5.1f us, %7.2f ms per job, %i done" % ( count, submit * 1e6, wall * 1e3, done ))
+    print("mock pw.x, %i jobs: %7.1f ms per job, %i done, converged: %s" %
+          ( mock_jobs, mock_time * 1e3, mock_done, mock_converged ))
+
+
+
+
+#--------------------------------------------------------#
+# Streaming pw.x output
+#--------------------------------------------------------#
+OUTPUT_STEP = """
+     Entering Dynamics:    iteration = %(step)7i
+%(positions)s
+     Self-consistent Calculation
+%(iterations)s
+!    total energy              =    %(energy)14.8f Ry
+     estimated scf accuracy    <       0.00000009 Ry
+
+     convergence has been achieved in  %(count)3i iterations
+
+     Forces acting on atoms (cartesian axes, Ry/au):
+
+%(forces)s
+     Total force =     0.123456     Total SCF correction =     0.000012
+
+     Computing stress (Cartesian axis) and pressure
+
+          total   stress  (Ry/bohr**3)                   (kbar)     P=       -2.34
+  -0.00001590   0.00000000   0.00000000           -2.34        0.00        0.00
+   0.00000000  -0.00001590   0.00000000            0.00       -2.34        0.00
+   0.00000000   0.00000000  -0.00001590            0.00        0.00       -2.34
+
+CELL_PARAMETERS (alat= 10.20000000)
+  -0.50000000   0.00000000   0.50000000
+   0.00000000   0.50000000   0.50000000
+  -0.50000000   0.50000000   0.00000000
+
+     Ekin + Etot (const)   =     -1234.56789012 Ry
+     temperature           =       300.12345678 K
+"""
+
+OUTPUT_ITERATION = """
+     iteration #%3i     ecut=    30.00 Ry     beta= 0.70
+     Davidson diagonalization with overlap
+     ethr =  1.00E-06,  avg # of iterations =  2.0
+
+     total cpu time spent up to now is      123.4 secs
+
+     total energy              =     -1234.56789012 Ry
+     estimated scf accuracy    <       %.8f Ry
+"""
+
+def write_synthetic_output(path, size, atoms = 64, iterations = 8):
+    """
+    Write an md run of pw.x output of about size bytes, with the positions and forces of atoms
+    """
+
+    positions = "ATOMIC_POSITIONS (alat)\n" + "".join( "Si       %.9f   %.9f   %.9f\n" % ( 0.1 * i, 0.2 * i, 0.3 * i ) for i in range(atoms) )
+    forces = "".join( "     atom %4i type  1   force =     0.00123456   -0.00234567    0.00345678\n" % ( i + 1 ) for i in range(atoms) )
+    scf = "".join( OUTPUT_ITERATION % ( i + 1, 0.1 ** ( i + 1 ) ) for i in range(iterations) )
+
+    written = 0
+    step = 0
+    with open(path, "w") as f:
+        while written < size:
+            step += 1
+            text = OUTPUT_STEP % { "step": step, "positions": positions, "iterations": scf, "energy": -1234.5 - 1e-6 * step,
+                                   "count": iterations, "forces": forces }
+            f.write(text)
+            written += len(text)
+
+    return step
+
+def benchmark_output(size = 1 << 30, baseline_size = 64 << 20):
+    """
+    Parse a synthetic md output of size bytes, comparing the streaming parser with reading
+    every line, and the peak memory of the parser on outputs of two sizes
+    """
+
+    import re
+    import tempfile
+    import tracemalloc
+    from pw_output import parse_file
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "md.out")
+    small_path = os.path.join(directory, "small.out")
+
+    #a parser that reads every line and tries every pattern on it
+    patterns = [ re.compile(pattern) for pattern in ( rb"iteration #\s*(\d+)", rb"total energy\s+=\s*(\S+)",
+                 rb"estimated scf accuracy\s+<\s*(\S+)", rb"Total force =\s*(\S+)", rb"number of scf cycles\s+=\s*(\d+)",
+                 rb"Entering Dynamics:\s+iteration =\s*(\d+)", rb"JOB DONE" ) ]
+    def read_lines(path):
+        found = 0
+        with open(path, "rb") as f:
+            for line in f:
+                for pattern in patterns:
+                    if pattern.search(line):
+                        found += 1
+                        break
+        return found
+
+    def parse(path):
+        count = 0
+        for event in parse_file(path):
+            count += 1
+        return count
+
+    def peak(path):
+        tracemalloc.start()
+        parse(path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    try:
+        steps = write_synthetic_output(path, size)
+        write_synthetic_output(small_path, baseline_size)
+        actual_size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        events = parse(path)
+        parse_time = time.perf_counter() - start
+
+        small_lines = time_call( lambda: read_lines(small_path), 1 )
+        small_parse = time_call( lambda: parse(small_path), 1 )
+
+        small_peak = peak(small_path)
+        large_peak = peak(path)
+
+    finally:
+        for name in os.listdir(directory):
+            os.remove( os.path.join(directory, name) )
+        os.rmdir(directory)
+
+    print("pw.x output, %i md steps, %.0f MB" % ( steps, actual_size / 1e6 ))
+    print("streaming parser:   %6.2f s, %6.0f MB/s, %i events" % ( parse_time, actual_size / parse_time / 1e6, events ))
+    print("on %i MB, every line:  %6.0f MB/s; streaming parser: %6.0f MB/s" %
+          ( baseline_size >> 20, baseline_size / small_lines / 1e6, baseline_size / small_parse / 1e6 ))
+    print("peak memory of the parser: %.1f MB on %i MB, %.1f MB on %.0f MB" %
+          ( small_peak / 1e6, baseline_size >> 20, large_peak / 1e6, actual_size / 1e6 ))
+
+
+
+
+#--------------------------------------------------------#
+# Live convergence plot: append and paint cost vs. length of the run
+#--------------------------------------------------------#
+
+def benchmark_plot(lengths = (1000, 10000, 100000, 1000000), naive_limit = 100000, stream_seconds = 1.0):
+    """
+    Time appending points to a convergence plot and painting it as the run grows, against a
+    plot that draws every point, and count the repaints while events stream in
+    """
+
+    import random
+    from PyQt5.QtCore import QLineF, QPointF
+    from PyQt5.QtGui import QColor, QPainter, QPen
+    from convergence_plot import ConvergencePanel, ConvergencePlot, FRAME_INTERVAL
+    from pw_output import Event
+
+    app = get_app()
+
+    #a plot that draws a line between every pair of points, as a plotting library would without decimation
+    class NaivePlot(ConvergencePlot):
+
+        def paintEvent(self, event):
+            painter = QPainter(self)
+            painter.fillRect( self.rect(), QColor("white") )
+            painter.setPen( QPen(self.color, 1) )
+            values = self.values
+            low, high = min(values), max(values)
+            width, height = self.width() - 1, self.height() - 1
+            scale_x = width / max( len(values) - 1, 1 )
+            scale_y = height / ( high - low or 1.0 )
+            previous = None
+            for i, value in enumerate(values):
+                point = QPointF( i * scale_x, height - ( value - low ) * scale_y )
+                if previous is not None:
+                    painter.drawLine( QLineF(previous, point) )
+                previous = point
+
+    random.seed(0)
+
+    print("points     append/point   decimated paint   every-point paint")
+    for length in lengths:
+        values = [ -100.0 + 1e-3 * random.random() - 1e-6 * i for i in range(length) ]
+
+        plot = ConvergencePlot("energy")
+        plot.resize(800, 120)
+
+        start = time.perf_counter()
+        for value in values:
+            plot.series.append(value)
+        append_time = ( time.perf_counter() - start ) / length
+
+        paint_time = time_call( plot.grab, 10 )
+
+        naive = "%14s" % "-"
+        if length <= naive_limit:
+            naive_plot = NaivePlot("energy")
+            naive_plot.resize(800, 120)
+            naive_plot.values = values
+            naive = "%11.2f ms" % ( time_call( naive_plot.grab, 3 ) * 1e3 )
+
+        print("%8i   %9.2f us   %12.2f ms    %s" % ( length, append_time * 1e6, paint_time * 1e3, naive ))
+
+    #events arriving as fast as they can be added, with the event loop running between batches
+    panel = ConvergencePanel()
+    panel.resize(800, 400)
+    panel.show()
+    app.processEvents()
+
+    paints = [0]
+    paint = panel.accuracy.paintEvent
+    def counting_paint(event):
+        paints[0] += 1
+        paint(event)
+    panel.accuracy.paintEvent = counting_paint
+
+    events = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < stream_seconds:
+        for i in range(1000):
+            events += 1
+            panel.add_event( Event("accuracy", events // 20 + 1, events % 20 + 1, 10.0 ** -( events % 20 ) ) )
+        app.processEvents()
+    elapsed = time.perf_counter() - start
+
+    panel.close()
+
+    print("streaming: %i events in %.2f s, %i repaints of the accuracy plot (at most %i at one per %i ms)" %
+          ( events, elapsed, paints[0], int( elapsed * 1000 / FRAME_INTERVAL ) + 1, FRAME_INTERVAL ))
+
+
+
+
+#--------------------------------------------------------#
+# Content-addressed input cache
+#--------------------------------------------------------#
+
+def benchmark_cache(atoms = 100000, degauss = 50, cutoffs = 20, mock_jobs = 20):
+    """
+    Time the key of an input against writing it, count the distinct inputs of a sweep whose
+    variants are often identical, and run identical jobs with and without the input cache
+    """
+
+    import shutil
+    import tempfile
+    from input_cache import InputCache, input_key
+    from jobs import DONE, MOCK_COMMAND, JobRunner
+    from qe_input import QuantumEspressoInputFile
+    from sweep import Sweep, sweep_range
+
+    base = QuantumEspressoInputFile()
+    base.inputs.update( { "calculation": "scf", "ibrav": "2", "ecutwfc": "30", "occupations": "fixed" } )
+    base.set_card("ATOMIC_SPECIES", None, [ "Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF" ])
+    base.set_card("ATOMIC_POSITIONS", "alat", [ "Si 0.00 0.00 0.00", "Si 0.25 0.25 0.25" ])
+
+    large = QuantumEspressoInputFile()
+    large.inputs = dict(base.inputs)
+    large.cards = dict(base.cards)
+    large.set_card("ATOMIC_POSITIONS", "alat", [ "Si %.10f %.10f %.10f" % ( 1e-5 * i, 2e-5 * i, 3e-5 * i ) for i in range(atoms) ])
+
+    key_time = time_call( lambda: input_key(base), 200 )
+    write_time = time_call( lambda: base.write( io.StringIO() ), 200 )
+    large_key_time = time_call( lambda: input_key(large), 1 )
+    large_write_time = time_call( lambda: large.write( io.StringIO() ), 1 )
+
+    #degauss is only written with smearing, so the variants with fixed occupations differ only in ecutwfc
+    sweep = Sweep( base, { "ecutwfc": sweep_range(20, 20 + 5 * (cutoffs - 1), 5), "occupations": ["fixed", "smearing"],
+                           "degauss": sweep_range(0.001, 0.001 * degauss, 0.001) } )
+    distinct = len( { input_key( sweep.variant(i) ) for i in range( len(sweep) ) } )
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        results = []
+        for job_cache in ( None, InputCache( os.path.join(directory, "job_cache") ) ):
+            runner = JobRunner( os.path.join( directory, "jobs" if job_cache is None else "cached_jobs" ),
+                                MOCK_COMMAND + ["--delay", "0.01"], 2, cache = job_cache )
+            start = time.perf_counter()
+            for i in range(mock_jobs):
+                runner.submit(base)
+            runner.close()
+            results.append( ( time.perf_counter() - start, sum( not job.cached for job in runner.jobs ),
+                              sum( job.status == DONE for job in runner.jobs ) ) )
+
+    finally:
+        shutil.rmtree(directory)
+
+    print("input cache")
+    print("key of a small input:  %7.2f ms, writing it: %7.2f ms" % ( key_time * 1e3, write_time * 1e3 ))
+    print("key of %i atoms: %7.2f s,  writing it: %7.2f s" % ( atoms, large_key_time, large_write_time ))
+    print("sweep of %i variants, %i distinct inputs" % ( len(sweep), distinct ))
+    for label, ( elapsed, run, done ) in zip( ("no cache", "cache"), results ):
+        print("%i identical mock jobs, %-8s: %6.2f s, %i run, %i done" % ( mock_jobs, label, elapsed, run, done ))
+
+
+
+
+benchmarks = {
+    "keystroke": benchmark_keystroke,
+    "conditions": benchmark_conditions,
+    "typing": benchmark_typing,
+    "toggle": benchmark_toggle,
+    "schema": benchmark_schema,
+    "headless": benchmark_headless,
+    "writer": benchmark_writer,
+    "reader": benchmark_reader,
+    "open": benchmark_open,
+    "sweep": benchmark_sweep,
+    "structure": benchmark_structure,
+    "atoms": benchmark_atoms,
+    "import": benchmark_import,
+    "kpoints": benchmark_kpoints,
+    "validation": benchmark_validation,
+    "history": benchmark_history,
+    "autosave": benchmark_autosave,
+    "startup": benchmark_startup,
+    "instrumentation": benchmark_instrumentation,
+    "species": benchmark_species,
+    "jobs": benchmark_jobs,
+    "output": benchmark_output,
+    "plot": benchmark_plot,
+    "cache": benchmark_cache,
+    }
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
+        print("")
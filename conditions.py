@@ -0,0 +1,161 @@
+"""
+Compiled show conditions for the Quantum ESPRESSO input form
+
+A show condition is written as a nested list, either a comparison
+    [input_name, "==", value]    or    [input_name, "!=", value]
+or a compound of two conditions
+    [condition, "or", condition]    or    [condition, "and", condition]
+
+Each condition is compiled once into a tree of closures that evaluate with
+short-circuiting against a dictionary of inputs.  An input that has not been
+set compares as None.
+"""
+
+
+
+class Condition():
+    """
+    This class represents a single show condition compiled into a predicate
+    """
+
+    def __init__(self, source, predicate, inputs):
+
+        #the nested list this condition was compiled from
+        self.source = source
+
+        #callable taking a dictionary of inputs and returning True or False
+        self.predicate = predicate
+
+        #names of all inputs that this condition reads
+        self.inputs = inputs
+
+    def __call__(self, inputs):
+
+        return self.predicate(inputs)
+
+    def __repr__(self):
+
+        return "Condition(" + repr(self.source) + ")"
+
+
+
+#compiled conditions, keyed by the frozen form of their source
+_compiled = {}
+
+def compile_condition(condition):
+    """
+    Return the compiled Condition for a nested list condition
+    """
+
+    key = _freeze(condition)
+
+    try:
+        return _compiled[key]
+    except KeyError:
+        pass
+
+    predicate, inputs = _compile(condition)
+    compiled = Condition(condition, predicate, frozenset(inputs))
+    _compiled[key] = compiled
+
+    return compiled
+
+def _freeze(condition):
+
+    if isinstance(condition, list):
+        return tuple( _freeze(c) for c in condition )
+
+    return condition
+
+def _compile(condition):
+    """
+    Return a predicate closure for condition, along with the set of inputs it reads
+    """
+
+    try:
+        left, operator, right = condition
+    except (TypeError, ValueError):
+        raise ValueError('Malformed show condition: ' + repr(condition))
+
+    if operator in ("==", "!="):
+
+        if isinstance(left, list):
+            raise ValueError('Comparison must be against an input name: ' + repr(condition))
+
+        if operator == "==":
+            predicate = lambda inputs: inputs.get(left) == right
+        else:
+            predicate = lambda inputs: inputs.get(left) != right
+
+        return predicate, { left }
+
+    elif operator in ("or", "and"):
+
+        p1, inputs1 = _compile(left)
+        p2, inputs2 = _compile(right)
+
+        if operator == "or":
+            predicate = lambda inputs: p1(inputs) or p2(inputs)
+        else:
+            predicate = lambda inputs: p1(inputs) and p2(inputs)
+
+        return predicate, inputs1 | inputs2
+
+    raise ValueError('Show condition operator not recognized: ' + repr(operator))
+
+
+
+class ShowConditions():
+    """
+    This class holds the show conditions of a widget or group box
+
+    Conditions are compiled as they are appended.  The special condition
+    ["no_next_box"] does not read any input; it is recorded in self.no_next_box
+    and must be checked by the owner, since it depends on which group boxes exist.
+    """
+
+    def __init__(self):
+
+        #the conditions as originally written
+        self.sources = []
+
+        #compiled conditions, all of which must be satisfied
+        self.conditions = []
+
+        #names of all inputs read by the conditions, including the "no_next_box" pseudo-input
+        self.inputs = set()
+
+        #show only if the next group box has not been created
+        self.no_next_box = False
+
+    def append(self, condition):
+
+        self.sources.append(condition)
+
+        if condition[0] == "no_next_box":
+            self.no_next_box = True
+            self.inputs.add("no_next_box")
+            return
+
+        compiled = compile_condition(condition)
+        self.conditions.append(compiled)
+        self.inputs |= compiled.inputs
+
+    def evaluate(self, inputs):
+        """
+        Return True if every compiled condition is satisfied by inputs
+        """
+
+        for condition in self.conditions:
+            if not condition.predicate(inputs):
+                return False
+
+        return True
+
+    def __iter__(self):
+
+        return iter(self.sources)
+
+    def __len__(self):
+
+        return len(self.sources)
@@ -0,0 +1,382 @@
+"""
+Live plots of the convergence of a running pw.x job
+
+A ConvergencePanel follows the output file of a job on a background thread,
+using pw_output.follow(), and plots the estimated scf accuracy of every
+iteration against conv_thr, and the final energy and total force of every scf
+cycle against the number of cycles.
+
+Each plotted series is a DecimatedSeries: a fixed number of buckets holding
+the minimum, maximum and last value of a run of consecutive points, whose
+runs double in length whenever the buckets fill.  An md run of tens of
+thousands of steps is therefore stored and drawn in a number of buckets set
+by the width of the plot, not by the length of the run, and the envelope of
+the values is drawn as one vertical line per pixel column.  The plots are
+repainted on a timer, at most once per frame and only when new points have
+arrived, so the form stays responsive however fast the output is written.
+"""
+
+from PyQt5.QtWidgets import (QLabel, QSizePolicy, QVBoxLayout, QWidget)
+from PyQt5.QtGui import (QColor, QPainter, QPen)
+from PyQt5.QtCore import (QLineF, QPointF, QRectF, Qt, QTimer)
+
+import math
+import threading
+
+from pw_output import follow
+
+
+
+#number of buckets kept by each series, at least twice the width in pixels of a plot
+MAX_BUCKETS = 4096
+
+#milliseconds between repaints of the plots, at most
+FRAME_INTERVAL = 50
+
+#pw.x defaults of the settings the panel shows
+DEFAULT_SETTINGS = { "conv_thr": 1e-6, "electron_maxstep": 100, "mixing_beta": 0.7, "forc_conv_thr": 1e-3 }
+
+#inputs whose values the panel shows
+SETTINGS = tuple(DEFAULT_SETTINGS)
+
+#margins in pixels of the plotting area, for the title and the axis labels
+MARGIN_LEFT = 84
+MARGIN_RIGHT = 8
+MARGIN_TOP = 18
+MARGIN_BOTTOM = 8
+
+PLOT_HEIGHT = 120
+
+
+
+class DecimatedSeries():
+    """
+    This class holds a series of values at x = 0, 1, 2, ... as at most max_buckets min/max buckets
+
+    Each bucket covers span consecutive points.  When the buckets are full, each pair of
+    neighbouring buckets is merged into one and span doubles, so that appending costs O(1)
+    amortized time and the series never holds more than max_buckets buckets.
+    """
+
+    def __init__(self, max_buckets = MAX_BUCKETS):
+
+        #an even number, so that the buckets merge in pairs
+        self.max_buckets = max_buckets + max_buckets % 2
+
+        self.span = 1
+        self.count = 0
+
+        self.minima = []
+        self.maxima = []
+        self.lasts = []
+
+    def append(self, value):
+
+        if self.count % self.span:
+            if value < self.minima[-1]:
+                self.minima[-1] = value
+            if value > self.maxima[-1]:
+                self.maxima[-1] = value
+            self.lasts[-1] = value
+        else:
+            if len(self.minima) >= self.max_buckets:
+                self.merge()
+            self.minima.append(value)
+            self.maxima.append(value)
+            self.lasts.append(value)
+
+        self.count += 1
+
+    def merge(self):
+
+        minima, maxima = self.minima, self.maxima
+
+        self.minima = [ min(a, b) for a, b in zip( minima[0::2], minima[1::2] ) ]
+        self.maxima = [ max(a, b) for a, b in zip( maxima[0::2], maxima[1::2] ) ]
+        self.lasts = self.lasts[1::2]
+        self.span *= 2
+
+    def clear(self):
+
+        self.__init__(self.max_buckets)
+
+    def range(self):
+        """
+        Return the smallest and largest value, or None if there are none
+        """
+
+        if not self.minima:
+            return None
+
+        return min(self.minima), max(self.maxima)
+
+    def columns(self, width, length = None):
+        """
+        Return the (minimum, maximum, last) of the points in each of width pixel columns, over
+        the first length points (by default, all of them), with None for empty columns
+        """
+
+        #the first point is at the left edge, and the last of length points at the right edge
+        last_x = max( ( length or self.count ) - 1, 1 )
+
+        columns = [None] * width
+        for i, ( low, high, last ) in enumerate( zip(self.minima, self.maxima, self.lasts) ):
+            column = min( i * self.span * ( width - 1 ) // last_x, width - 1 )
+            current = columns[column]
+            if current is None:
+                columns[column] = [low, high, last]
+            else:
+                if low < current[0]:
+                    current[0] = low
+                if high > current[1]:
+                    current[1] = high
+                current[2] = last
+
+        return columns
+
+
+
+class ConvergencePlot(QWidget):
+    """
+    This class draws a DecimatedSeries, with an optional threshold, on a linear or logarithmic axis
+    """
+
+    def __init__(self, title, log = False, color = "#1f5fbf", parent = None):
+        super(ConvergencePlot, self).__init__(parent)
+
+        self.title = title
+        self.log = log
+        self.color = QColor(color)
+
+        self.series = DecimatedSeries()
+
+        #value drawn as a horizontal line, such as conv_thr, or None
+        self.threshold = None
+
+        #number of points the x axis spans, if more than the series holds, or None
+        self.length = None
+
+        #held while the series is read or changed, as points arrive on another thread
+        self.lock = threading.Lock()
+
+        self.setMinimumHeight(PLOT_HEIGHT)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def transform(self, value):
+
+        if self.log:
+            return math.log10(value) if value > 0 else None
+
+        return value
+
+    def paintEvent(self, event):
+
+        painter = QPainter(self)
+        painter.fillRect( self.rect(), Qt.white )
+        painter.setPen(Qt.black)
+
+        width = self.width() - MARGIN_LEFT - MARGIN_RIGHT
+        height = self.height() - MARGIN_TOP - MARGIN_BOTTOM
+        painter.drawText( MARGIN_LEFT, MARGIN_TOP - 4, self.title )
+        painter.drawRect( MARGIN_LEFT, MARGIN_TOP, width, height )
+
+        if width < 2 or height < 2:
+            return
+
+        with self.lock:
+            value_range = self.series.range()
+            columns = self.series.columns( width, max( self.length or 0, self.series.count ) )
+
+        if value_range is None:
+            return
+
+        #the axis covers the values and the threshold, on a log axis only the positive ones
+        values = [ self.transform(v) for v in value_range + ( ( self.threshold, ) if self.threshold else () ) ]
+        values = [ v for v in values if v is not None ]
+        if not values:
+            return
+
+        low, high = min(values), max(values)
+        if high - low < 1e-12:
+            low, high = low - 0.5, high + 0.5
+
+        #a little room above and below, so that lines at the extremes are not hidden by the frame
+        padding = 0.05 * ( high - low )
+        low, high = low - padding, high + padding
+
+        def to_y(value):
+            value = self.transform(value)
+            if value is None: #not positive, on a log axis
+                value = low
+            return MARGIN_TOP + height - ( value - low ) / ( high - low ) * height
+
+        painter.drawText( QRectF( 0, MARGIN_TOP, MARGIN_LEFT - 4, 16 ), Qt.AlignRight | Qt.AlignTop, self.label(high) )
+        painter.drawText( QRectF( 0, MARGIN_TOP + height - 16, MARGIN_LEFT - 4, 16 ), Qt.AlignRight | Qt.AlignBottom,
+                          self.label(low) )
+
+        if self.threshold:
+            painter.setPen( QPen( QColor("#c00000"), 1, Qt.DashLine ) )
+            y = to_y(self.threshold)
+            painter.drawLine( QLineF( MARGIN_LEFT, y, MARGIN_LEFT + width, y ) )
+
+        #the envelope of each column, and a line through the last value of each column
+        painter.setPen( QPen(self.color, 1) )
+        previous = None
+        for x, column in enumerate(columns):
+            if column is None:
+                continue
+            low_value, high_value, last = column
+            px = MARGIN_LEFT + x + 0.5
+            painter.drawLine( QLineF( px, to_y(low_value), px, to_y(high_value) ) )
+            point = QPointF( px, to_y(last) )
+            if previous is not None:
+                painter.drawLine( QLineF(previous, point) )
+            previous = point
+
+    def label(self, value):
+
+        return "%.1e" % math.pow(10, value) if self.log else "%.6g" % value
+
+
+
+class ConvergencePanel(QWidget):
+    """
+    This class shows the convergence of a job, read from its output as it is written
+    """
+
+    def __init__(self, settings = None, parent = None):
+        super(ConvergencePanel, self).__init__(parent)
+
+        self.accuracy = ConvergencePlot("Estimated scf accuracy (Ry), each iteration", log = True)
+        self.energy = ConvergencePlot("Total energy (Ry), each scf cycle", color = "#1f7f3f")
+        self.force = ConvergencePlot("Total force (Ry/au), each scf cycle", log = True, color = "#7f3f1f")
+        self.plots = (self.accuracy, self.energy, self.force)
+
+        self.status = QLabel()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.status)
+        for plot in self.plots:
+            layout.addWidget(plot)
+
+        #the latest of each kind of event, for the status line
+        self.step = 0
+        self.iteration = 0
+        self.latest = {}
+        self.done = False
+
+        #have points arrived since the plots were last repainted? Set by the reading thread
+        self.dirty = False
+
+        self.thread = None
+        self.stopping = False
+
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.set_settings(settings or {})
+
+        #repaint at most once per frame, however fast events arrive
+        self.timer = QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL)
+        self.timer.timeout.connect(self.on_frame)
+        self.timer.start()
+
+    def set_settings(self, inputs):
+        """
+        Take conv_thr, electron_maxstep, mixing_beta and forc_conv_thr from inputs, where they are set
+        """
+
+        for name, default in DEFAULT_SETTINGS.items():
+            try:
+                value = float( str( inputs.get(name) or default ).lower().replace("d", "e") )
+            except ValueError: #not yet a number; the validator reports it
+                value = default
+            self.settings[name] = value
+
+        self.accuracy.threshold = self.settings["conv_thr"]
+        self.force.threshold = self.settings["forc_conv_thr"]
+
+        self.dirty = True
+
+    def add_event(self, event):
+        """
+        Add the point of an event to its plot; may be called from any thread
+        """
+
+        kind = event.kind
+
+        if kind == "accuracy":
+            plot = self.accuracy
+        elif kind == "final_energy":
+            plot = self.energy
+        elif kind == "force":
+            plot = self.force
+        else:
+            if kind == "job_done":
+                self.done = True
+            self.latest[kind] = event.value
+            return
+
+        with plot.lock:
+            plot.series.append(event.value)
+
+        self.step = event.step
+        self.iteration = event.iteration
+        self.latest[kind] = event.value
+        self.dirty = True
+
+    def watch(self, path, stop = None):
+        """
+        Clear the plots, and follow the output file at path on a background thread until the job
+        is done, stop() returns True, or the panel is stopped
+        """
+
+        self.stop()
+
+        for plot in self.plots:
+            with plot.lock:
+                plot.series.clear()
+        self.latest = {}
+        self.done = False
+        self.stopping = False
+        self.dirty = True
+
+        def stopped():
+            return self.stopping or ( stop is not None and stop() )
+
+        def read():
+            for event in follow(path, stopped):
+                if self.stopping:
+                    return
+                self.add_event(event)
+
+        self.thread = threading.Thread(target = read, name = "convergence", daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop following the output file
+        """
+
+        self.stopping = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def on_frame(self):
+
+        if not self.dirty:
+            return
+        self.dirty = False
+
+        #the x axis of the accuracy spans electron_maxstep iterations of the first cycle, or the run so far
+        self.accuracy.length = int( self.settings["electron_maxstep"] )
+
+        accuracy = self.latest.get("accuracy")
+        self.status.setText( "scf cycle %i, iteration %i of at most %i, mixing_beta %g%s%s" %
+                             ( self.step, self.iteration, self.settings["electron_maxstep"], self.settings["mixing_beta"],
+                               "" if accuracy is None else ", accuracy %.2e Ry (conv_thr %.0e)" % ( accuracy, self.settings["conv_thr"] ),
+                               ", done" if self.done else "" ) )
+
+        for plot in self.plots:
+            plot.update()
@@ -0,0 +1,317 @@
+"""
+Headless engine of the Quantum ESPRESSO input form
+
+InputForm decides which groups and fields of the form are open and shown, and
+which inputs are therefore active, using only a QuantumEspressoInputFile and
+the form schema.  It does not import Qt, so it can be used from scripts and on
+machines without a display; the Dialog in window.py is a view over it.
+"""
+
+from conditions import ShowConditions
+from instrumentation import COUNTERS
+from qe_input import QuantumEspressoInputFile
+from schema import PW_DEFAULTS, FieldSchema, load_schema, pw_default
+
+
+
+#every group with a next group ends with this button
+NEXT_BUTTON = FieldSchema("button", "Next", show_conditions = [ ["no_next_box"] ])
+
+#value given to an input when its field is first opened, by field type
+DEFAULT_VALUES = { "text": "", "plain_text": "", "check": 0 }
+
+#value of a check box that is checked, as Qt gives it
+CHECKED = 2
+
+
+
+def effective_calculation(inputs):
+    """
+    Return the calculation pw.x is given for the inputs of a form, such as "vc-relax"
+    """
+
+    calculation = inputs.get("calculation") or "scf"
+    if calculation in ("relax", "md") and inputs.get("GUI_variable_cell") == CHECKED:
+        calculation = "vc-" + calculation
+
+    return calculation
+
+def opened_value(schema, calculation):
+    """
+    Return the value an unset input takes when its field is first opened, and whether pw.x takes
+    the same value when the parameter is left out
+
+    A field shows pw.x's own default where it offers it; otherwise a combo box shows its first
+    choice, which is then written like any other unless pw.x picks the parameter by calculation.
+    """
+
+    if schema.namelist is None:
+        return ( schema.choices[0][1] if schema.type == "combo" else DEFAULT_VALUES.get(schema.type) ), True
+
+    default = pw_default(schema.key, calculation) if isinstance(schema.key, str) else None
+    default = None if default is None else str(default).lower()
+
+    if schema.type == "combo":
+        for label, value in schema.choices:
+            if str(value).lower() == default:
+                return value, True
+        #a parameter pw.x picks by calculation stays a default, as the writer compares it with
+        #pw.x's value for the calculation chosen since
+        return schema.choices[0][1], isinstance( PW_DEFAULTS.get(schema.key), dict )
+
+    if schema.type == "check":
+        unchecked, checked = schema.values if schema.values is not None else (False, True)
+        if str(checked).lower() == default:
+            return CHECKED, True
+        return 0, str(unchecked).lower() == default
+
+    return DEFAULT_VALUES.get(schema.type), True
+
+
+
+#compiled show conditions of each field and group schema; they are never modified
+#after being built, so every open form shares them
+_show_conditions = {}
+
+def show_conditions(schema):
+    """
+    Return the compiled ShowConditions of a FieldSchema or GroupSchema
+    """
+
+    try:
+        return _show_conditions[schema]
+    except KeyError:
+        pass
+
+    conditions = ShowConditions()
+    for condition in schema.show_conditions:
+        conditions.append(condition)
+
+    _show_conditions[schema] = conditions
+
+    return conditions
+
+
+def reveal_inputs(inputs, input_names, schema, override = False):
+    """
+    Set the GUI_* inputs whose values show the fields of input_names
+
+    Only the GUI_* inputs compared with "==" in a field's own show conditions are set.
+    Unless override is True, GUI_* inputs that already have a value are left alone.
+    """
+
+    for input_name in input_names:
+        for field in schema.fields.get(input_name, ()):
+            for condition in field.show_conditions:
+                if len(condition) != 3 or condition[1] != "==" or not str( condition[0] ).startswith("GUI_"):
+                    continue
+                if override or condition[0] not in inputs:
+                    inputs[ condition[0] ] = condition[2]
+
+
+
+class FieldState():
+    """
+    This class holds the state of one field of an open group
+    """
+
+    def __init__(self, group, index, schema):
+
+        self.group = group
+
+        #position of this field within its group
+        self.index = index
+
+        self.schema = schema
+        self.type = schema.type
+        self.input_name = schema.input_name
+
+        self.show_conditions = show_conditions(schema)
+
+        #do the show conditions of this field currently hold?
+        self.shown = False
+
+class GroupState():
+    """
+    This class holds the state of one open group
+    """
+
+    def __init__(self, schema):
+
+        self.name = schema.name
+        self.schema = schema
+        self.next_group = schema.next_group
+
+        #a group is its own group, so that groups and fields can be evaluated alike
+        self.group = self
+
+        self.show_conditions = show_conditions(schema)
+
+        fields = list(schema.fields)
+        if self.next_group is not None:
+            fields.append(NEXT_BUTTON)
+
+        self.fields = [ FieldState(self, i, field) for i, field in enumerate(fields) ]
+
+        #do the show conditions of this group currently hold?
+        self.shown = False
+
+
+
+class InputForm():
+    """
+    This class resolves which groups and fields of the form are shown, and which inputs are active
+    """
+
+    def __init__(self, input_file = None, schema = None):
+
+        self.schema = schema or load_schema()
+
+        if input_file is None:
+            input_file = QuantumEspressoInputFile()
+        self.input_file = input_file
+
+        #open groups, in the order they were opened
+        self.groups = []
+
+        #open groups by name
+        self.opened = {}
+
+        #reverse index from each input name to the groups and fields whose show conditions
+        #reference it; the "no_next_box" pseudo-input is changed by opening a group
+        self.dependents = {}
+
+    def open_group(self, group_name):
+        """
+        Open a group, and keep opening the next group for as long as the opened group is hidden
+
+        Returns the list of groups opened, and the list of previously open groups and
+        fields whose shown state changed as a result
+        """
+
+        opened = []
+        changed = []
+
+        while True:
+
+            group = GroupState( self.schema[group_name] )
+
+            #inputs keep their current value; only unset inputs take a value, which is noted as a
+            #default, not to be written, if pw.x takes the same value without it
+            inputs = self.input_file.inputs
+            defaults = self.input_file.defaults
+            calculation = effective_calculation(inputs)
+            for field in group.fields:
+                if field.input_name in inputs or not ( field.type == "combo" or field.type in DEFAULT_VALUES ):
+                    continue
+                value, default = opened_value(field.schema, calculation)
+                inputs[field.input_name] = value
+                if default:
+                    defaults.add(field.input_name)
+
+            self.groups.append(group)
+            self.opened[group.name] = group
+            opened.append(group)
+
+            COUNTERS.conditions += 1 + len(group.fields)
+            for item in [group] + group.fields:
+                item.shown = self.evaluate(item)
+                for input_name in item.show_conditions.inputs:
+                    self.dependents.setdefault(input_name, []).append(item)
+
+            #the "Next" buttons depend on which groups are open
+            changed.extend( item for item in self.update("no_next_box") if item.group not in opened )
+
+            if group.shown or group.next_group is None:
+                break
+
+            group_name = group.next_group
+
+        return opened, changed
+
+    def open_all(self):
+        """
+        Open every remaining group in the chain, as if "Next" had been clicked through to the end
+        """
+
+        if not self.groups:
+            self.open_group(self.schema.first_group)
+
+        while self.groups[-1].next_group is not None:
+            self.open_group(self.groups[-1].next_group)
+
+    def evaluate(self, item):
+        """
+        Return whether the show conditions of a group or field hold
+        """
+
+        conditions = item.show_conditions
+
+        if conditions.no_next_box: #show only if the next group has not been opened
+            if item.group.next_group in self.opened:
+                return False
+
+        return conditions.evaluate(self.input_file.inputs)
+
+    def update(self, input_name):
+        """
+        Re-evaluate the groups and fields whose show conditions reference input_name
+
+        Returns the list of groups and fields whose shown state changed
+        """
+
+        changed = []
+
+        items = self.dependents.get(input_name, ())
+        COUNTERS.conditions += len(items)
+
+        for item in items:
+            shown = self.evaluate(item)
+            if shown != item.shown:
+                item.shown = shown
+                changed.append(item)
+
+        return changed
+
+    def update_all(self):
+        """
+        Re-evaluate every open group and field, returning those whose shown state changed
+        """
+
+        changed = []
+
+        for group in self.groups:
+            COUNTERS.conditions += 1 + len(group.fields)
+            for item in [group] + group.fields:
+                shown = self.evaluate(item)
+                if shown != item.shown:
+                    item.shown = shown
+                    changed.append(item)
+
+        return changed
+
+    def set_input(self, name, value):
+        """
+        Set an input and return the groups and fields whose shown state changed
+        """
+
+        self.input_file.set_input(name, value)
+
+        return self.update(name)
+
+    def active_fields(self):
+        """
+        Return the fields that are shown in shown groups, in form order
+        """
+
+        return [ field for group in self.groups if group.shown
+                       for field in group.fields if field.shown and field.type != "button" ]
+
+    def active_inputs(self):
+        """
+        Return a dictionary of the active inputs and their values, in form order
+        """
+
+        inputs = self.input_file.inputs
+
+        return { field.input_name: inputs[field.input_name] for field in self.active_fields() }
@@ -0,0 +1,191 @@
+"""
+Undo and redo history of the inputs of the form
+
+History is a log of changes rather than of snapshots: each step holds only the
+(input name, old value, new value) of the inputs it changed, and whether the
+old value was a default the form filled in, so a long session
+costs memory in proportion to the number of edits, not to the number of inputs
+times the depth of the history.  Consecutive changes to the same input within a
+short interval, such as the keystrokes of a text field, are coalesced into a
+single step.  Like form.py, this module does not import Qt.
+"""
+
+import collections
+import time
+
+
+
+#value recorded for an input that was not set, so that undoing its first change removes it again
+MISSING = object()
+
+#changes to one input closer together than this, in seconds, are coalesced into one step
+COALESCE_INTERVAL = 1.0
+
+#number of steps kept; the oldest steps are dropped beyond it
+MAX_STEPS = 10000
+
+
+
+class History():
+    """
+    This class holds the undo and redo steps of a dictionary of inputs
+
+    A step is a list of [input_name, old, new, default] changes, applied in order and undone in
+    reverse, where default is whether old was a default the form filled in rather than a value set.
+    """
+
+    def __init__(self, max_steps = MAX_STEPS, coalesce_interval = COALESCE_INTERVAL, clock = time.monotonic):
+
+        self.undo_steps = collections.deque(maxlen = max_steps)
+        self.redo_steps = []
+
+        self.coalesce_interval = coalesce_interval
+        self.clock = clock
+
+        #can changes still be coalesced into the last step?
+        self.open = False
+
+        #time of the last change recorded
+        self.last_time = None
+
+        #nesting depth of group(); while positive, every change joins one step
+        self.grouping = 0
+
+    def record(self, name, old, new, default = False):
+        """
+        Record that input name changed from old (MISSING if it was not set) to new
+
+        default is whether old was a default the form filled in, which setting the input, even
+        to the same value, makes a value set.
+        """
+
+        if old is not MISSING and old == new and not default:
+            return
+
+        now = self.clock()
+        self.redo_steps = []
+
+        step = self.undo_steps[-1] if self.undo_steps else None
+
+        if self.grouping and self.open:
+            #a change already in this group step only updates its new value
+            for change in step:
+                if change[0] == name:
+                    change[2] = new
+                    break
+            else:
+                step.append( [name, old, new, default] )
+
+        elif ( self.open and len(step) == 1 and step[0][0] == name
+               and now - self.last_time <= self.coalesce_interval ):
+            step[0][2] = new
+
+            #typing back to the original value leaves nothing to undo, unless it was a default
+            if step[0][1] is not MISSING and step[0][1] == new and not step[0][3]:
+                self.undo_steps.pop()
+                self.open = False
+
+        else:
+            self.undo_steps.append( [ [name, old, new, default] ] )
+            self.open = True
+
+        self.last_time = now
+
+    def checkpoint(self):
+        """
+        End the current step, so that the next change starts a new one
+        """
+
+        if not self.grouping:
+            self.open = False
+
+    def begin_group(self):
+        """
+        Start recording every change, until the matching end_group(), as a single step
+        """
+
+        if not self.grouping:
+            self.undo_steps.append( [] )
+            self.open = True
+
+        self.grouping += 1
+
+    def end_group(self):
+
+        self.grouping -= 1
+
+        if not self.grouping:
+            if self.undo_steps and not self.undo_steps[-1]:
+                self.undo_steps.pop()
+            self.open = False
+
+    def can_undo(self):
+
+        return bool(self.undo_steps)
+
+    def can_redo(self):
+
+        return bool(self.redo_steps)
+
+    def undo(self, inputs, defaults = None, apply = None):
+        """
+        Revert the last step in inputs, and return the names of the inputs it changed
+
+        If defaults is given, the set of inputs that are defaults is reverted with it.  Each
+        value is set by apply(inputs, name, value), by default apply_value().
+        """
+
+        if not self.undo_steps:
+            return []
+
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        self.open = False
+
+        apply = apply or apply_value
+        for name, old, new, default in reversed(step):
+            apply(inputs, name, old)
+            if defaults is not None and default:
+                defaults.add(name)
+
+        return [ change[0] for change in step ]
+
+    def redo(self, inputs, defaults = None, apply = None):
+        """
+        Reapply the last undone step to inputs, and return the names of the inputs it changed
+
+        If defaults is given, the inputs the step set are taken out of it, as they were when
+        recorded.  Each value is set by apply(inputs, name, value), by default apply_value().
+        """
+
+        if not self.redo_steps:
+            return []
+
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        self.open = False
+
+        apply = apply or apply_value
+        for name, old, new, default in step:
+            apply(inputs, name, new)
+            if defaults is not None:
+                defaults.discard(name)
+
+        return [ change[0] for change in step ]
+
+    def clear(self):
+
+        self.undo_steps.clear()
+        self.redo_steps = []
+        self.open = False
+
+    def __len__(self):
+
+        return len(self.undo_steps)
+
+def apply_value(inputs, name, value):
+
+    if value is MISSING:
+        inputs.pop(name, None)
+    else:
+        inputs[name] = value
@@ -0,0 +1,470 @@
+"""
+Importers of atomic structures from other codes
+
+Extended XYZ, CIF and VASP POSCAR files are read into structure.Structure.
+XYZ trajectories and POSCAR files are memory-mapped: the frames before the
+one requested are skipped by counting newlines in large slices of the
+mapping, so that taking one frame of a large trajectory reads neither the
+frames after it nor, as Python objects, the frames before it.  The lines of
+a frame are split once and each column is converted by NumPy.
+"""
+
+import math
+import mmap
+import os
+import re
+
+import numpy as np
+
+from structure import Species, Structure
+
+
+
+FORMATS = ("xyz", "cif", "poscar")
+
+#bytes examined at a time while skipping lines
+SKIP_CHUNK = 1 << 20
+
+#standard atomic weights, used for ATOMIC_SPECIES; elements not listed are given a mass of 1
+MASSES = dict( (symbol, float(mass)) for symbol, mass in ( item.split(":") for item in """
+    H:1.008 He:4.0026 Li:6.94 Be:9.0122 B:10.81 C:12.011 N:14.007 O:15.999 F:18.998 Ne:20.180
+    Na:22.990 Mg:24.305 Al:26.982 Si:28.085 P:30.974 S:32.06 Cl:35.45 Ar:39.948 K:39.098 Ca:40.078
+    Sc:44.956 Ti:47.867 V:50.942 Cr:51.996 Mn:54.938 Fe:55.845 Co:58.933 Ni:58.693 Cu:63.546 Zn:65.38
+    Ga:69.723 Ge:72.630 As:74.922 Se:78.971 Br:79.904 Kr:83.798 Rb:85.468 Sr:87.62 Y:88.906 Zr:91.224
+    Nb:92.906 Mo:95.95 Tc:98.0 Ru:101.07 Rh:102.91 Pd:106.42 Ag:107.87 Cd:112.41 In:114.82 Sn:118.71
+    Sb:121.76 Te:127.60 I:126.90 Xe:131.29 Cs:132.91 Ba:137.33 La:138.91 Ce:140.12 Pr:140.91 Nd:144.24
+    Sm:150.36 Eu:151.96 Gd:157.25 Tb:158.93 Dy:162.50 Ho:164.93 Er:167.26 Tm:168.93 Yb:173.05 Lu:174.97
+    Hf:178.49 Ta:180.95 W:183.84 Re:186.21 Os:190.23 Ir:192.22 Pt:195.08 Au:196.97 Hg:200.59 Tl:204.38
+    Pb:207.2 Bi:208.98 Po:209.0 At:210.0 Rn:222.0 U:238.03
+    """.split() ) )
+
+
+
+def guess_format(path):
+    """
+    Return the format of a structure file from its name
+    """
+
+    name = os.path.basename(path).lower()
+
+    if name.endswith(".xyz") or name.endswith(".extxyz"):
+        return "xyz"
+    if name.endswith(".cif"):
+        return "cif"
+    if "poscar" in name or "contcar" in name or name.endswith(".vasp"):
+        return "poscar"
+
+    raise ValueError('Structure format not recognized from the file name: ' + path)
+
+def read_structure(path, format = None, frame = 0):
+    """
+    Return the Structure in the file at path; for an XYZ trajectory, that of the given frame
+    """
+
+    format = format or guess_format(path)
+
+    if format == "xyz":
+        return read_xyz(path, frame)
+    if format == "cif":
+        return read_cif(path)
+    if format == "poscar":
+        return read_poscar(path)
+
+    raise ValueError('Structure format not recognized: ' + repr(format))
+
+def import_structure(input_file, path, format = None, frame = 0):
+    """
+    Read a structure file and set it as the structure of input_file, which sets
+    ibrav = 0 and the lattice vectors if the file gives a cell
+    """
+
+    structure = read_structure(path, format, frame)
+    input_file.set_structure(structure)
+
+    return structure
+
+
+
+def species_for(names):
+    """
+    Return the Species for each distinct name in names, in order of first appearance,
+    and the index of each name's species
+    """
+
+    unique, first, inverse = np.unique( names, return_index = True, return_inverse = True )
+
+    #np.unique sorts the names; put the species in the order they first appear instead
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange( len(order) )
+
+    species = []
+    for name in unique[order]:
+        name = str(name)
+        element = re.match(r"[A-Z][a-z]?", name)
+        mass = MASSES.get( element.group(0) if element else name, 1.0 )
+        species.append( Species( name, mass, name + ".UPF" ) )
+
+    return species, rank[ inverse.reshape(-1) ].astype(np.int32)
+
+def cell_from_parameters(a, b, c, alpha, beta, gamma):
+    """
+    Return the lattice vectors of a cell given by lengths and angles in degrees, with the
+    first vector along x and the second in the xy plane
+    """
+
+    alpha, beta, gamma = ( math.radians(angle) for angle in (alpha, beta, gamma) )
+
+    cx = c * math.cos(beta)
+    cy = c * ( math.cos(alpha) - math.cos(beta) * math.cos(gamma) ) / math.sin(gamma)
+    cz = math.sqrt( max( 0.0, c * c - cx * cx - cy * cy ) )
+
+    return np.array( [ [ a, 0.0, 0.0 ],
+                       [ b * math.cos(gamma), b * math.sin(gamma), 0.0 ],
+                       [ cx, cy, cz ] ] )
+
+def _open_map(path):
+
+    with open(path, "rb") as f:
+        if os.fstat( f.fileno() ).st_size == 0:
+            raise ValueError('Empty structure file: ' + path)
+        return mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+
+def _skip_lines(data, pos, count):
+    """
+    Return the position after the next count newlines in data from pos
+    """
+
+    #slices of about the size of the lines being skipped, so that short frames scan little
+    size = min( SKIP_CHUNK, max( 4096, count * 128 ) )
+
+    while count > 0:
+
+        length = min( size, len(data) - pos )
+        if length <= 0:
+            raise EOFError('Unexpected end of file')
+
+        #the newlines of the slice are found by NumPy over the mapping, without copying it
+        newlines = np.flatnonzero( np.frombuffer(data, dtype = np.uint8, count = length, offset = pos) == 10 )
+
+        if len(newlines) < count:
+            count -= len(newlines)
+            pos += length
+            continue
+
+        return pos + int( newlines[count - 1] ) + 1
+
+    return pos
+
+def _read_line(data, pos):
+    """
+    Return the line of data starting at pos, and the position of the next line
+    """
+
+    end = data.find(b"\n", pos)
+    if end < 0:
+        end = len(data)
+
+    return data[pos:end].decode(), end + 1
+
+def _columns(tokens, width, columns, dtype = np.float64):
+    """
+    Return the given columns of a table of width tokens per row, converted to an array
+    """
+
+    return np.column_stack( [ np.array( tokens[c::width], dtype = dtype ) for c in columns ] )
+
+
+
+#--------------------------------------------------------#
+# Extended XYZ
+#--------------------------------------------------------#
+def _xyz_header(comment):
+    """
+    Return the cell, and the columns of the species and positions, given by the comment
+    line of an extended XYZ frame
+    """
+
+    cell = None
+    lattice = re.search(r'Lattice\s*=\s*"([^"]*)"', comment)
+    if lattice:
+        cell = np.array( lattice.group(1).split(), dtype = np.float64 ).reshape(3, 3)
+
+    species_column, position_column = 0, 1
+    properties = re.search(r"Properties\s*=\s*(\S+)", comment)
+    if properties:
+        fields = properties.group(1).split(":")
+        column = 0
+        for name, _, count in zip( fields[0::3], fields[1::3], fields[2::3] ):
+            if name == "species":
+                species_column = column
+            elif name == "pos":
+                position_column = column
+            column += int(count)
+
+    return cell, species_column, position_column
+
+def _xyz_frame(data, pos):
+    """
+    Return the Structure of the XYZ frame starting at pos, and the position of the next frame
+    """
+
+    line, pos = _read_line(data, pos)
+    if not line.strip():
+        raise EOFError('Unexpected end of file')
+    try:
+        nat = int(line)
+    except ValueError:
+        raise ValueError('Expected the number of atoms of an XYZ frame, found: ' + line.strip())
+
+    comment, pos = _read_line(data, pos)
+    cell, species_column, position_column = _xyz_header(comment)
+
+    end = _skip_lines(data, pos, nat)
+    tokens = data[pos:end].decode().split()
+
+    if nat == 0 or len(tokens) % nat:
+        raise ValueError('Every atom of an XYZ frame must have the same number of columns')
+    width = len(tokens) // nat
+
+    species, types = species_for( np.array( tokens[species_column::width] ) )
+    positions = _columns( tokens, width, range(position_column, position_column + 3) )
+
+    return Structure(species, types, positions, "angstrom", cell), end
+
+def _skip_xyz_frames(data, pos, frames):
+    """
+    Return the position of the frame that follows the given number of frames from pos
+    """
+
+    for i in range(frames):
+        line, after = _read_line(data, pos)
+        if not line.strip():
+            raise EOFError('Unexpected end of file')
+        try:
+            nat = int(line)
+        except ValueError:
+            raise ValueError('Expected the number of atoms of an XYZ frame, found: ' + line.strip())
+        pos = _skip_lines(data, after, nat + 1)
+
+    return pos
+
+def read_xyz(path, frame = 0):
+    """
+    Return the Structure of one frame of an (extended) XYZ file
+    """
+
+    data = _open_map(path)
+    try:
+        pos = _skip_xyz_frames(data, 0, frame)
+        return _xyz_frame(data, pos)[0]
+    except EOFError:
+        raise ValueError('The XYZ file has fewer than ' + str(frame + 1) + ' frames: ' + path)
+    finally:
+        data.close()
+
+def iter_xyz(path):
+    """
+    Yield the Structure of each frame of an XYZ trajectory in turn
+    """
+
+    data = _open_map(path)
+    try:
+        pos = 0
+        while pos < len(data):
+            line, after = _read_line(data, pos)
+            if not line.strip(): #blank lines at the end of the file
+                pos = after
+                continue
+            structure, pos = _xyz_frame(data, pos)
+            yield structure
+    finally:
+        data.close()
+
+
+
+#--------------------------------------------------------#
+# VASP POSCAR
+#--------------------------------------------------------#
+def read_poscar(path):
+    """
+    Return the Structure of a VASP 5 POSCAR or CONTCAR file
+    """
+
+    data = _open_map(path)
+    try:
+        lines = []
+        pos = 0
+        #the header is at most 9 lines, after which the positions start
+        while len(lines) < 9 and pos < len(data):
+            line, pos = _read_line(data, pos)
+            lines.append( ( line, pos ) )
+
+        scale = float( lines[1][0].split()[0] )
+        cell = np.array( " ".join( line for line, _ in lines[2:5] ).split()[:9], dtype = np.float64 ).reshape(3, 3)
+
+        names = lines[5][0].split()
+        if all( name.isdigit() for name in names ):
+            raise ValueError('POSCAR files without species names (VASP 4) are not supported: ' + path)
+        counts = [ int(count) for count in lines[6][0].split() ]
+
+        index = 7
+        selective = lines[index][0].strip()[:1] in ("S", "s")
+        if selective:
+            index += 1
+        cartesian = lines[index][0].strip()[:1] in ("C", "c", "K", "k")
+        start = lines[index][1]
+
+        nat = sum(counts)
+        end = _skip_lines(data, start, nat) if nat else start
+        tokens = data[start:end].decode().split()
+    finally:
+        data.close()
+
+    #a negative scale is the volume of the cell
+    if scale < 0:
+        scale = ( -scale / abs( np.linalg.det(cell) ) ) ** (1.0 / 3.0)
+    cell *= scale
+
+    width = len(tokens) // nat if nat else 3
+    positions = _columns( tokens, width, (0, 1, 2) )
+    if_pos = None
+    if selective:
+        if_pos = np.column_stack( [ np.char.startswith( np.char.upper( np.array( tokens[c::width] ) ), "T" )
+                                    for c in (3, 4, 5) ] ).astype(np.int8)
+
+    species = []
+    for name in names:
+        element = re.match(r"[A-Z][a-z]?", name)
+        species.append( Species( name, MASSES.get( element.group(0) if element else name, 1.0 ), name + ".UPF" ) )
+    types = np.repeat( np.arange( len(counts), dtype = np.int32 ), counts )
+
+    if cartesian:
+        return Structure(species, types, positions * scale, "angstrom", cell, if_pos)
+
+    return Structure(species, types, positions, "crystal", cell, if_pos)
+
+
+
+#--------------------------------------------------------#
+# CIF
+#--------------------------------------------------------#
+def _cif_number(text):
+
+    #uncertainties are written in parentheses, such as 5.431(2)
+    return float( text.split("(")[0] )
+
+def _symmetry_operation(text):
+    """
+    Return the rotation matrix and translation of a symmetry operation such as "-y,x-y,z+1/3"
+    """
+
+    rotation = np.zeros( (3, 3) )
+    translation = np.zeros(3)
+
+    parts = text.replace(" ", "").lower().split(",")
+    if len(parts) != 3:
+        raise ValueError('Symmetry operation not recognized: ' + text)
+
+    for row, part in enumerate(parts):
+        for sign, term in re.findall(r"([+-]?)([^+-]+)", part):
+            factor = -1.0 if sign == "-" else 1.0
+            if term in ("x", "y", "z"):
+                rotation[ row, "xyz".index(term) ] += factor
+            elif "/" in term:
+                numerator, denominator = term.split("/")
+                translation[row] += factor * float(numerator) / float(denominator)
+            else:
+                translation[row] += factor * float(term)
+
+    return rotation, translation
+
+def _cif_tokens(line):
+
+    return [ a or b or c for a, b, c in re.findall(r"'([^']*)'|\"([^\"]*)\"|(\S+)", line) ]
+
+def read_cif(path):
+    """
+    Return the Structure of the first data block of a CIF file, with the atoms of the
+    asymmetric unit expanded by the symmetry operations of the block
+    """
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    values = {}
+    loops = []
+
+    i = 0
+    while i < len(lines):
+
+        line = lines[i].strip()
+        i += 1
+
+        if line.startswith("data_") and values:
+            break #only the first data block
+
+        if line.lower() == "loop_":
+            names = []
+            while i < len(lines) and lines[i].strip().startswith("_"):
+                names.append( lines[i].strip().lower() )
+                i += 1
+            rows = []
+            while i < len(lines):
+                stripped = lines[i].strip()
+                if not stripped or stripped.startswith("#"):
+                    i += 1
+                    continue
+                if stripped.startswith("_") or stripped.lower() == "loop_" or stripped.startswith("data_"):
+                    break
+                rows.extend( _cif_tokens(stripped) )
+                i += 1
+            loops.append( ( names, rows ) )
+
+        elif line.startswith("_"):
+            parts = _cif_tokens(line)
+            if len(parts) > 1:
+                values[ parts[0].lower() ] = parts[1]
+
+    try:
+        cell = cell_from_parameters( *[ _cif_number( values["_cell_" + name] ) for name in
+                                        ("length_a", "length_b", "length_c",
+                                         "angle_alpha", "angle_beta", "angle_gamma") ] )
+    except KeyError as error:
+        raise ValueError('CIF file does not give the cell parameter ' + str(error) + ': ' + path)
+
+    sites = None
+    operations = [ "x,y,z" ]
+    for names, rows in loops:
+        width = len(names)
+        if "_atom_site_fract_x" in names:
+            sites = ( names, rows )
+        elif width and ( "_symmetry_equiv_pos_as_xyz" in names or "_space_group_symop_operation_xyz" in names ):
+            column = names.index( "_symmetry_equiv_pos_as_xyz" if "_symmetry_equiv_pos_as_xyz" in names
+                                  else "_space_group_symop_operation_xyz" )
+            operations = rows[column::width]
+
+    if sites is None:
+        raise ValueError('CIF file has no _atom_site_fract_x loop: ' + path)
+
+    names, rows = sites
+    width = len(names)
+    label_column = names.index("_atom_site_type_symbol") if "_atom_site_type_symbol" in names \
+                   else names.index("_atom_site_label")
+    labels = [ re.match(r"[A-Za-z]+", label).group(0) for label in rows[label_column::width] ]
+    fractions = np.column_stack( [ np.array( [ _cif_number(v) for v in rows[ names.index(name)::width ] ] )
+                                   for name in ("_atom_site_fract_x", "_atom_site_fract_y", "_atom_site_fract_z") ] )
+
+    species, site_types = species_for( np.array(labels) )
+
+    #apply every operation to every site, then remove the images that coincide
+    images = [ fractions @ rotation.T + translation
+               for rotation, translation in ( _symmetry_operation(op) for op in operations ) ]
+    positions = np.concatenate(images) % 1.0
+    types = np.tile( site_types, len(images) )
+
+    key = np.round(positions * 1e4).astype(np.int64) % 10000
+    _, unique = np.unique( np.column_stack( [ types, key ] ), axis = 0, return_index = True )
+    unique.sort()
+
+    return Structure(species, types[unique], positions[unique], "crystal", cell)
@@ -0,0 +1,491 @@
+"""
+Content-addressed cache of pw.x inputs and job results
+
+Two inputs that pw.x would read identically are given the same key: the
+SHA-256 of a canonical form of the input, built from what the writer would
+write.  Only the parameters of active fields are included, so GUI_* inputs and
+inputs hidden by show conditions only count through the parameters they imply.
+Parameter names are lower-cased and sorted within each namelist, and numbers,
+logicals and strings are written one way, so that 30, 30.0 and 3.0d1, or .TRUE.
+and .true., give the same key.  The cards are hashed as they are streamed, a
+chunk of entries at a time, with their numbers compared as float64 values, so
+a large structure is never held as text.
+
+An InputCache keeps, under each key, the output of a job that ran the input
+successfully, in a directory of its own.  Entries are evicted least recently
+used first once their total size exceeds a bound, so that a resubmitted job is
+never run twice while its entry is kept:
+
+    cache = InputCache()
+    key = result_key( input_key(input_file), command, pseudopotentials )
+    if cache.get_result(key) is None:
+        ...
+
+A result is kept under a key that also covers the command and the files it
+reads, so that the output of one program is never taken for another's.  The
+inputs themselves are not kept: writing an input costs less than computing
+its key, so a copy would only be slower to restore than to write again.
+"""
+
+import collections
+import hashlib
+import os
+import re
+import shutil
+import threading
+
+from schema import cache_directory
+
+
+
+#changed whenever the canonical form changes, so that old keys are not reused
+CANONICAL_VERSION = 1
+
+#largest total size in bytes of the entries of a cache, by default
+DEFAULT_MAX_BYTES = 1 << 30
+
+#files of an entry
+OUTPUT_NAME = "output.out"
+RESULT_NAME = "result"
+
+#card entries normalized and hashed at a time
+CHUNK_LINES = 4096
+
+#a Fortran number, with an optional d or e exponent
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[dDeE][-+]?\d+)?$")
+
+#a Fortran logical, such as .true., .T. or F
+_LOGICAL = re.compile(r"\.?(?:(t)(?:rue)?|f(?:alse)?)\.?$", re.IGNORECASE)
+
+#first characters of the words of a card that may be numbers
+_NUMBER_START = frozenset("0123456789+-.")
+
+#words standing for the end of each line of a card, and for each of its numbers
+_LINE_END = "\x00"
+_NUMBER_WORD = "\x01"
+
+
+
+def canonical_value(text):
+    """
+    Return the text of a namelist value in canonical form
+    """
+
+    text = str(text).strip()
+
+    if text[:1] in ("'", '"') and text[-1:] == text[:1] and len(text) > 1:
+        return "'" + text[1:-1] + "'"
+
+    if _NUMBER.match(text):
+        return repr( float( text.replace("d", "e").replace("D", "e") ) )
+
+    logical = _LOGICAL.match(text)
+    if logical:
+        return ".false." if logical.group(1) is None else ".true."
+
+    return text
+
+def split_numbers(words):
+    """
+    Return the numbers among the words of a card as an array of float64, and the words with
+    each number replaced by _NUMBER_WORD
+    """
+
+    import numpy as np
+
+    #every word that starts like a number usually is one, and they are all converted at once
+    numbers = " ".join( word for word in words if word[0] in _NUMBER_START )
+    if "d" in numbers or "D" in numbers:
+        numbers = numbers.replace("d", "e").replace("D", "e")
+
+    try:
+        values = np.array( numbers.split(), dtype = np.float64 )
+        return values, [ _NUMBER_WORD if word[0] in _NUMBER_START else word for word in words ]
+    except ValueError: #a word such as 2x2.UPF; each word is converted on its own
+        pass
+
+    values = []
+    others = []
+    for word in words:
+        if word[0] in _NUMBER_START:
+            try:
+                values.append( float( word.replace("d", "e").replace("D", "e") ) )
+                others.append(_NUMBER_WORD)
+                continue
+            except ValueError:
+                pass
+        others.append(word)
+
+    return np.array( values, dtype = np.float64 ), others
+
+def canonical_chunk(chunk):
+    """
+    Return card entries in canonical form, as the text of their words, separated by single
+    spaces and without blank lines, and the bytes of their numbers as float64
+    """
+
+    lines = [ line for line in "\n".join(chunk).split("\n") if line.strip() ]
+    if not lines:
+        return "", b""
+
+    words = ( " " + _LINE_END + " " ).join(lines).split()
+    words.append(_LINE_END)
+
+    values, words = split_numbers(words)
+
+    #0.25, 2.5d-1 and 0.2500000000 are one number, and -0.0 is 0.0
+    values = values + 0.0
+
+    return " ".join(words) + " ", values.astype("<f8").tobytes()
+
+def canonical_lines(lines):
+    """
+    Yield the entries of a card in canonical form, CHUNK_LINES entries at a time
+    """
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            yield canonical_chunk(chunk)
+            chunk = []
+
+    if chunk:
+        yield canonical_chunk(chunk)
+
+def canonical_parameters(input_file, form = None):
+    """
+    Return the namelists pw.x would read for input_file, as a list of (namelist, [(parameter, text)]),
+    with the parameters of each namelist sorted and their values in canonical form
+    """
+
+    from pw_writer import NAMELIST_CALCULATIONS, collect_parameters, resolve_form
+    from schema import NAMELISTS
+
+    if form is None:
+        form = resolve_form(input_file)
+
+    parameters = collect_parameters(input_file, form)
+
+    calculation = form.input_file.inputs.get("calculation")
+    if parameters["CONTROL"].get("calculation"):
+        calculation = parameters["CONTROL"]["calculation"].strip("'")
+
+    namelists = []
+    for name in list(NAMELISTS) + sorted( name for name in parameters if name not in NAMELISTS ):
+        if name in NAMELIST_CALCULATIONS and calculation not in NAMELIST_CALCULATIONS[name]:
+            continue
+        #names differing only in case are one parameter to pw.x; the first, as the writer orders them, is kept
+        values = {}
+        for key, text in parameters[name].items():
+            values.setdefault( key.lower().replace(" ", ""), canonical_value(text) )
+        if values:
+            namelists.append( ( name.upper(), sorted( values.items() ) ) )
+
+    return namelists
+
+def canonical_chunks(input_file, form = None):
+    """
+    Yield the canonical form of input_file, as pairs of text and of the bytes of the numbers of its cards
+    """
+
+    from pw_writer import input_cards, resolve_form
+
+    if form is None:
+        form = resolve_form(input_file)
+
+    for name, values in canonical_parameters(input_file, form):
+        yield "&" + name + "\n" + "".join( key + "=" + text + "\n" for key, text in values ) + "/\n", b""
+
+    for card in input_cards(input_file, form.input_file.inputs):
+        option = ( card.option or "" ).strip("{}() ").lower()
+        yield card.name + " " + option + "\n", b""
+        yield from canonical_lines(card.lines)
+
+def input_key(input_file, form = None):
+    """
+    Return the key of input_file: the hexadecimal SHA-256 of its canonical form
+
+    The text and the numbers are hashed apart, so that the key does not depend on how the
+    lines of a card are divided into entries.  If form is None, every group of the form is
+    opened to decide which fields are active.
+    """
+
+    digest = hashlib.sha256( ( "qe-input %i\n" % CANONICAL_VERSION ).encode() )
+    numbers = hashlib.sha256()
+
+    for text, values in canonical_chunks(input_file, form):
+        digest.update( text.encode("utf-8") )
+        numbers.update(values)
+
+    digest.update( numbers.digest() )
+
+    return digest.hexdigest()
+
+def file_state(path):
+    """
+    Return the size and modification time of a file, as text, or "missing"
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+
+    return "%i %i" % ( stat.st_size, stat.st_mtime_ns )
+
+def result_key(key, command, files = ()):
+    """
+    Return the key of the result of running the input of key with command, a list of arguments,
+    reading files, such as the pseudopotentials
+
+    A result depends on more than its input.  The program is identified by its arguments and
+    by the executable that its first argument resolves to in PATH, and the files by their names.
+    The program and the files are also identified by their size and modification time, so that
+    a rebuilt program or a replaced pseudopotential does not reuse the results of the old one.
+    Files are not identified by their directory, which may be that of the job.
+    """
+
+    command = list(command)
+    executable = shutil.which( command[0] ) if command else None
+
+    lines = [ "qe-result %i" % CANONICAL_VERSION, key, "\x00".join(command) ]
+    if executable is not None:
+        lines.append( os.path.abspath(executable) + " " + file_state(executable) )
+    lines.extend( os.path.basename(path) + " " + file_state(path) for path in files )
+
+    return hashlib.sha256( "\n".join(lines).encode("utf-8") ).hexdigest()
+
+
+
+def default_cache_path():
+
+    return os.path.join( cache_directory(), "inputs" )
+
+def entry_size(path):
+
+    size = 0
+    for name in os.listdir(path):
+        try:
+            size += os.path.getsize( os.path.join(path, name) )
+        except OSError:
+            pass
+
+    return size
+
+def copy_atomic(source, path):
+    """
+    Copy the file source to path, so that path either does not exist or is complete
+    """
+
+    temp_path = "%s.%i.%i.tmp" % ( path, os.getpid(), threading.get_ident() )
+    shutil.copyfile(source, temp_path)
+    os.replace(temp_path, path)
+
+
+
+class InputCache():
+    """
+    This class keeps job results on disk by key, evicting the least recently used
+
+    Each entry is a directory named by its key, holding the output and exit status of a job
+    that ran successfully.  The order of use is kept
+    as the modification time of each entry, so that it carries over to the next process that
+    opens the cache.  Several processes may add entries to one cache; each evicts only when
+    its own count of the total size exceeds max_bytes.
+    """
+
+    def __init__(self, path = None, max_bytes = DEFAULT_MAX_BYTES):
+
+        self.path = os.path.abspath( path or default_cache_path() )
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.path, exist_ok = True)
+
+        #size in bytes of each entry, least recently used first, guarded by self.lock
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+        #lookups of inputs and results that found an entry, and that did not
+        self.hits = 0
+        self.misses = 0
+
+        self.scan()
+
+    def __getstate__(self):
+
+        #a cache sent to a worker process is opened again there
+        return { "path": self.path, "max_bytes": self.max_bytes }
+
+    def __setstate__(self, state):
+
+        self.__init__( state["path"], state["max_bytes"] )
+
+    def scan(self):
+        """
+        Read the entries on disk, and their order of use
+        """
+
+        entries = []
+        for prefix in os.listdir(self.path):
+            directory = os.path.join(self.path, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for key in os.listdir(directory):
+                entry = os.path.join(directory, key)
+                try:
+                    entries.append( ( os.path.getmtime(entry), key, entry_size(entry) ) )
+                except OSError: #evicted by another process
+                    pass
+
+        with self.lock:
+            self.entries.clear()
+            for mtime, key, size in sorted(entries):
+                self.entries[key] = size
+            self.size = sum( self.entries.values() )
+
+    def entry_path(self, key):
+
+        return os.path.join( self.path, key[:2], key )
+
+    def __contains__(self, key):
+
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+
+        with self.lock:
+            return len(self.entries)
+
+    def touch(self, key):
+        """
+        Mark an entry as the most recently used
+        """
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+        try:
+            os.utime( self.entry_path(key) )
+        except OSError:
+            pass
+
+    def lookup(self, key, name):
+        """
+        Return the path of a file of an entry, marking the entry as used, or None if it has no such file
+        """
+
+        path = os.path.join( self.entry_path(key), name )
+
+        if not os.path.exists(path):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            #an entry added by another process since the cache was scanned
+            if key not in self.entries:
+                self.entries[key] = 0
+        self.touch(key)
+
+        return path
+
+    def get_result(self, key):
+        """
+        Return the (exit status, output path) of the job that ran the input of key, or None if there is none
+        """
+
+        path = self.lookup(key, RESULT_NAME)
+        if path is None:
+            return None
+
+        try:
+            with open(path) as f:
+                returncode = int( f.read() )
+        except (OSError, ValueError): #evicted, or written by a process that was killed
+            return None
+
+        return returncode, os.path.join( self.entry_path(key), OUTPUT_NAME )
+
+    def put_result(self, key, returncode, output_path):
+        """
+        Keep the output of a job that ran the input of key, and its exit status
+        """
+
+        entry = self.entry_path(key)
+        os.makedirs(entry, exist_ok = True)
+
+        copy_atomic( output_path, os.path.join(entry, OUTPUT_NAME) )
+
+        #the status is written last, so that an entry with a status always has its output
+        path = os.path.join(entry, RESULT_NAME)
+        temp_path = "%s.%i.%i.tmp" % ( path, os.getpid(), threading.get_ident() )
+        with open(temp_path, "w") as f:
+            f.write( str(returncode) )
+        os.replace(temp_path, path)
+
+        self.added(key)
+
+    def added(self, key):
+        """
+        Count the new size of an entry, and evict others if the cache has grown too large
+        """
+
+        try:
+            size = entry_size( self.entry_path(key) )
+        except OSError:
+            return
+
+        with self.lock:
+            self.size += size - self.entries.get(key, 0)
+            self.entries[key] = size
+            self.entries.move_to_end(key)
+
+        try:
+            os.utime( self.entry_path(key) )
+        except OSError:
+            pass
+
+        self.evict( keep = key )
+
+    def evict(self, keep = None):
+        """
+        Remove the least recently used entries until the total size is within max_bytes,
+        other than the entry of keep; returns the number of entries removed
+        """
+
+        removed = []
+
+        with self.lock:
+            while self.size > self.max_bytes and self.entries:
+                key, size = next( iter( self.entries.items() ) )
+                if key == keep:
+                    if len(self.entries) == 1:
+                        break
+                    self.entries.move_to_end(key)
+                    continue
+                del self.entries[key]
+                self.size -= size
+                removed.append(key)
+
+        for key in removed:
+            shutil.rmtree( self.entry_path(key), ignore_errors = True )
+
+        return len(removed)
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+
+        with self.lock:
+            keys = list(self.entries)
+            self.entries.clear()
+            self.size = 0
+
+        for key in keys:
+            shutil.rmtree( self.entry_path(key), ignore_errors = True )
@@ -0,0 +1,181 @@
+"""
+Instrumentation of the update cycles of the form
+
+COUNTERS holds running totals that the form and its widgets increment as they
+work: show conditions evaluated, fields shown and hidden, and widgets created
+and destroyed.  They are plain integer additions, made once per update rather
+than once per condition where possible, so they cost next to nothing.
+
+An UpdateRecorder, when one is attached to a Dialog, reads the totals before
+and after each update cycle and keeps the differences along with the wall time
+of the cycle, from which it builds histograms and a JSON dump.  Without a
+recorder, a cycle only pays for checking that there is none.
+
+Run "python instrumentation.py dump.json" to print the histograms of a dump.
+"""
+
+import collections
+import json
+import sys
+import time
+
+
+
+#metrics of each cycle, other than its wall time
+COUNTS = ("conditions", "shown", "hidden", "created", "destroyed")
+
+#slot that triggers the update of each type of field
+TRIGGERS = { "text": "on_text_changed", "plain_text": "on_text_changed", "combo": "on_index_changed",
+             "check": "on_state_changed" }
+
+#number of cycles kept by default; the oldest are dropped beyond it
+MAX_CYCLES = 100000
+
+
+
+class Counters():
+    """
+    This class holds the running totals of the work done by the form
+    """
+
+    def __init__(self):
+
+        #show conditions of groups and fields evaluated
+        self.conditions = 0
+
+        #InputFields shown and hidden
+        self.shown = 0
+        self.hidden = 0
+
+        #Qt widgets created and destroyed, counting a label and its input widget separately
+        self.created = 0
+        self.destroyed = 0
+
+    def snapshot(self):
+
+        return ( self.conditions, self.shown, self.hidden, self.created, self.destroyed )
+
+COUNTERS = Counters()
+
+
+
+class UpdateRecorder():
+    """
+    This class records the work and wall time of each update cycle of a Dialog
+
+    Each cycle is kept as a dictionary of its kind ("input", "window" or "open"), its
+    trigger (the slot or method that started it), its input or group name, its wall
+    time in seconds and the difference in each of COUNTS.
+    """
+
+    def __init__(self, max_cycles = MAX_CYCLES):
+
+        self.cycles = collections.deque(maxlen = max_cycles)
+
+    def begin(self):
+        """
+        Return the state at the start of a cycle, to be passed to end()
+        """
+
+        return COUNTERS.snapshot(), time.perf_counter()
+
+    def end(self, start, kind, trigger, name = None):
+
+        wall = time.perf_counter()
+        counts, started = start
+
+        cycle = { "kind": kind, "trigger": trigger, "name": name, "wall": wall - started }
+        for metric, before, after in zip(COUNTS, counts, COUNTERS.snapshot()):
+            cycle[metric] = after - before
+
+        self.cycles.append(cycle)
+
+    def clear(self):
+
+        self.cycles.clear()
+
+    def select(self, kind = None, trigger = None):
+
+        return [ cycle for cycle in self.cycles
+                       if ( kind is None or cycle["kind"] == kind ) and ( trigger is None or cycle["trigger"] == trigger ) ]
+
+    def histograms(self, kind = None, trigger = None):
+        """
+        Return a histogram of each metric over the selected cycles, as {metric: {bucket: cycles}}
+
+        Buckets are powers of two: a count n falls in bucket 2**floor(log2 n), or 0, and a
+        wall time in the bucket of its microseconds.
+        """
+
+        cycles = self.select(kind, trigger)
+
+        histograms = {}
+        for metric in COUNTS + ("wall",):
+            histogram = {}
+            for cycle in cycles:
+                value = cycle[metric]
+                if metric == "wall":
+                    value = int(value * 1e6)
+                b = bucket(value)
+                histogram[b] = histogram.get(b, 0) + 1
+            histograms[metric] = dict( sorted( histogram.items() ) )
+
+        return histograms
+
+    def summary(self):
+        """
+        Return the number of cycles and the total and largest of each metric, by trigger
+        """
+
+        summary = {}
+        for cycle in self.cycles:
+            entry = summary.setdefault( cycle["trigger"], { "cycles": 0, "total": {}, "max": {} } )
+            entry["cycles"] += 1
+            for metric in COUNTS + ("wall",):
+                entry["total"][metric] = entry["total"].get(metric, 0) + cycle[metric]
+                entry["max"][metric] = max( entry["max"].get(metric, 0), cycle[metric] )
+
+        return summary
+
+    def as_dict(self):
+
+        return { "cycles": list(self.cycles), "summary": self.summary(),
+                 "histograms": { trigger: self.histograms(trigger = trigger) for trigger in self.summary() } }
+
+    def dump(self, path):
+        """
+        Write the cycles, their summary and their histograms by trigger to a JSON file
+        """
+
+        with open(path, "w") as f:
+            json.dump( self.as_dict(), f, indent = 1 )
+
+def bucket(value):
+
+    if value <= 0:
+        return 0
+
+    return 1 << ( int(value).bit_length() - 1 )
+
+
+
+def print_histograms(data, stream = None):
+    """
+    Print the histograms of a dump by trigger, one row per bucket
+    """
+
+    stream = stream or sys.stdout
+
+    for trigger, histograms in data["histograms"].items():
+        summary = data["summary"][trigger]
+        stream.write( "%s: %i cycles, %.1f ms in all\n" % ( trigger, summary["cycles"], summary["total"]["wall"] * 1e3 ) )
+        for metric, histogram in histograms.items():
+            unit = " (us)" if metric == "wall" else ""
+            row = ", ".join( "%s: %i" % ( b, n ) for b, n in histogram.items() )
+            stream.write( "    %-16s %s\n" % ( metric + unit, row ) )
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("usage: python instrumentation.py dump.json")
+    with open(sys.argv[1]) as f:
+        print_histograms( json.load(f) )
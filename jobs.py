@@ -0,0 +1,564 @@
+"""
+Local execution of pw.x inputs
+
+A JobRunner runs pw.x, or a command like it, on the inputs submitted to it.
+Each job has its own working directory, named after the prefix of its input,
+into which the input is written, with its outdir and wfcdir moved inside the
+job's directory (or, if they are absolute, into a subdirectory named after the
+job) so that jobs with the same prefix do not overwrite each other's files.
+
+A fixed number of worker threads take jobs from the queue in order, and each
+waits on one child process at a time, so that no more than that many processes
+run at once.  Every job records its exit status and its times of submission,
+start and finish.  The output of each process goes straight to a file in the
+job's directory.
+
+With an input_cache.InputCache, each job is keyed by the canonical form of its
+input, together with its command and the pseudopotential files it reads.  A
+job whose calculation has already run successfully takes the output kept in
+the cache instead of running, and a job submitted while an identical one is
+queued or running waits for it, so that the same calculation is not run twice.
+
+    python jobs.py jobs_dir sweep_dir/*.in --workers 4 --command "mpirun -np 2 pw.x -in {input}"
+"""
+
+import argparse
+import collections
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+
+
+#command run for each job, in the job's directory; {input} is replaced by the file name of the
+#job's input, and a command without it reads the input from standard input
+DEFAULT_COMMAND = ["pw.x", "-in", "{input}"]
+
+#command of the stand-in for pw.x, which writes pw.x-style output without calculating anything
+MOCK_COMMAND = [ sys.executable, os.path.join( os.path.dirname( os.path.abspath(__file__) ), "mock_pw.py" ), "-in", "{input}" ]
+
+#states of a job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+
+class Job():
+    """
+    This class holds a job of a JobRunner: its files, its state and its times
+
+    Times are time.perf_counter() values, or None until the job reaches that point.
+    """
+
+    def __init__(self, number, name, directory, command):
+
+        self.number = number
+        self.name = name
+        self.directory = directory
+        self.command = command
+
+        self.input_path = os.path.join( directory, name + ".in" )
+        self.output_path = os.path.join( directory, name + ".out" )
+
+        self.status = QUEUED
+
+        #exit status of the process, or None if it has not finished
+        self.returncode = None
+
+        #the exception that kept the job from running, such as a command that was not found
+        self.error = None
+
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+        #until the job's input is written, its text or QuantumEspressoInputFile
+        self.source = None
+
+        #the subprocess.Popen of a running job
+        self.process = None
+
+        #key of the job's result in the runner's cache, or None without a cache
+        self.key = None
+
+        #was the output taken from the cache, rather than from running the command?
+        self.cached = False
+
+    def done(self):
+
+        return self.status in FINISHED
+
+    @property
+    def wait_time(self):
+        """
+        Seconds from submission to start, or None if the job has not started
+        """
+
+        return None if self.started is None else self.started - self.submitted
+
+    @property
+    def run_time(self):
+        """
+        Seconds from start to finish, or None if the job has not finished
+        """
+
+        return None if self.started is None or self.finished is None else self.finished - self.started
+
+
+
+def unquote(text):
+
+    return str(text).strip().strip("'\"")
+
+def job_paths(input_file, directory):
+    """
+    Return the outdir and wfcdir of a job in directory, from those of input_file
+
+    Relative directories, including the default "./", are placed inside the job's directory;
+    absolute ones get a subdirectory named after the job.
+    """
+
+    extra = input_file.extra_parameters.get("CONTROL", {})
+
+    paths = []
+    for name, default in ( ("outdir", "./"), ("wfcdir", None) ):
+        path = input_file.inputs.get(name) or unquote( extra.get(name, "") ) or default
+        if path is None: #wfcdir defaults to outdir
+            paths.append( paths[0] )
+        elif os.path.isabs(path):
+            paths.append( os.path.join( path, os.path.basename(directory) ) )
+        else:
+            paths.append( os.path.normpath( os.path.join(directory, path) ) )
+
+    return paths[0], paths[1]
+
+def pseudopotential_paths(input_file, directory):
+    """
+    Return the paths of the pseudopotential files that a job in directory reads
+
+    pw.x looks for them in pseudo_dir, by default $ESPRESSO_PSEUDO or ~/espresso/pseudo, which if
+    relative is taken from the job's directory.
+    """
+
+    pseudo_dir = ( ( input_file.inputs.get("pseudo_dir") if "pseudo_dir" not in input_file.defaults else None )
+                   or unquote( input_file.extra_parameters.get("CONTROL", {}).get("pseudo_dir", "") )
+                   or os.environ.get("ESPRESSO_PSEUDO")
+                   or os.path.join( os.path.expanduser("~"), "espresso", "pseudo" ) )
+
+    if input_file.structure is not None:
+        names = [ species.pseudopotential for species in input_file.structure.species ]
+    else:
+        card = input_file.cards.get("ATOMIC_SPECIES")
+        names = [ ( line.split() + ["", "", ""] )[2] for line in card.lines ] if card is not None else []
+
+    return [ os.path.normpath( os.path.join(directory, pseudo_dir, name) ) for name in names if name ]
+
+def job_input(input_file, directory):
+    """
+    Return a copy of input_file with its outdir and wfcdir inside the job directory
+    """
+
+    from form import reveal_inputs
+    from qe_input import QuantumEspressoInputFile
+    from schema import load_schema
+
+    outdir, wfcdir = job_paths(input_file, directory)
+
+    job = QuantumEspressoInputFile()
+    job.inputs = dict(input_file.inputs)
+    job.defaults = set(input_file.defaults)
+    job.cards = dict(input_file.cards)
+    job.extra_parameters = { namelist: dict(extra) for namelist, extra in input_file.extra_parameters.items() }
+    job.structure = input_file.structure
+    job.kpoints = input_file.kpoints
+    job.species_parameters = input_file.species_parameters
+
+    for name, path in ( ("outdir", outdir), ("wfcdir", wfcdir) ):
+        job.inputs[name] = path
+        job.defaults.discard(name)
+        job.extra_parameters.get("CONTROL", {}).pop(name, None)
+
+    #the directories are always written, even if their fields were never opened
+    reveal_inputs( job.inputs, ["outdir", "wfcdir"], load_schema(), override = True )
+
+    return job
+
+def job_name(prefix):
+    """
+    Return a prefix that is safe as part of a file name
+    """
+
+    name = "".join( c if c.isalnum() or c in "-_." else "_" for c in unquote(prefix) )
+
+    return name.strip(".") or "pwscf"
+
+
+
+class JobRunner():
+    """
+    This class runs jobs from a queue, each in its own directory under root, on a bounded pool of workers
+    """
+
+    def __init__(self, root, command = None, workers = None, on_finished = None, cache = None):
+
+        self.root = os.path.abspath(root)
+
+        #the command as a list of arguments, or a string to be split as a shell would
+        if isinstance(command, str):
+            command = shlex.split(command)
+        self.command = list(command or DEFAULT_COMMAND)
+
+        self.workers = workers or os.cpu_count() or 1
+
+        #called with each job as it finishes, on the worker thread that ran it
+        self.on_finished = on_finished
+
+        #input_cache.InputCache of the results of earlier jobs, or None
+        self.cache = cache
+
+        #every job submitted, in order, and the jobs waiting for a worker, guarded by self.condition
+        self.condition = threading.Condition()
+        self.jobs = []
+        self.queue = collections.deque()
+        self.closing = False
+
+        #the queued or running job of each key, and the jobs with the same key waiting for it
+        self.active = {}
+        self.duplicates = {}
+
+        #number of the next job; numbers are reserved before a job's input is copied
+        self.next_number = 0
+
+        #jobs not yet finished and reported, so that waiting for them all is a single check
+        self.unfinished = 0
+
+        self.threads = [ threading.Thread(target = self.run, name = "job worker %i" % i, daemon = True)
+                         for i in range(self.workers) ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, input_file, name = None):
+        """
+        Queue a job for a QuantumEspressoInputFile, and return its Job
+
+        The inputs are copied now, so that later changes do not affect the job, and written
+        out by the worker that runs it.
+        """
+
+        if name is None:
+            name = input_file.inputs.get("prefix") or input_file.extra_parameters.get("CONTROL", {}).get("prefix", "pwscf")
+
+        job = self.new_job( self.reserve_number(), job_name(name) )
+
+        #the key is that of the input as given, before its directories are moved into the job's,
+        #run by this command on these pseudopotentials
+        if self.cache is not None:
+            from input_cache import input_key, result_key
+            job.key = result_key( input_key(input_file), self.command, pseudopotential_paths(input_file, job.directory) )
+
+        job.source = job_input(input_file, job.directory)
+
+        return self.enqueue(job)
+
+    def submit_text(self, text, name = "pwscf"):
+        """
+        Queue a job for the text of a pw.x input, written as it is, and return its Job
+        """
+
+        job = self.new_job( self.reserve_number(), job_name(name) )
+        job.source = text
+
+        return self.enqueue(job)
+
+    def reserve_number(self):
+
+        with self.condition:
+            number = self.next_number
+            self.next_number += 1
+
+        return number
+
+    def new_job(self, number, name):
+
+        directory = os.path.join( self.root, "%s.%05i" % ( name, number ) )
+        command = [ argument.replace( "{input}", name + ".in" ) for argument in self.command ]
+
+        return Job(number, name, directory, command)
+
+    def enqueue(self, job):
+
+        with self.condition:
+            if self.closing:
+                raise RuntimeError('Jobs cannot be submitted to a closed runner')
+
+            self.jobs.append(job)
+            self.unfinished += 1
+
+            if job.key is not None and job.key in self.active:
+                self.duplicates[job.key].append(job)
+            else:
+                if job.key is not None:
+                    self.active[job.key] = job
+                    self.duplicates[job.key] = []
+                self.queue.append(job)
+                self.condition.notify()
+
+        return job
+
+    def cancel(self, job):
+        """
+        Cancel a job: a queued job is dropped, and the process of a running job is terminated,
+        or not started if the worker has yet to start it
+        """
+
+        with self.condition:
+            queued = job.status == QUEUED
+            if queued:
+                if job in self.queue:
+                    self.queue.remove(job)
+                    self.release(job)
+                else:
+                    self.duplicates[job.key].remove(job)
+                self.finish(job, CANCELLED)
+            process = job.process if job.status == RUNNING else None
+            if job.status == RUNNING:
+                job.status = CANCELLED
+
+        if queued:
+            self.report( [job] )
+        elif process is not None:
+            process.terminate()
+
+    def wait(self, timeout = None):
+        """
+        Wait until every submitted job has finished, and return whether they have
+        """
+
+        with self.condition:
+            return self.condition.wait_for( lambda: self.unfinished == 0, timeout )
+
+    def close(self, cancel = False):
+        """
+        Stop the workers once the queue is empty, or if cancel is True, once the queued jobs
+        are dropped and the running jobs cancelled
+        """
+
+        with self.condition:
+            self.closing = True
+            cancelled = []
+            running = []
+            if cancel:
+                cancelled = list(self.queue) + [ job for jobs in self.duplicates.values() for job in jobs ]
+                self.queue.clear()
+                self.active.clear()
+                self.duplicates.clear()
+                running = [ job for job in self.jobs if job.status == RUNNING ]
+            for job in cancelled:
+                self.finish(job, CANCELLED)
+            self.condition.notify_all()
+
+        self.report(cancelled)
+
+        for job in running:
+            self.cancel(job)
+
+        for thread in self.threads:
+            thread.join()
+
+    def counts(self):
+        """
+        Return the number of jobs in each state
+        """
+
+        with self.condition:
+            counts = collections.Counter( job.status for job in self.jobs )
+
+        return { status: counts.get(status, 0) for status in (QUEUED, RUNNING) + FINISHED }
+
+    def run(self):
+
+        while True:
+
+            with self.condition:
+                while not self.queue and not self.closing:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                job = self.queue.popleft()
+                job.status = RUNNING
+
+            self.execute(job)
+
+            with self.condition:
+                self.finish(job)
+                self.release(job)
+            self.report( [job] )
+
+    def execute(self, job):
+        """
+        Write the input of a job to its directory, and run its command there
+        """
+
+        job.started = time.perf_counter()
+
+        #a job cancelled before it started is not run
+        if job.status == CANCELLED:
+            return
+
+        try:
+            os.makedirs(job.directory, exist_ok = True)
+
+            with open(job.input_path, "w") as stream:
+                if isinstance(job.source, str):
+                    stream.write(job.source)
+                else:
+                    job.source.write(stream)
+            job.source = None
+
+            if self.restore(job):
+                return
+
+            #a command without {input} reads the input from standard input, as "pw.x < input"
+            reads_input = any( "{input}" in argument for argument in self.command )
+
+            with open(job.output_path, "wb") as output, \
+                 open(os.devnull if reads_input else job.input_path, "rb") as stdin:
+                process = subprocess.Popen( job.command, cwd = job.directory, stdin = stdin,
+                                            stdout = output, stderr = subprocess.STDOUT )
+
+                #a job cancelled while its process was starting is terminated as soon as it has started
+                with self.condition:
+                    job.process = process
+                    cancelled = job.status == CANCELLED
+                if cancelled:
+                    process.terminate()
+
+                job.returncode = process.wait()
+
+            #only complete runs are kept, not those that failed or were cancelled
+            if job.key is not None and job.returncode == 0 and job.status == RUNNING:
+                self.cache.put_result(job.key, job.returncode, job.output_path)
+
+        except OSError as error: #the directory could not be written, or the command was not found
+            job.error = error
+
+        job.process = None
+
+    def restore(self, job):
+        """
+        Copy the output of an earlier run of the job's input from the cache, and return whether there was one
+        """
+
+        if job.key is None:
+            return False
+
+        result = self.cache.get_result(job.key)
+        if result is None:
+            return False
+
+        returncode, output_path = result
+        try:
+            shutil.copyfile(output_path, job.output_path)
+        except OSError: #evicted since it was found
+            return False
+
+        job.returncode = returncode
+        job.cached = True
+
+        return True
+
+    def finish(self, job, status = None):
+        """
+        Set the final state of a job; called with self.condition held
+        """
+
+        job.finished = time.perf_counter()
+
+        if status is not None:
+            job.status = status
+        elif job.status != CANCELLED:
+            job.status = DONE if job.returncode == 0 else FAILED
+
+    def release(self, job):
+        """
+        Queue the next job waiting for a job with the same key, once the job has finished or been
+        cancelled; called with self.condition held
+
+        A job that ran successfully leaves its output in the cache, so the jobs waiting for it
+        take their output from there in turn.
+        """
+
+        if job.key is None or self.active.get(job.key) is not job:
+            return
+
+        waiting = self.duplicates.get(job.key)
+        if waiting:
+            following = waiting.pop(0)
+            self.active[job.key] = following
+            self.queue.appendleft(following)
+            self.condition.notify()
+        else:
+            del self.active[job.key]
+            self.duplicates.pop(job.key, None)
+
+    def report(self, jobs):
+        """
+        Pass finished jobs to on_finished, and only then count them as finished, so that
+        wait() returns after every job has been reported
+        """
+
+        if self.on_finished is not None:
+            for job in jobs:
+                self.on_finished(job)
+
+        with self.condition:
+            self.unfinished -= len(jobs)
+            self.condition.notify_all()
+
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Run pw.x on a list of inputs, each in its own directory")
+    parser.add_argument("root", help = "directory the job directories are made in")
+    parser.add_argument("inputs", nargs = "+", help = "pw.x input files")
+    parser.add_argument("--command", default = None,
+                        help = 'command run for each job, with {input} for its input file (default "pw.x -in {input}")')
+    parser.add_argument("--mock", action = "store_true", help = "run the stand-in for pw.x, mock_pw.py")
+    parser.add_argument("--workers", type = int, default = None, help = "number of jobs run at once")
+    parser.add_argument("--cache", nargs = "?", const = "", default = None, metavar = "directory",
+                        help = "take the output of inputs that have run before from a cache (by default, in the user's cache directory)")
+
+    args = parser.parse_args(argv)
+
+    from pw_reader import read_input
+
+    #the stand-in's output is kept apart from that of pw.x, even though it is keyed by its own command
+    cache = None
+    if args.cache is not None:
+        from input_cache import InputCache, default_cache_path
+        cache = InputCache( args.cache or ( default_cache_path() + "-mock" if args.mock else None ) )
+
+    runner = JobRunner( args.root, MOCK_COMMAND if args.mock else args.command, args.workers, cache = cache )
+    for path in args.inputs:
+        runner.submit( read_input(path), os.path.splitext( os.path.basename(path) )[0] )
+
+    runner.close()
+
+    for job in runner.jobs:
+        print( "%-40s %-9s exit %4s %8.2fs%s" % ( os.path.relpath(job.directory), job.status,
+                                                  job.returncode, job.run_time or 0.0, " (cached)" if job.cached else "" ) )
+
+    return 0 if all( job.status == DONE for job in runner.jobs ) else 1
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,291 @@
+"""
+K-points of a pw.x input
+
+KPoints holds either an automatic grid, to be written as such, or an explicit
+list of points and weights in NumPy arrays.  Monkhorst-Pack grids, their
+reduction by the rotations of the lattice and band paths through high
+symmetry points are all generated as whole-array operations, and explicit
+lists are written in chunks, so that lists of millions of points are
+practical.
+"""
+
+import itertools
+
+import numpy as np
+
+from qe_input import Card
+
+
+
+#K_POINTS options of an explicit list of points
+EXPLICIT_MODES = ("tpiba", "crystal", "tpiba_b", "crystal_b")
+
+#number of points formatted by each string of a card's lines
+CHUNK_POINTS = 4096
+
+#high symmetry points of cubic lattices, in units of 2 pi / alat
+HIGH_SYMMETRY_POINTS = {
+    "sc":  { "G": (0, 0, 0), "X": (0, 0.5, 0), "M": (0.5, 0.5, 0), "R": (0.5, 0.5, 0.5) },
+    "fcc": { "G": (0, 0, 0), "X": (0, 1, 0), "W": (0.5, 1, 0), "K": (0.75, 0.75, 0),
+             "L": (0.5, 0.5, 0.5), "U": (0.25, 1, 0.25) },
+    "bcc": { "G": (0, 0, 0), "H": (0, 0, 1), "N": (0.5, 0.5, 0), "P": (0.5, 0.5, 0.5) },
+    }
+
+#usual band paths through the points above
+PATHS = { "sc": "G X M G R X", "fcc": "G X W K G L U W L K", "bcc": "G H N G P H" }
+
+
+
+class KPoints():
+    """
+    This class holds the k-points of an input file
+
+    For mode "automatic", grid holds the six integers nk1 nk2 nk3 sk1 sk2 sk3.  For the
+    explicit modes, points holds one point per row and weights one weight per point.
+    """
+
+    def __init__(self, mode, points = None, weights = None, grid = None):
+
+        if mode not in ("automatic", "gamma") + EXPLICIT_MODES:
+            raise ValueError('K_POINTS mode not recognized: ' + repr(mode))
+
+        self.mode = mode
+        self.grid = None if grid is None else tuple( int(n) for n in grid )
+
+        if mode in EXPLICIT_MODES:
+            self.points = np.ascontiguousarray(points, dtype = np.float64).reshape(-1, 3)
+            if weights is None:
+                weights = np.ones( len(self.points) )
+            self.weights = np.ascontiguousarray(weights, dtype = np.float64).reshape(-1)
+            if len(self.weights) != len(self.points):
+                raise ValueError('Each k-point needs a weight')
+        else:
+            self.points = None
+            self.weights = None
+
+        if mode == "automatic" and ( self.grid is None or len(self.grid) != 6 ):
+            raise ValueError('An automatic grid needs nk1 nk2 nk3 sk1 sk2 sk3')
+
+    def __len__(self):
+
+        return 0 if self.points is None else len(self.points)
+
+    def card(self):
+
+        if self.mode == "automatic":
+            return Card( "K_POINTS", "automatic", [ "%i %i %i %i %i %i" % self.grid ] )
+
+        if self.mode == "gamma":
+            return Card( "K_POINTS", "gamma", [] )
+
+        return Card( "K_POINTS", self.mode, self._lines() )
+
+    def _lines(self):
+        """
+        Yield the number of points, then the points in chunks of CHUNK_POINTS, each formatted
+        by a single % operation over a flat tuple of the chunk's values
+        """
+
+        yield str( len(self) )
+
+        #band path segments ("_b" modes) give an integer number of points instead of a weight
+        line = "%.10f %.10f %.10f " + ( "%i" if self.mode.endswith("_b") else "%.10g" )
+
+        table = np.column_stack( [ self.points, self.weights ] )
+
+        for start in range(0, len(table), CHUNK_POINTS):
+            chunk = table[start:start + CHUNK_POINTS]
+            yield "\n".join( [line] * len(chunk) ) % tuple( chunk.ravel().tolist() )
+
+    @classmethod
+    def from_card(cls, card):
+        """
+        Return the KPoints of a K_POINTS card
+        """
+
+        mode = ( card.option or "tpiba" ).lower()
+        lines = list(card.lines)
+
+        if mode == "gamma":
+            return cls("gamma")
+        if mode == "automatic":
+            return cls( "automatic", grid = lines[0].split()[:6] )
+
+        count = int( lines[0].split()[0] )
+        tokens = " ".join( lines[1:count + 1] ).split()
+        if len(tokens) != 4 * count:
+            raise ValueError('Every k-point must have three coordinates and a weight')
+
+        table = np.array(tokens, dtype = np.float64).reshape(-1, 4)
+
+        return cls( mode, table[:, :3], table[:, 3] )
+
+
+
+def monkhorst_pack(grid, shift = (0, 0, 0)):
+    """
+    Return the points of a Monkhorst-Pack grid in crystal coordinates, as pw.x generates
+    them: k_i = j / n_i + s_i / (2 n_i) for j = 0 ... n_i - 1, with the last index fastest
+    """
+
+    n = np.asarray(grid, dtype = np.int64)
+    s = np.asarray(shift, dtype = np.float64)
+
+    axes = [ ( np.arange(n[i]) + s[i] / 2.0 ) / n[i] for i in range(3) ]
+    mesh = np.meshgrid(*axes, indexing = "ij")
+
+    return np.column_stack( [ m.ravel() for m in mesh ] )
+
+def lattice_rotations(cell, tolerance = 1e-5):
+    """
+    Return the rotations of the lattice, as integer matrices R acting on crystal coordinates
+    x' = R x, that leave the metric of the cell unchanged
+
+    Only matrices with entries -1, 0 and 1 are tried, which finds every rotation of a
+    reduced cell.
+    """
+
+    cell = np.asarray(cell, dtype = np.float64)
+    metric = cell @ cell.T
+
+    candidates = np.array( list( itertools.product( (-1, 0, 1), repeat = 9 ) ), dtype = np.int64 ).reshape(-1, 3, 3)
+    transformed = np.einsum("nji,jk,nkl->nil", candidates, metric, candidates)
+
+    keep = np.all( np.abs(transformed - metric) <= tolerance * np.abs(metric).max(), axis = (1, 2) )
+    keep &= np.abs( np.rint( np.linalg.det(candidates) ) ) == 1
+
+    return candidates[keep]
+
+def crystal_rotations(structure, rotations = None, tolerance = 1e-4):
+    """
+    Return those rotations of the lattice of structure that, with some translation, map
+    its atoms onto atoms of the same species
+    """
+
+    if rotations is None:
+        rotations = lattice_rotations(structure.cell)
+
+    positions = structure.converted("crystal") % 1.0
+    types = structure.types.astype(np.int64)
+
+    modulus = int( round(1.0 / tolerance) )
+
+    def atoms(x):
+        #the atoms as rows of species and rounded coordinates, in sorted order
+        table = np.column_stack( [ types, np.rint(x / tolerance).astype(np.int64) % modulus ] )
+        return table[ np.lexsort( table.T[::-1] ) ]
+
+    reference = atoms(positions)
+
+    #translations are tried from the first atom of the rarest species onto each atom of that species
+    counts = np.bincount( types, minlength = structure.ntyp ).astype(np.float64)
+    counts[ counts == 0 ] = np.inf
+    rarest = int( np.argmin(counts) )
+    anchors = np.flatnonzero(types == rarest)
+
+    kept = []
+    for rotation in rotations:
+        rotated = positions @ rotation.T
+        for translation in positions[anchors] - rotated[ anchors[0] ]:
+            if np.array_equal( atoms( (rotated + translation) % 1.0 ), reference ):
+                kept.append(rotation)
+                break
+
+    return np.array(kept, dtype = np.int64).reshape(-1, 3, 3)
+
+def irreducible_grid(grid, shift = (0, 0, 0), rotations = None, time_reversal = True):
+    """
+    Return the KPoints, in crystal coordinates, of the points of a Monkhorst-Pack grid that
+    are not related by rotations (or by time reversal), weighted by the size of their star
+
+    Rotations that do not map the shifted grid onto itself are not used.
+    """
+
+    n = np.asarray(grid, dtype = np.int64)
+    s = np.asarray(shift, dtype = np.int64)
+
+    if rotations is None:
+        rotations = [ np.identity(3, dtype = np.int64) ]
+    signs = (1, -1) if time_reversal else (1,)
+
+    #points are held as the integers u = 2 j + s, so that k = u / (2 n), and every image is exact;
+    #without a shift, the factor of 2 is dropped and u = j
+    shifted = bool( s.any() )
+    factor = 2 if shifted else 1
+    sizes = [ int(size) for size in n ]
+    offsets = [ int(offset) for offset in s ]
+    u = ( factor * np.indices( tuple(n), dtype = np.int32 ).reshape(3, -1) + ( s[:, None] if shifted else 0 ) ).astype(np.int32)
+
+    #each point is labelled by the smallest grid index in its star
+    canonical = np.arange( u.shape[1], dtype = np.int32 )
+
+    for rotation in rotations:
+
+        #the image k R stays on the grid only if R does not mix axes with different numbers of points
+        if any( rotation[m, i] and sizes[m] != sizes[i] for m in range(3) for i in range(3) ):
+            continue
+
+        image = [ sum( int( rotation[m, i] ) * u[m] for m in range(3) if rotation[m, i] ) for i in range(3) ]
+
+        for sign in signs:
+            if shifted:
+                twice = [ sign * image[i] - offsets[i] for i in range(3) ]
+                if any( ( t % 2 ).any() for t in twice ): #the shifted grid is not mapped onto itself
+                    continue
+                j = [ ( twice[i] // 2 ) % sizes[i] for i in range(3) ]
+            else:
+                j = [ ( sign * image[i] ) % sizes[i] for i in range(3) ]
+            np.minimum( canonical, ( j[0] * sizes[1] + j[1] ) * sizes[2] + j[2], out = canonical )
+
+    representatives, counts = np.unique(canonical, return_counts = True)
+
+    points = ( u[:, representatives] / ( float(factor) * n[:, None] ) ).T
+
+    return KPoints( "crystal", points, counts / float( u.shape[1] ) )
+
+def band_path(vertices, points = 100, mode = "tpiba", cell = None):
+    """
+    Return the KPoints of a path through vertices, with about the given number of points
+    in all, spread over the segments in proportion to their length
+
+    vertices are in the coordinates of mode, "tpiba" or "crystal"; crystal coordinates
+    need the cell to measure the segments.
+    """
+
+    vertices = np.asarray(vertices, dtype = np.float64).reshape(-1, 3)
+    if len(vertices) < 2:
+        raise ValueError('A band path needs at least two points')
+
+    if mode == "crystal":
+        if cell is None:
+            raise ValueError('Crystal coordinates need the cell to measure the path')
+        cartesian = vertices @ np.linalg.inv( np.asarray(cell, dtype = np.float64) ).T
+    elif mode == "tpiba":
+        cartesian = vertices
+    else:
+        raise ValueError('Band paths are generated in tpiba or crystal coordinates')
+
+    lengths = np.linalg.norm( np.diff(cartesian, axis = 0), axis = 1 )
+    counts = np.maximum( 1, np.rint( (points - 1) * lengths / lengths.sum() ).astype(np.int64) )
+    counts[ lengths == 0 ] = 0
+
+    segment = np.repeat( np.arange( len(counts) ), counts )
+    offset = np.arange( counts.sum() ) - np.repeat( np.cumsum(counts) - counts, counts )
+    fraction = ( offset / np.repeat(counts, counts) )[:, None]
+
+    path = vertices[segment] + fraction * ( vertices[segment + 1] - vertices[segment] )
+    path = np.vstack( [ path, vertices[-1:] ] )
+
+    return KPoints( mode, path, np.ones( len(path) ) )
+
+def standard_path(lattice, points = 100):
+    """
+    Return the KPoints of the usual band path of a cubic lattice, "sc", "fcc" or "bcc"
+    """
+
+    try:
+        symmetry_points = HIGH_SYMMETRY_POINTS[lattice]
+    except KeyError:
+        raise ValueError('No standard path for the lattice: ' + repr(lattice))
+
+    return band_path( [ symmetry_points[label] for label in PATHS[lattice].split() ], points )
@@ -0,0 +1,162 @@
+"""
+Stand-in for pw.x, for testing the job runner without Quantum ESPRESSO
+
+It reads a pw.x input as pw.x does, from -in (or -i, -inp, -input) or from
+standard input, and writes output in the format of pw.x: a header, the
+iterations of each self-consistent cycle with their total energy and estimated
+accuracy, the final energy, and for relax and vc-relax a few ionic steps with
+their total force.  The energies decay towards a value derived from the input,
+so that the same input always gives the same output.  It only uses the
+standard library, so that starting it costs little more than starting Python.
+
+    python mock_pw.py -in scf.in > scf.out
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import time
+import zlib
+
+
+
+#the value of a namelist parameter, as name = value
+_PARAMETER = re.compile(r"""\b(\w+)\s*=\s*('[^']*'|"[^"]*"|[^\s,/!]+)""")
+
+#ionic steps of a relax or vc-relax
+IONIC_STEPS = 3
+
+
+
+def read_parameters(text):
+    """
+    Return the namelist parameters of a pw.x input, as a dictionary of lower-case names to text values
+    """
+
+    namelists = text.split("ATOMIC_SPECIES")[0]
+
+    return { name.lower(): value.strip("'\"") for name, value in _PARAMETER.findall(namelists) }
+
+def fortran_float(text, default):
+
+    try:
+        return float( text.lower().replace("d", "e") )
+    except (AttributeError, ValueError):
+        return default
+
+
+
+def scf(stream, energy, parameters, iterations, delay, started):
+    """
+    Write the iterations of one self-consistent cycle, and return whether it converged
+    """
+
+    conv_thr = fortran_float( parameters.get("conv_thr"), 1e-6 )
+    beta = fortran_float( parameters.get("mixing_beta"), 0.7 )
+    ecutwfc = fortran_float( parameters.get("ecutwfc"), 30.0 )
+    maxstep = int( fortran_float( parameters.get("electron_maxstep"), 100 ) )
+
+    #the estimated accuracy shrinks by a factor set by the mixing, until it is below conv_thr
+    accuracy = 0.1
+    factor = 0.05 + 0.5 * ( 1.0 - beta ) if iterations is None else math.pow( conv_thr / accuracy, 1.0 / iterations ) * 0.999
+
+    stream.write("     Self-consistent Calculation\n")
+
+    for iteration in range( 1, maxstep + 1 ):
+        if delay:
+            time.sleep(delay)
+
+        stream.write("\n     iteration #%3i     ecut=%9.2f Ry     beta=%5.2f\n" % ( iteration, ecutwfc, beta ))
+        stream.write("     Davidson diagonalization with overlap\n")
+        stream.write("     ethr =  %.2E,  avg # of iterations =  %.1f\n\n" % ( min( 1e-2, accuracy / 10 ), 2.0 ))
+        stream.write("     total cpu time spent up to now is %10.1f secs\n\n" % ( time.perf_counter() - started ))
+
+        converged = accuracy < conv_thr
+        stream.write("%s    total energy              = %17.8f Ry\n" % ( "!" if converged else " ", energy + accuracy ))
+        stream.write("     estimated scf accuracy    < %17.8f Ry\n" % accuracy)
+        stream.flush()
+
+        if converged:
+            stream.write("\n     convergence has been achieved in %3i iterations\n\n" % iteration)
+            return True
+
+        accuracy *= factor
+
+    stream.write("\n     convergence NOT achieved after %3i iterations: stopping\n\n" % maxstep)
+    return False
+
+def run(text, stream, iterations = None, delay = 0.0):
+    """
+    Write the output of pw.x for an input to stream, and return its exit status
+    """
+
+    started = time.perf_counter()
+    parameters = read_parameters(text)
+
+    calculation = parameters.get("calculation", "scf")
+    steps = IONIC_STEPS if calculation in ("relax", "vc-relax", "md", "vc-md") else 1
+
+    #a reproducible energy, between -10 and -110 Ry, for each input
+    energy = -10.0 - ( zlib.crc32( text.encode("utf-8") ) % 100000 ) / 1000.0
+
+    stream.write("\n     Program PWSCF v.6.8 starts on %s\n\n" % time.strftime("%d%b%Y at %H:%M:%S"))
+    stream.write("     Mock pw.x, for testing; no calculation is made\n\n")
+    stream.write("     Current dimensions of program PWSCF are:\n")
+    stream.write("     prefix = %s, calculation = %s\n\n" % ( parameters.get("prefix", "pwscf"), calculation ))
+
+    for step in range(steps):
+        if not scf(stream, energy, parameters, iterations, delay, started):
+            return 1
+
+        force = 0.1 * math.pow(0.2, step)
+        stream.write("     Total force = %12.6f     Total SCF correction = %12.6f\n\n" % ( force, 0.0 ))
+
+        if steps > 1:
+            stream.write("     number of scf cycles    = %3i\n" % ( step + 1 ))
+            stream.write("     number of bfgs steps    = %3i\n\n" % step)
+            if step == steps - 1:
+                stream.write("     bfgs converged in %3i scf cycles and %3i bfgs steps\n\n" % ( steps, steps - 1 ))
+                stream.write("     End of BFGS Geometry Optimization\n\n")
+
+        energy -= 0.01 * math.pow(0.2, step)
+
+    #pw.x saves its data under outdir as prefix.save
+    outdir = parameters.get("outdir", os.environ.get("ESPRESSO_TMPDIR", "./"))
+    save = os.path.join( outdir, parameters.get("prefix", "pwscf") + ".save" )
+    os.makedirs(save, exist_ok = True)
+    with open( os.path.join(save, "data-file-schema.xml"), "w" ) as f:
+        f.write( '<?xml version="1.0"?>\n<qes:espresso><total_energy>%.8f</total_energy></qes:espresso>\n' % energy )
+
+    stream.write("     PWSCF        : %8.2fs CPU %8.2fs WALL\n\n" % ( time.process_time(), time.perf_counter() - started ))
+    stream.write("   This run was terminated on:  %s\n\n" % time.strftime("%H:%M:%S  %d%b%Y"))
+    stream.write("=------------------------------------------------------------------------------=\n")
+    stream.write("   JOB DONE.\n")
+    stream.write("=------------------------------------------------------------------------------=\n")
+
+    return 0
+
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Write pw.x-style output for a pw.x input, without calculating anything")
+    parser.add_argument("-in", "-i", "-inp", "-input", dest = "input", default = None,
+                        help = "pw.x input file (by default, standard input)")
+    parser.add_argument("--iterations", type = int, default = None,
+                        help = "scf iterations to convergence (by default, set by mixing_beta)")
+    parser.add_argument("--delay", type = float, default = 0.0, help = "seconds each scf iteration takes")
+
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        text = sys.stdin.read()
+    else:
+        with open(args.input) as f:
+            text = f.read()
+
+    return run(text, sys.stdout, args.iterations, args.delay)
+
+if __name__ == '__main__':
+    sys.exit( main() )
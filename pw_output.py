@@ -0,0 +1,288 @@
+"""
+Streaming reader of pw.x output
+
+OutputParser takes the output of pw.x in chunks of bytes, as they are appended
+to the output file, and returns the events in each chunk: scf iterations,
+energies and estimated accuracies, convergence, total forces, stress, cell
+parameters and ionic steps.  Each chunk is searched by a single regular
+expression for the few lines that carry events, so the many lines that do
+not are skipped without being split or decoded.  Only an incomplete last line,
+or a stress or cell block whose lines have not all arrived, is carried over to
+the next chunk, so memory stays constant however long the output grows.
+
+follow() and follow_async() read a file as it is being written, from the
+position they last reached, and yield its events until the run is done:
+
+    for event in follow(job.output_path, stop = job.done):
+        if event.kind == "accuracy":
+            print(event.step, event.iteration, event.value)
+"""
+
+import asyncio
+import os
+import re
+import time
+
+
+
+#bytes read from the file at a time
+CHUNK_SIZE = 1 << 20
+
+#longest line kept while waiting for its end; longer lines are dropped
+MAX_LINE = 1 << 16
+
+#seconds to wait for more output when the end of a file is reached
+POLL_INTERVAL = 0.2
+
+#lines following the header of a stress or cell block
+BLOCK_LINES = 3
+
+#the lines of pw.x output that carry events; every other line is skipped
+#NOTE: every match starts at the newline before its line, so that the regular expression engine
+#only tries the alternatives at the start of each line, and a line's first character must be able
+#to start one of them before they are tried; this is many times faster than an alternation that
+#can start anywhere
+_EVENTS = re.compile(rb"""
+    \n(?P<final>!)?[ \t]*(?=[iteCTcnEJ])(?:
+      iteration\ \#\s*(?P<iteration>\d+)
+    | total\ energy\s+=\s*(?P<energy>\S+)\ Ry
+    | estimated\ scf\ accuracy\s+<\s*(?P<accuracy>\S+)\ Ry
+    | convergence\ has\ been\ achieved\ in\s+(?P<converged>\d+)
+    | convergence\ NOT\ achieved\ after\s+(?P<not_converged>\d+)
+    | Total\ force\ =\s*(?P<force>\S+)
+    | total\s+stress\s[^\n]*P=\s*(?P<pressure>\S+)[^\n]*\n(?P<stress>[^\n]*(?:\n[^\n]*){2})
+    | CELL_PARAMETERS\s*\((?P<cell_units>[^)]*)\)[^\n]*\n(?P<cell>[^\n]*(?:\n[^\n]*){2})
+    | number\ of\ scf\ cycles\s+=\s*(?P<scf_cycles>\d+)
+    | Entering\ Dynamics:\s+iteration\s+=\s*(?P<md_step>\d+)
+    | (?P<job_done>JOB\ DONE\.)
+    )""", re.VERBOSE)
+
+#the header of a block whose lines may not all have arrived yet
+_BLOCK_HEADER = re.compile(rb"total\s+stress\s|CELL_PARAMETERS")
+
+
+
+class Event():
+    """
+    This class holds one event of pw.x output
+
+    kind is one of "iteration", "energy", "final_energy", "accuracy", "converged",
+    "not_converged", "force", "stress", "cell", "ionic_step" and "job_done".  step is the
+    number of the scf cycle the event belongs to, from 1, and iteration the number of the
+    scf iteration within it.  value is a number, or for "stress" a (pressure, rows) pair in
+    kbar, and for "cell" a (units, rows) pair, with rows as three lists of floats.
+    """
+
+    __slots__ = ("kind", "step", "iteration", "value")
+
+    def __init__(self, kind, step, iteration, value = None):
+
+        self.kind = kind
+        self.step = step
+        self.iteration = iteration
+        self.value = value
+
+    def __repr__(self):
+
+        return "Event(%r, %r, %r, %r)" % ( self.kind, self.step, self.iteration, self.value )
+
+
+
+def block_rows(text, first = 0):
+    """
+    Return three numbers of each line of a block, from the number at first, as lists of floats
+    """
+
+    return [ [ float(number) for number in line.split()[first:first + 3] ] for line in text.splitlines() ]
+
+class OutputParser():
+    """
+    This class turns chunks of pw.x output into events, keeping only the state of the run so far
+    """
+
+    def __init__(self):
+
+        #bytes from the newline that ends the last complete line of the chunks so far
+        self.remainder = b"\n"
+
+        #number of the current scf cycle and iteration, as given to events
+        self.step = 0
+        self.iteration = 0
+
+        #has pw.x finished the run?
+        self.done = False
+
+    def feed(self, data):
+        """
+        Return the events in a chunk of output, as a list
+        """
+
+        #the text parsed runs from the newline before its first line to the end of its last
+        #complete line, and the remainder from the newline after that
+        data = self.remainder + data
+
+        end = data.rfind(b"\n")
+        if end < 0:
+            end = 0
+        text, self.remainder = data[:end], data[end:]
+
+        #a stress or cell block is only parsed once its lines have all arrived
+        start = end
+        for i in range(BLOCK_LINES):
+            start = text.rfind(b"\n", 0, start)
+            if start < 0:
+                start = 0
+                break
+        header = _BLOCK_HEADER.search(text, start)
+        if header is not None:
+            cut = text.rfind(b"\n", 0, header.start())
+            if cut < 0:
+                cut = 0
+            text, self.remainder = text[:cut], text[cut:] + self.remainder
+
+        #a line that never ends is not pw.x output, and is dropped rather than kept
+        if len(self.remainder) > MAX_LINE:
+            self.remainder = b""
+
+        return self.parse(text)
+
+    def flush(self):
+        """
+        Return the events of any output left over, once no more will come
+        """
+
+        text, self.remainder = self.remainder, b"\n"
+
+        return self.parse(text)
+
+    def parse(self, text):
+
+        events = []
+
+        for match in _EVENTS.finditer(text):
+            #the last group of each alternative names its event
+            kind = match.lastgroup
+            value = match.group(kind)
+
+            try:
+                if kind == "iteration":
+                    iteration = int(value)
+                    #the first iteration of a cycle starts a new cycle
+                    if iteration <= self.iteration or not self.step:
+                        self.step += 1
+                    self.iteration = iteration
+                    value = iteration
+                elif kind == "energy":
+                    value = float(value)
+                    #pw.x marks the energy of a converged cycle with "!"
+                    if match.group("final"):
+                        kind = "final_energy"
+                elif kind in ("accuracy", "force"):
+                    value = float(value)
+                elif kind in ("converged", "not_converged"):
+                    value = int(value)
+                elif kind == "stress":
+                    value = ( float( match.group("pressure") ), block_rows(value, 3) )
+                elif kind == "cell":
+                    value = ( match.group("cell_units").decode("ascii", "replace").strip(), block_rows(value) )
+                elif kind in ("scf_cycles", "md_step"):
+                    kind = "ionic_step"
+                    value = int(value)
+                elif kind == "job_done":
+                    self.done = True
+                    value = None
+            except ValueError: #a number pw.x could not fit in its field, such as ********
+                continue
+
+            events.append( Event(kind, self.step, self.iteration, value) )
+
+        return events
+
+
+
+def parse_output(text):
+    """
+    Return the events of the whole of a pw.x output, as text or bytes
+    """
+
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+
+    parser = OutputParser()
+
+    return parser.feed(text) + parser.flush()
+
+def _read(path, from_end, chunk_size, stop):
+    """
+    Yield lists of the events of a file as they are appended to it, or None when
+    the end of the file has been reached and more output may follow
+    """
+
+    #the file of a job that has not started does not exist yet
+    while not os.path.exists(path):
+        if stop is not None and stop():
+            return
+        yield None
+
+    parser = OutputParser()
+
+    with open(path, "rb") as f:
+        if from_end:
+            f.seek(0, os.SEEK_END)
+
+        while True:
+            #check for the end of the run before reading, so that output written just
+            #before it ended is still read
+            stopping = parser.done or ( stop is not None and stop() )
+
+            data = f.read(chunk_size)
+            if data:
+                yield parser.feed(data)
+                continue
+
+            if stopping:
+                yield parser.flush()
+                return
+
+            #a file truncated and written again, as by a job run again, is read from its start
+            if os.fstat( f.fileno() ).st_size < f.tell():
+                f.seek(0)
+                parser = OutputParser()
+
+            yield None
+
+def follow(path, stop = None, from_end = False, poll_interval = POLL_INTERVAL, chunk_size = CHUNK_SIZE):
+    """
+    Yield the events of a pw.x output file, reading it as it is written
+
+    The file is read until pw.x reports that the job is done, or until stop() returns True
+    once the end of the file has been reached; with stop = lambda: True, the file is read
+    once to its end.  If from_end is True, only output appended from now on is read.
+    """
+
+    for events in _read(path, from_end, chunk_size, stop):
+        if events is None:
+            time.sleep(poll_interval)
+        else:
+            yield from events
+
+async def follow_async(path, stop = None, from_end = False, poll_interval = POLL_INTERVAL, chunk_size = CHUNK_SIZE):
+    """
+    Yield the events of a pw.x output file, as follow() does, without blocking an asyncio event loop
+    """
+
+    for events in _read(path, from_end, chunk_size, stop):
+        if events is None:
+            await asyncio.sleep(poll_interval)
+        else:
+            for event in events:
+                yield event
+            #let other tasks run between chunks of a long file
+            await asyncio.sleep(0)
+
+def parse_file(path, chunk_size = CHUNK_SIZE):
+    """
+    Yield the events of a pw.x output file that has been written
+    """
+
+    return follow(path, stop = lambda: True, chunk_size = chunk_size)
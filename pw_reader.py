@@ -0,0 +1,415 @@
+"""
+Reader of pw.x input files
+
+The namelists are read by a single regular-expression tokenizer that walks the
+text once; the cards that follow are located by their headers and kept as
+lists of lines, so that a large ATOMIC_POSITIONS block costs one split.
+
+Each pw.x parameter is mapped back to the form input that writes it, using
+the form schema, and the GUI_* inputs are inferred from the parameters.
+Parameters that no active field would write are kept in
+QuantumEspressoInputFile.extra_parameters, so that they are written back out.
+"""
+
+import re
+
+from form import reveal_inputs
+from pw_writer import CARDS, combo_choice, resolve_form
+from qe_input import Card, QuantumEspressoInputFile
+from schema import load_schema
+
+
+
+#the start of a namelist, after any blank lines and comments
+_NAMELIST = re.compile(r"(?:\s+|![^\n]*)*&(\w+)")
+
+#tokens inside a namelist; a name is only recognized when followed by "="
+_TOKEN = re.compile(r"""
+      (?P<space>[\s,]+)
+    | (?P<comment>![^\n]*)
+    | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+    | (?P<name>[A-Za-z_][\w%]*(?:\s*\([^)]*\))?)\s*=
+    | (?P<end>/)
+    | (?P<value>[^\s,/!'"=]+)
+    """, re.VERBOSE)
+
+#the header line of a card
+_CARD = re.compile(r"^[ \t]*(" + "|".join(CARDS) + r")\b[ \t]*([^\n]*)$", re.MULTILINE | re.IGNORECASE)
+
+#input_dft values of hybrid functionals
+HYBRID_FUNCTIONALS = ("pbe0", "hse", "b3lyp", "gaupbe", "x3lyp", "b86bx", "hf", "sx", "vdw-df-c09x")
+
+#pw.x parameters that are only read to infer GUI_* inputs, and are written again by the writer
+INFERRED_PARAMETERS = ("noncolin",)
+
+BOHR_TO_ANGSTROM = 0.529177210903
+
+
+
+class PwInputError(ValueError):
+    """
+    Raised when a pw.x input file cannot be read
+    """
+
+
+
+def read_input(source, schema = None):
+    """
+    Read a pw.x input from a path or a file-like object, and return a QuantumEspressoInputFile
+    """
+
+    if hasattr(source, "read"):
+        text = source.read()
+    else:
+        with open(source) as f:
+            text = f.read()
+
+    return parse_input(text, schema)
+
+def parse_input(text, schema = None):
+    """
+    Parse the text of a pw.x input, and return a QuantumEspressoInputFile
+    """
+
+    namelists, cards = tokenize(text)
+
+    return build_input_file( namelists, cards, schema or load_schema() )
+
+
+
+def tokenize(text):
+    """
+    Split the text of a pw.x input into its namelists and cards
+
+    Returns a dictionary of {parameter: [value texts]} dictionaries keyed by upper-case
+    namelist name, with lower-case parameter names, and a dictionary of Cards by name.
+    """
+
+    namelists = {}
+    pos = 0
+
+    while True:
+
+        match = _NAMELIST.match(text, pos)
+        if match is None:
+            break
+
+        entries = namelists.setdefault( match.group(1).upper(), {} )
+        pos = match.end()
+        values = None
+
+        while True:
+
+            token = _TOKEN.match(text, pos)
+            if token is None:
+                line = text.count("\n", 0, pos) + 1
+                if pos >= len(text):
+                    raise PwInputError("Namelist &" + match.group(1) + " is not terminated by '/'")
+                raise PwInputError("Unexpected text on line " + str(line) + ": " +
+                                   text[pos:pos + 20].split("\n")[0])
+
+            pos = token.end()
+            kind = token.lastgroup
+
+            if kind == "name":
+                values = []
+                entries[ token.group("name").replace(" ", "").lower() ] = values
+
+            elif kind == "value" or kind == "string":
+                if values is None:
+                    line = text.count("\n", 0, pos) + 1
+                    raise PwInputError("Value without a parameter name on line " + str(line))
+                values.append( token.group(kind) )
+
+            elif kind == "end":
+                break
+
+    cards = {}
+    headers = list( _CARD.finditer(text, pos) )
+
+    for i, header in enumerate(headers):
+
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+
+        name = header.group(1).upper()
+        option = header.group(2).strip().strip("{}()").strip() or None
+
+        lines = [ line.strip() for line in text[ header.end():end ].split("\n") ]
+        lines = [ line for line in lines if line and line[0] not in "#!" ]
+
+        cards[name] = Card(name, option, lines)
+
+    return namelists, cards
+
+
+
+def unquote(text):
+
+    if text[:1] in ("'", '"'):
+        quote = text[0]
+        return text[1:-1].replace(quote + quote, quote)
+
+    return text
+
+def is_true(text):
+    """
+    Return whether a Fortran logical is true
+    """
+
+    return unquote(text).strip(".").lower().startswith("t")
+
+def input_value(field, text):
+    """
+    Return the form input value of a field, given the Fortran text of its parameter
+    """
+
+    value = unquote(text)
+
+    if field.type == "check":
+        if field.values is None:
+            checked = is_true(text)
+        else:
+            checked = ( value == str(field.values[1]) )
+        return 2 if checked else 0 #Qt.Checked
+
+    if field.scale is not None:
+        try:
+            return "%g" % ( float( value.lower().replace("d", "e") ) / field.scale )
+        except ValueError:
+            pass
+
+    return value
+
+
+
+#parameter index of each schema, built on first use
+_parameter_fields = {}
+
+def parameter_fields(schema):
+    """
+    Return a dictionary from lower-case pw.x parameter name to (field, position), where
+    position is the index of the parameter within a field that holds several parameters
+    """
+
+    try:
+        return _parameter_fields[id(schema)]
+    except KeyError:
+        pass
+
+    fields = {}
+    for field_list in schema.fields.values():
+        for field in field_list:
+            if field.namelist is None:
+                continue
+            if isinstance(field.key, list):
+                for position, key in enumerate(field.key):
+                    fields.setdefault( key.lower(), (field, position) )
+            else:
+                fields.setdefault( field.key.lower(), (field, None) )
+
+    _parameter_fields[id(schema)] = fields
+
+    return fields
+
+def build_input_file(namelists, cards, schema):
+    """
+    Map parsed namelists and cards onto a new QuantumEspressoInputFile
+    """
+
+    input_file = QuantumEspressoInputFile()
+    inputs = input_file.inputs
+    fields = parameter_fields(schema)
+
+    #all parameters by name, for inferring the GUI_* inputs
+    parameters = {}
+
+    #the input set by each parameter, and the parameters that are not set by any field
+    parameter_inputs = {}
+    extra = {}
+
+    #values of fields that hold several parameters, by input name and position
+    parts = {}
+
+    for namelist, entries in namelists.items():
+        for key, values in entries.items():
+
+            text = ", ".join(values)
+            parameters[key] = text
+
+            base, _, index = key.partition("(")
+            field, position = fields.get( base, (None, None) )
+
+            #a per-species field holds one value per species; a parameter with more indices, such
+            #as Hubbard_J(k,ityp), is kept as written
+            if ( field is None or key in INFERRED_PARAMETERS or ( index and not field.per_species )
+                 or "," in index ):
+                extra.setdefault(namelist, {})[key] = text
+                continue
+
+            if field.per_species:
+                species = int( index.rstrip(")") ) if index else 1
+                parts.setdefault( field.input_name, {} )[species] = unquote(text)
+            elif position is not None:
+                parts.setdefault( field.input_name, {} )[position] = unquote(text)
+            else:
+                value = input_value(field, text)
+                if field.type == "combo":
+                    #vc-relax and vc-md are shown as relax and md with a variable cell
+                    if key == "calculation" and value.lower().startswith("vc-"):
+                        value = value[3:]
+                    value = combo_choice(field, value)
+                    if value is None: #a value the form does not offer, such as input_dft = 'PBE0', is written back as read
+                        extra.setdefault(namelist, {})[key] = text
+                        continue
+                inputs[field.input_name] = value
+
+            parameter_inputs[ (namelist, key) ] = field.input_name
+
+    #per-species and multi-parameter fields hold their values space-separated, in order
+    for input_name, values in parts.items():
+        start = 1 if schema.fields[input_name][0].per_species else 0
+        inputs[input_name] = " ".join( values.get(i, "0") for i in range( start, max(values) + 1 ) )
+
+    #per-species values are also kept as arrays, in which the species a file leaves out stay unset
+    species_parts = { name: values for name, values in parts.items() if schema.fields[name][0].per_species }
+    if species_parts:
+        input_file.species_parameters = species_arrays(species_parts, parameters, schema)
+
+    infer_gui_inputs(inputs, parameters, schema)
+
+    #cards that correspond to form inputs are taken out of the cards
+    lattice = cell_parameters_text( cards.get("CELL_PARAMETERS") )
+    if lattice is not None:
+        inputs["GUI_lattice_vector"] = lattice
+        del cards["CELL_PARAMETERS"]
+
+    kpoints_inputs(inputs, cards)
+
+    input_file.cards = cards
+
+    #parameters of fields that are not active would not be written, so keep them as extras
+    active = { field.input_name for field in resolve_form(input_file).active_fields() }
+    for (namelist, key), input_name in parameter_inputs.items():
+        if input_name not in active:
+            extra.setdefault(namelist, {})[key] = parameters[key]
+
+    input_file.extra_parameters = extra
+
+    return input_file
+
+def species_arrays(species_parts, parameters, schema):
+    """
+    Return the SpeciesParameters of the per-species values read, as {input name: {species: text}}
+    with species counted from 1
+    """
+
+    from species_parameters import SpeciesParameters, parse_values
+
+    ntyp = max( [ int( unquote( parameters.get("ntyp", "1") ) ) ] + [ max(values) for values in species_parts.values() ] )
+
+    arrays = SpeciesParameters.for_schema(schema, ntyp)
+    for input_name, values in species_parts.items():
+        species = sorted(values)
+        arrays.get(input_name)[ [ i - 1 for i in species ] ] = parse_values( [ values[i] for i in species ] )
+
+    return arrays
+
+def infer_gui_inputs(inputs, parameters, schema):
+    """
+    Set the GUI_* inputs, and the inputs they change, from the pw.x parameters
+    """
+
+    if unquote( parameters.get("calculation", "") ).lower() in ("vc-relax", "vc-md") and "calculation" in inputs:
+        inputs["GUI_variable_cell"] = 2 #Qt.Checked
+    else:
+        inputs["GUI_variable_cell"] = 0
+
+    if is_true( parameters.get("lda_plus_u", "F") ):
+        if unquote( parameters.get("lda_plus_u_kind", "0") ) == "1":
+            inputs["GUI_exx_corr"] = "dft+u+j"
+        else:
+            inputs["GUI_exx_corr"] = "dft+u"
+    elif ( unquote( parameters.get("input_dft", "") ).lower() in HYBRID_FUNCTIONALS or
+           "exx_fraction" in parameters ):
+        inputs["GUI_exx_corr"] = "hybrid"
+    else:
+        inputs["GUI_exx_corr"] = "none"
+
+    if is_true( parameters.get("tefield", "F") ):
+        inputs["GUI_efield_type"] = "tefield"
+    elif is_true( parameters.get("lelfield", "F") ):
+        inputs["GUI_efield_type"] = "lefield"
+    else:
+        inputs["GUI_efield_type"] = "none"
+
+    try:
+        charged = float( unquote( parameters.get("tot_charge", "0") ).lower().replace("d", "e") ) != 0.0
+    except ValueError:
+        charged = True
+    if is_true( parameters.get("monopole", "F") ):
+        inputs["GUI_charge_type"] = "monopole"
+    elif charged:
+        inputs["GUI_charge_type"] = "homogeneous"
+    else:
+        inputs["GUI_charge_type"] = "neutral"
+
+    if is_true( parameters.get("noncolin", "F") ):
+        inputs["nspin"] = "4"
+
+    #any other GUI_* input takes the value that shows the parameters that were given
+    reveal_inputs( inputs, list(inputs), schema )
+
+def kpoints_inputs(inputs, cards):
+    """
+    Set the GUI_kpoint_* inputs from the K_POINTS card, removing the card if the inputs describe it
+    """
+
+    card = cards.get("K_POINTS")
+    if card is None:
+        return
+
+    option = ( card.option or "tpiba" ).lower()
+
+    if option == "gamma":
+        inputs["GUI_kpoint_type"] = "gamma"
+        del cards["K_POINTS"]
+
+    elif option == "automatic":
+        inputs["GUI_kpoint_type"] = "automatic"
+        values = card.lines[0].split() if card.lines else []
+        #the GUI shifts every axis or none, so other shifts are kept as the card
+        if len(values) == 6 and values[3:] in ( ["0"] * 3, ["1"] * 3 ):
+            inputs["GUI_kpoint_grid"] = " ".join( values[:3] )
+            inputs["GUI_kpoint_shift"] = 2 if values[3] == "1" else 0 #Qt.Checked
+            del cards["K_POINTS"]
+
+    else:
+        inputs["GUI_kpoint_type"] = "explicit"
+
+def cell_parameters_text(card):
+    """
+    Return the lattice vectors of a CELL_PARAMETERS card in angstrom, as the text of
+    GUI_lattice_vector, or None if the card is kept as it is
+
+    A card in alat units is kept, along with celldm(1) or a: the alat of ATOMIC_POSITIONS
+    and the 2 pi / alat of K_POINTS tpiba are that lattice parameter, and pw.x does not
+    accept one alongside a cell in angstrom.
+    """
+
+    if card is None or len(card.lines) != 3:
+        return None
+
+    option = ( card.option or "alat" ).lower()
+
+    if option == "angstrom":
+        scale = 1.0
+    elif option == "bohr":
+        scale = BOHR_TO_ANGSTROM
+    else:
+        return None
+
+    if scale == 1.0:
+        return "\n".join(card.lines)
+
+    return "\n".join( " ".join( "%.10g" % ( float( v.lower().replace("d", "e") ) * scale ) for v in line.split() )
+                      for line in card.lines )
@@ -0,0 +1,297 @@
+"""
+Writer of pw.x input files
+
+Only the inputs of fields that are shown in the form are written; each field's
+namelist, parameter name and Fortran kind come from the form schema.  The
+pw.x parameters implied by the GUI_* inputs are then derived, and the cards
+are streamed to the output in chunks, so that large cards are never built as
+a single string.
+"""
+
+from form import InputForm, effective_calculation
+from qe_input import Card, QuantumEspressoInputFile
+from schema import NAMELISTS, pw_default
+
+
+
+#pw.x cards, in the order they appear in an input file
+CARDS = ("ATOMIC_SPECIES", "ATOMIC_POSITIONS", "K_POINTS", "ADDITIONAL_K_POINTS", "CELL_PARAMETERS",
+         "CONSTRAINTS", "OCCUPATIONS", "ATOMIC_VELOCITIES", "ATOMIC_FORCES", "SOLVENTS", "HUBBARD")
+
+#namelists that pw.x only reads for some values of calculation
+NAMELIST_CALCULATIONS = { "IONS": ("relax", "md", "vc-relax", "vc-md"),
+                          "CELL": ("vc-relax", "vc-md") }
+
+#number of card entries joined into each write to the stream
+CHUNK_LINES = 4096
+
+
+
+def fortran_value(value, kind):
+    """
+    Return value as the text of a Fortran namelist value of the given kind
+    """
+
+    if kind == "string":
+        return "'" + str(value).replace("'", "''") + "'"
+
+    if kind == "logical" and not isinstance(value, str):
+        return ".true." if value else ".false."
+
+    return str(value)
+
+def combo_choice(field, value, default = None):
+    """
+    Return the choice of a combo field that value matches, ignoring case, or default if none does
+    """
+
+    text = str(value).strip().lower()
+    for choice in field.choices:
+        if str( choice[1] ).lower() == text:
+            return choice[1]
+
+    return default
+
+def format_field(field, value):
+    """
+    Return the (parameter, text) pairs written for a field with the given value
+    """
+
+    if field.type == "combo":
+        #Fortran is not case-sensitive, so a value is written as the choice it matches in any
+        #case; a value the combo box does not offer is written as it was given
+        value = combo_choice(field, value, value)
+
+    elif field.type == "check":
+        if field.values is None:
+            return [ (field.key, fortran_value( bool(value), "logical" )) ]
+        value = field.values[ bool(value) ]
+
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "": #unset
+            return []
+
+    if field.scale is not None:
+        try:
+            value = "%.10g" % ( float(value) * field.scale )
+        except ValueError:
+            pass #written as given, for the validator to report
+
+    if field.per_species:
+        keys = [ field.key + "(" + str(i + 1) + ")" for i in range( len( str(value).split() ) ) ]
+        values = str(value).split()
+    elif isinstance(field.key, list):
+        keys = field.key
+        values = str(value).split()
+    else:
+        keys = [ field.key ]
+        values = [ value ]
+
+    return [ (key, fortran_value(v, field.kind)) for key, v in zip(keys, values) ]
+
+
+
+def resolve_form(input_file):
+    """
+    Return an InputForm with every group open, over a copy of the inputs so that
+    filling in defaults does not modify input_file
+    """
+
+    resolved = QuantumEspressoInputFile()
+    resolved.inputs = dict(input_file.inputs)
+    resolved.defaults = set(input_file.defaults)
+    resolved.cards = input_file.cards
+
+    form = InputForm(resolved)
+    form.open_all()
+
+    return form
+
+def default_text(field, key, calculation):
+    """
+    Return the text of the value pw.x takes for parameter key of field when it is left out, or None
+    """
+
+    default = pw_default(key, calculation)
+
+    return None if default is None else fortran_value(default, field.kind)
+
+def collect_parameters(input_file, form = None):
+    """
+    Return the pw.x parameters of the active fields, as a dictionary of
+    {parameter: text} dictionaries keyed by namelist
+
+    If form is None, every group of the form is opened to decide which fields are active.
+    """
+
+    if form is None:
+        form = resolve_form(input_file)
+
+    inputs = form.input_file.inputs
+    defaults = form.input_file.defaults
+
+    parameters = { namelist: {} for namelist in NAMELISTS }
+
+    #active per-species inputs written from input_file.species_parameters, by namelist
+    species_parameters = input_file.species_parameters
+    species_inputs = {}
+
+    calculation = effective_calculation(inputs)
+
+    for field in form.active_fields():
+        schema = field.schema
+        if schema.namelist is None:
+            continue
+        if schema.per_species and species_parameters is not None:
+            if field.input_name not in defaults:
+                species_inputs.setdefault(schema.namelist, []).append(field.input_name)
+            continue
+        value = inputs[field.input_name]
+        #a value the form filled in is left to pw.x while it is pw.x's own default, which can
+        #depend on the calculation chosen since, or while it was filled in by another field of
+        #the same input, such as ion_dynamics for md, and is not one this field offers
+        filled = field.input_name in defaults
+        if filled and schema.type == "combo" and combo_choice(schema, value) is None:
+            continue
+        for key, text in format_field(schema, value):
+            if filled and text == default_text(schema, key, calculation):
+                continue
+            parameters[schema.namelist][key] = text
+
+    for namelist, names in species_inputs.items():
+        parameters[namelist].update( species_parameters.parameters(names) )
+
+    #parameters read from an existing input that no active field sets
+    for namelist, extra in input_file.extra_parameters.items():
+        for key, text in extra.items():
+            parameters.setdefault(namelist, {}).setdefault(key, text)
+
+    derive_parameters(inputs, parameters)
+
+    if input_file.structure is not None:
+        parameters["SYSTEM"]["nat"] = str(input_file.structure.nat)
+        parameters["SYSTEM"]["ntyp"] = str(input_file.structure.ntyp)
+
+    return parameters
+
+def derive_parameters(inputs, parameters):
+    """
+    Set the pw.x parameters implied by the GUI_* inputs, overriding any field that sets them
+    """
+
+    control = parameters["CONTROL"]
+    system = parameters["SYSTEM"]
+
+    calculation = inputs.get("calculation")
+    if inputs.get("GUI_variable_cell") and calculation in ("relax", "md"):
+        control["calculation"] = fortran_value( "vc-" + calculation, "string" )
+
+    exx_corr = inputs.get("GUI_exx_corr")
+    if exx_corr in ("dft+u", "dft+u+j"):
+        system["lda_plus_u"] = ".true."
+    if exx_corr == "dft+u+j":
+        system["lda_plus_u_kind"] = "1"
+
+    efield_type = inputs.get("GUI_efield_type")
+    if efield_type == "tefield":
+        control["tefield"] = ".true."
+    elif efield_type == "lefield":
+        control["lelfield"] = ".true."
+
+    if inputs.get("GUI_charge_type") == "monopole":
+        system["monopole"] = ".true."
+
+    #pw.x takes noncollinear magnetism as noncolin rather than nspin = 4
+    if system.get("nspin") == "4":
+        del system["nspin"]
+        system["noncolin"] = ".true."
+
+def input_cards(input_file, inputs):
+    """
+    Return the cards of the input file in pw.x order, including those derived from inputs
+    """
+
+    cards = {}
+
+    if inputs.get("ibrav") == "0":
+        vectors = [ line.strip() for line in inputs.get("GUI_lattice_vector", "").splitlines() if line.strip() ]
+        if vectors:
+            cards["CELL_PARAMETERS"] = Card("CELL_PARAMETERS", "angstrom", vectors)
+
+    kpoint_type = inputs.get("GUI_kpoint_type")
+    if kpoint_type == "automatic":
+        grid = inputs.get("GUI_kpoint_grid", "").split()
+        if len(grid) == 3:
+            shift = "1" if inputs.get("GUI_kpoint_shift") else "0"
+            cards["K_POINTS"] = Card("K_POINTS", "automatic", [ " ".join( grid + [shift] * 3 ) ])
+    elif kpoint_type == "gamma":
+        cards["K_POINTS"] = Card("K_POINTS", "gamma", [])
+
+    #the cards of a structure or k-points take precedence over those derived from inputs, and cards
+    #set explicitly over all of them: setting a structure or k-points removes their cards, so any
+    #left were set after them, as by a sweep of K_POINTS
+    if input_file.structure is not None:
+        cards.update( (card.name, card) for card in input_file.structure.cards() )
+    if input_file.kpoints is not None:
+        cards["K_POINTS"] = input_file.kpoints.card()
+    cards.update(input_file.cards)
+
+    return [ cards[name] for name in CARDS if name in cards ]
+
+
+
+def write_namelist(name, parameters, stream):
+
+    lines = [ "&" + name + "\n" ]
+    lines.extend( "  " + key + " = " + text + "\n" for key, text in parameters.items() )
+    lines.append("/\n")
+
+    stream.write( "".join(lines) )
+
+def write_card(card, stream):
+    """
+    Write a card to stream, joining its entries into chunks of CHUNK_LINES
+    """
+
+    if card.option:
+        stream.write(card.name + " " + card.option + "\n")
+    else:
+        stream.write(card.name + "\n")
+
+    chunk = []
+    for line in card.lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            chunk.append("")
+            stream.write( "\n".join(chunk) )
+            chunk = []
+
+    if chunk:
+        chunk.append("")
+        stream.write( "\n".join(chunk) )
+
+def write_input(input_file, stream, form = None):
+    """
+    Write input_file as a pw.x input to the file-like object stream
+
+    If form is None, every group of the form is opened to decide which fields are active;
+    pass the form of a Dialog to write only the groups that have been opened there.
+    """
+
+    if form is None:
+        form = resolve_form(input_file)
+
+    parameters = collect_parameters(input_file, form)
+
+    calculation = form.input_file.inputs.get("calculation")
+    if parameters["CONTROL"].get("calculation"):
+        calculation = parameters["CONTROL"]["calculation"].strip("'")
+
+    for name in list(NAMELISTS) + [ name for name in parameters if name not in NAMELISTS ]:
+        if name in NAMELIST_CALCULATIONS and calculation not in NAMELIST_CALCULATIONS[name]:
+            continue
+        write_namelist(name, parameters[name], stream)
+
+    for card in input_cards(input_file, form.input_file.inputs):
+        write_card(card, stream)
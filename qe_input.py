@@ -0,0 +1,363 @@
+"""
+Data model of a Quantum ESPRESSO input file
+"""
+
+from history import MISSING, apply_value
+
+
+
+#inputs of the form from which the writer derives a K_POINTS card, when GUI_kpoint_type is
+#automatic or gamma
+KPOINT_INPUTS = ("GUI_kpoint_type", "GUI_kpoint_grid", "GUI_kpoint_shift")
+
+#names under which the history and the autosave journal hold the units of the structure's positions,
+#and each of its atoms as a line of Structure.atom_text(); they are not inputs of the form
+UNITS_NAME = "ATOMIC_POSITIONS"
+ATOM_NAME = "ATOMIC_POSITIONS(%i)"
+
+
+
+def is_structure_name(name):
+
+    return name.startswith(UNITS_NAME)
+
+def atom_row(name):
+    """
+    Return the row of the atom named by ATOM_NAME, from 0
+    """
+
+    return int( name[ len(UNITS_NAME) + 1:-1 ] )
+
+
+
+class Card():
+    """
+    This class holds one card of a pw.x input file
+    """
+
+    def __init__(self, name, option = None, lines = ()):
+
+        #name of the card, such as "ATOMIC_POSITIONS"
+        self.name = name
+
+        #option written after the name, such as "crystal"
+        self.option = option
+
+        #body of the card: an iterable of strings, each holding one or more lines without
+        #a trailing newline; a generator is consumed as the card is written
+        self.lines = lines
+
+
+
+class QuantumEspressoInputFile():
+    """
+    This class holds all of the information associated with a QE input file
+    """
+ 
+    def __init__(self):
+
+        self.inputs = {}
+
+        #names of the inputs whose values were filled in by the form as their fields were opened,
+        #rather than set by the user or read from a file; the writer leaves them out, so that
+        #pw.x applies its own defaults
+        self.defaults = set()
+
+        #cards of the input file by name, other than those the writer derives from self.inputs
+        self.cards = {}
+
+        #pw.x parameters that no field of the form sets, such as those read from an existing
+        #input file, as {parameter: text} dictionaries keyed by namelist
+        self.extra_parameters = {}
+
+        #atoms and cell as a structure.Structure, or None if they are only given as cards
+        self.structure = None
+
+        #k-points as a kpoints.KPoints, or None if they are given by the form or a card
+        self.kpoints = None
+
+        #per-species parameters as a species_parameters.SpeciesParameters, or None if they are
+        #only given by the space-separated text of their inputs
+        self.species_parameters = None
+
+        #undo history of set_input() as a history.History, or None if changes are not recorded
+        self.history = None
+
+        #the values of the structure names set since the structure was set, for the autosave journal
+        self.structure_changes = {}
+
+    def set_input(self, name, value):
+
+        if self.history is not None:
+            self.history.record( name, self.inputs.get(name, MISSING), value, name in self.defaults )
+
+        #k-points changed on the form replace those of a card or a KPoints, from which the
+        #form's inputs were only read
+        kpoint_type = value if name == "GUI_kpoint_type" else self.inputs.get("GUI_kpoint_type")
+        if name in KPOINT_INPUTS and self.inputs.get(name) != value and kpoint_type in ("automatic", "gamma"):
+            self.kpoints = None
+            self.cards.pop("K_POINTS", None)
+
+        self.inputs[name] = value
+        self.defaults.discard(name)
+
+        self.apply_species_text(name)
+
+    def set_inputs(self, values):
+        """
+        Set several inputs, recorded as a single step of the history
+        """
+
+        if self.history is not None:
+            self.history.begin_group()
+        try:
+            for name, value in values.items():
+                self.set_input(name, value)
+        finally:
+            if self.history is not None:
+                self.history.end_group()
+
+    def apply_species_text(self, name):
+        """
+        Set a per-species parameter from the text of its input, so that the arrays the writer
+        uses follow the text however it is changed
+        """
+
+        parameters = self.species_parameters
+        if parameters is None or name not in parameters.rows:
+            return
+
+        #unchanged text leaves the species that a file left out unset, rather than 0
+        text = self.inputs.get(name, "")
+        if text != parameters.text(name):
+            try:
+                parameters.set_text(name, text)
+            except ValueError: #not yet a list of numbers; the validator reports it
+                pass
+
+    def undo(self):
+        """
+        Undo the last recorded change, returning the names of the inputs it changed
+        """
+
+        if self.history is None:
+            return []
+
+        names = self.history.undo(self.inputs, self.defaults, self.apply_value)
+        for name in names:
+            self.apply_species_text(name)
+
+        return names
+
+    def redo(self):
+        """
+        Redo the last undone change, returning the names of the inputs it changed
+        """
+
+        if self.history is None:
+            return []
+
+        names = self.history.redo(self.inputs, self.defaults, self.apply_value)
+        for name in names:
+            self.apply_species_text(name)
+
+        return names
+
+    def apply_value(self, inputs, name, value):
+        """
+        Set an input, or a structure name, to a value of the history
+        """
+
+        if is_structure_name(name):
+            self.apply_structure_value(name, value, strict = False)
+        else:
+            apply_value(inputs, name, value)
+
+    def set_atom(self, row, text):
+        """
+        Set an atom of the structure from a line as Structure.atom_text() returns it, as the
+        user would, so that it is undone and journaled like an input
+        """
+
+        self.set_structure_value(ATOM_NAME % row, text)
+
+    def set_position_units(self, units):
+        """
+        Convert the positions of the structure to other units, as the user would
+        """
+
+        self.set_structure_value(UNITS_NAME, units)
+
+    def structure_value(self, name):
+        """
+        Return the current value of a structure name
+        """
+
+        if name == UNITS_NAME:
+            return self.structure.units
+
+        return self.structure.atom_text( atom_row(name) )
+
+    def set_structure_value(self, name, value):
+
+        old = self.structure_value(name)
+
+        #the value is applied before it is recorded, so that one that cannot be applied, such as
+        #crystal units without a cell, is not
+        self.apply_structure_value(name, value)
+
+        if self.history is not None:
+            self.history.record(name, old, value)
+
+    def apply_structure_value(self, name, value, strict = True):
+        """
+        Set a structure name to a value
+
+        Unless strict is True, a value that does not fit the structure, such as one recorded for
+        a structure that has since been replaced, is ignored.
+        """
+
+        try:
+            if name == UNITS_NAME:
+                self.structure.convert(value)
+            else:
+                self.structure.set_atom_text( atom_row(name), value )
+        except (AttributeError, IndexError, ValueError):
+            if strict:
+                raise
+            return
+
+        self.structure_changes[name] = value
+
+    def set_card(self, name, option = None, lines = ()):
+        """
+        Set a card, replacing the k-points if it is K_POINTS
+
+        A card of the structure set after it takes precedence over the structure's own.
+        """
+
+        self.cards[name] = Card(name, option, lines)
+
+        if name == "K_POINTS":
+            self.kpoints = None
+
+    def set_structure(self, structure):
+        """
+        Set the atoms and cell, replacing the cards and inputs that describe them
+        """
+
+        self.structure = structure
+        self.structure_changes = {}
+
+        for name in ("ATOMIC_SPECIES", "ATOMIC_POSITIONS", "CELL_PARAMETERS"):
+            self.cards.pop(name, None)
+
+        #nat and ntyp are derived from the structure when writing
+        for key in ("nat", "ntyp"):
+            self.extra_parameters.get("SYSTEM", {}).pop(key, None)
+
+        #there is a value of each per-species parameter for each species
+        if structure is not None and self.species_parameters is not None:
+            self.species_parameters.resize(structure.ntyp)
+
+        #the inputs are set as the user would set them, so that they are written and undone as one step
+        if structure is not None and structure.cell is not None:
+            self.set_inputs( { "ibrav": "0",
+                               "GUI_lattice_vector": "\n".join( "%.10g %.10g %.10g" % tuple(v) for v in structure.cell ) } )
+
+    def load_structure(self):
+        """
+        Build the structure from the ATOMIC_SPECIES and ATOMIC_POSITIONS cards, and
+        from the lattice vectors if ibrav is 0, and return it
+
+        Positions in units the structure cannot hold, such as the Wyckoff positions of
+        crystal_sg, are kept as the card, and None is returned.
+        """
+
+        from structure import BOHR_TO_ANGSTROM, UNITS, Structure
+
+        if ( self.cards["ATOMIC_POSITIONS"].option or "alat" ).lower() not in UNITS:
+            return None
+
+        system = self.extra_parameters.get("SYSTEM", {})
+        alat = None
+        if "celldm(1)" in system:
+            alat = float( system["celldm(1)"].lower().replace("d", "e") ) * BOHR_TO_ANGSTROM
+        elif "a" in system:
+            alat = float( system["a"].lower().replace("d", "e") )
+
+        cell = None
+        if self.inputs.get("ibrav") == "0":
+            values = self.inputs.get("GUI_lattice_vector", "").split()
+            card = self.cards.get("CELL_PARAMETERS")
+            if len(values) == 9:
+                cell = [ float(v) for v in values ]
+            elif card is not None and len(card.lines) == 3:
+                #a card kept in alat or bohr, in angstrom
+                option = ( card.option or "alat" ).lower()
+                scale = { "angstrom": 1.0, "bohr": BOHR_TO_ANGSTROM }.get(option, alat)
+                if scale is not None:
+                    cell = [ float( v.lower().replace("d", "e") ) * scale for line in card.lines for v in line.split() ]
+
+        structure = Structure.from_cards( self.cards["ATOMIC_SPECIES"], self.cards["ATOMIC_POSITIONS"], cell, alat )
+        self.set_structure(structure)
+
+        return structure
+
+    def load_species_parameters(self, schema = None):
+        """
+        Build the per-species parameters from the text of their inputs, and return them
+
+        The number of species is that of the structure, if there is one, then that of an
+        ntyp parameter, and at least the number of values of any of the inputs.
+        """
+
+        from schema import load_schema
+        from species_parameters import SpeciesParameters
+
+        if self.structure is not None:
+            ntyp = self.structure.ntyp
+        else:
+            ntyp = int( self.extra_parameters.get("SYSTEM", {}).get("ntyp", 1) )
+
+        parameters = SpeciesParameters.for_schema(schema or load_schema(), ntyp)
+        for name in parameters.names:
+            if self.inputs.get(name):
+                parameters.set_text( name, self.inputs[name] )
+
+        self.species_parameters = parameters
+
+        return parameters
+
+    def set_kpoints(self, kpoints):
+        """
+        Set the k-points, replacing any K_POINTS card
+        """
+
+        #the type is set first, since changing it on its own replaces the k-points
+        if kpoints is not None:
+            self.set_input( "GUI_kpoint_type", kpoints.mode if kpoints.mode in ("automatic", "gamma") else "explicit" )
+
+        self.kpoints = kpoints
+        self.cards.pop("K_POINTS", None)
+
+    def load_kpoints(self):
+        """
+        Build the k-points from the K_POINTS card, and return them
+        """
+
+        from kpoints import KPoints
+
+        kpoints = KPoints.from_card( self.cards["K_POINTS"] )
+        self.set_kpoints(kpoints)
+
+        return kpoints
+
+    def write(self, stream, form = None):
+        """
+        Write this input file in pw.x format to the file-like object stream
+        """
+
+        from pw_writer import write_input
+
+        write_input(self, stream, form)
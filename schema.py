@@ -0,0 +1,339 @@
+"""
+Declarative schema of the Quantum ESPRESSO input form
+
+The form is described by pw_schema.json: an ordered list of groups, each with
+its show conditions, its fields and the name of the group that follows it.
+The schema is validated and processed once, and the processed form is cached
+on disk keyed by a hash of the schema file, so that later runs only need to
+unpickle it.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+from conditions import compile_condition
+
+
+
+SCHEMA_PATH = os.path.join( os.path.dirname( os.path.abspath(__file__) ), "pw_schema.json" )
+
+#increment whenever the processed classes below change, to invalidate old caches
+CACHE_VERSION = 2
+
+FIELD_TYPES = ("text", "plain_text", "combo", "check")
+
+FIELD_KEYS = ("type", "input", "label", "choices", "show_conditions", "namelist", "key", "kind", "values",
+              "scale", "max_height", "per_species", "notes")
+
+GROUP_KEYS = ("name", "show_conditions", "namelist", "next", "fields")
+
+#pw.x namelists, in the order they appear in an input file
+NAMELISTS = ("CONTROL", "SYSTEM", "ELECTRONS", "IONS", "CELL")
+
+#Fortran kinds a field's value can be written as; "number" is written as typed
+KINDS = ("number", "integer", "string", "logical")
+
+#kind of each field type, unless the field gives its own
+DEFAULT_KINDS = { "text": "number", "plain_text": "string", "combo": "string", "check": "logical" }
+
+#value pw.x takes for each parameter that an input leaves out, as a str (for strings and numbers) or
+#a bool (for logicals), or as such values by calculation; a parameter without one, such as ibrav,
+#is always written
+PW_DEFAULTS = {
+    "calculation": "scf", "verbosity": "low", "restart_mode": "from_scratch",
+    "disk_io": { "scf": "low", "nscf": "medium", "bands": "medium", "relax": "medium", "md": "medium",
+                 "vc-relax": "medium", "vc-md": "medium" },
+    "tstress": False, "tprnfor": False, "wf_collect": True, "lkpoint_dir": True,
+    "tefield": False, "dipfield": False, "lelfield": False, "lorbm": False, "lberry": False, "lfcpopt": False,
+    "nspin": "1", "occupations": "fixed", "smearing": "gaussian", "vdw_corr": "none",
+    "assume_isolated": "none", "esm_bc": "pbc", "constrained_magnetization": "none",
+    "lda_plus_u": False, "lda_plus_u_kind": "0", "U_projection_type": "atomic",
+    "starting_spin_angle": False, "lspinorb": False, "monopole": False, "realxz": False, "block": False,
+    "scf_must_converge": True, "adaptive_thr": False, "tqr": False, "efield_phase": "none",
+    "mixing_mode": "plain", "diagonalization": "david", "startingpot": "atomic", "startingwfc": "atomic+random",
+    "ion_dynamics": { "relax": "bfgs", "md": "verlet", "vc-relax": "bfgs", "vc-md": "beeman" },
+    "pot_extrapolation": "atomic", "wfc_extrapolation": "none", "ion_temperature": "not_controlled",
+    "remove_rigid_rot": False, "refold_pos": False,
+    "cell_dynamics": { "vc-relax": "bfgs", "vc-md": "none" }, "cell_dofree": "all",
+    }
+
+
+
+def pw_default(key, calculation = "scf"):
+    """
+    Return the value pw.x takes for a parameter left out of an input of the given calculation, or None
+    """
+
+    default = PW_DEFAULTS.get(key)
+    if isinstance(default, dict):
+        return default.get(calculation)
+
+    return default
+
+
+
+class SchemaError(ValueError):
+    """
+    Raised when the form schema is not valid
+    """
+
+
+
+class FieldSchema():
+    """
+    This class describes a single input field of the form
+    """
+
+    def __init__(self, type, input_name, label_name = None, choices = (), show_conditions = (),
+                 namelist = None, key = None, kind = None, values = None, scale = None,
+                 max_height = None, per_species = False, notes = None):
+
+        self.type = type
+        self.input_name = input_name
+        self.label_name = label_name
+
+        #(label, value) pairs of a combo box
+        self.choices = tuple( tuple(choice) for choice in choices )
+
+        self.show_conditions = list(show_conditions)
+
+        #pw.x namelist this field is written to, or None if the field only exists in the GUI
+        self.namelist = namelist
+
+        #name of the pw.x parameter, or a list of names if the field holds several space-separated values
+        self.key = key or input_name
+
+        #Fortran kind of the value, one of KINDS
+        self.kind = kind or DEFAULT_KINDS.get(type)
+
+        #for a check box, the values written when it is [unchecked, checked]
+        self.values = values
+
+        #factor from the value shown in the GUI to the value written for pw.x
+        self.scale = scale
+
+        self.max_height = max_height
+
+        #does QE take one value of this input for each species?
+        self.per_species = per_species
+
+        self.notes = notes
+
+class GroupSchema():
+    """
+    This class describes a group box of the form
+    """
+
+    def __init__(self, name, fields, show_conditions = (), namelist = None, next_group = None):
+
+        self.name = name
+        self.fields = fields
+        self.show_conditions = list(show_conditions)
+
+        #namelist of the fields in this group that do not give their own
+        self.namelist = namelist
+
+        #name of the group that follows this one, or None for the last group
+        self.next_group = next_group
+
+class FormSchema():
+    """
+    This class holds the processed form: all groups in order, and an index of fields by input name
+    """
+
+    def __init__(self, groups):
+
+        self.groups = { group.name: group for group in groups }
+
+        self.first_group = groups[0].name
+
+        #all of the fields that set each input
+        self.fields = {}
+        for group in groups:
+            for field in group.fields:
+                self.fields.setdefault(field.input_name, []).append(field)
+
+    def __getitem__(self, group_name):
+
+        try:
+            return self.groups[group_name]
+        except KeyError:
+            raise LookupError('Group name not recognized: ' + str(group_name))
+
+    def chain(self):
+        """
+        Return the group names in the order given by the next group of each group
+        """
+
+        names = []
+        name = self.first_group
+        while name is not None:
+            names.append(name)
+            name = self.groups[name].next_group
+
+        return names
+
+
+
+def process_schema(data):
+    """
+    Validate the decoded JSON schema and return the processed FormSchema
+    """
+
+    if not isinstance(data, dict) or not isinstance(data.get("groups"), list) or not data["groups"]:
+        raise SchemaError('The schema must contain a non-empty list of "groups"')
+
+    groups = []
+    conditions = []
+
+    for g in data["groups"]:
+
+        _check_keys(g, GROUP_KEYS, "group " + repr(g.get("name")))
+
+        name = g.get("name")
+        if not isinstance(name, str):
+            raise SchemaError('Group name must be a string: ' + repr(name))
+
+        namelist = g.get("namelist")
+        if namelist is not None and namelist not in NAMELISTS:
+            raise SchemaError('Namelist not recognized: ' + repr(namelist))
+
+        fields = []
+        for f in g.get("fields", []):
+
+            _check_keys(f, FIELD_KEYS, "field " + repr(f.get("input")) + " of group " + repr(name))
+
+            if f.get("type") not in FIELD_TYPES:
+                raise SchemaError('Field type not recognized: ' + repr(f.get("type")))
+
+            if not isinstance(f.get("input"), str):
+                raise SchemaError('Field input name must be a string in group ' + repr(name))
+
+            choices = f.get("choices", [])
+            if ( f["type"] == "combo" ) != bool(choices):
+                raise SchemaError('Only combo fields have choices, and they must have at least one: ' + f["input"])
+            for choice in choices:
+                if len(choice) != 2:
+                    raise SchemaError('Combo choices must be [label, value] pairs: ' + f["input"])
+
+            #inputs named GUI_* only exist in the GUI, and are never written
+            field_namelist = f.get("namelist", namelist)
+            if f["input"].startswith("GUI_"):
+                field_namelist = None
+            if field_namelist is not None and field_namelist not in NAMELISTS:
+                raise SchemaError('Namelist not recognized: ' + repr(field_namelist))
+
+            if f.get("kind") is not None and f["kind"] not in KINDS:
+                raise SchemaError('Kind not recognized: ' + repr(f["kind"]))
+
+            if "values" in f and ( f["type"] != "check" or len(f["values"]) != 2 ):
+                raise SchemaError('Only check fields have values, as [unchecked, checked]: ' + f["input"])
+
+            field = FieldSchema( f["type"], f["input"], label_name = f.get("label"), choices = choices,
+                                 show_conditions = f.get("show_conditions", []),
+                                 namelist = field_namelist, key = f.get("key"), kind = f.get("kind"),
+                                 values = f.get("values"), scale = f.get("scale"),
+                                 max_height = f.get("max_height"), per_species = f.get("per_species", False),
+                                 notes = f.get("notes") )
+            conditions.extend(field.show_conditions)
+            fields.append(field)
+
+        group = GroupSchema( name, fields, show_conditions = g.get("show_conditions", []),
+                             namelist = namelist, next_group = g.get("next") )
+        conditions.extend(group.show_conditions)
+        groups.append(group)
+
+    form = FormSchema(groups)
+
+    if len(form.groups) != len(groups):
+        raise SchemaError('Group names must be unique')
+
+    #every condition must compile, and may only read inputs that some field sets
+    for condition in conditions:
+        if condition == ["no_next_box"]:
+            continue
+        try:
+            inputs = compile_condition(condition).inputs
+        except ValueError as error:
+            raise SchemaError(str(error))
+        for input_name in inputs:
+            if input_name not in form.fields:
+                raise SchemaError('Show condition reads an input that no field sets: ' + input_name)
+
+    #following the next groups from the first group must visit every group exactly once
+    visited = set()
+    name = form.first_group
+    while name is not None:
+        if name in visited:
+            raise SchemaError('The chain of next groups contains a cycle at: ' + name)
+        if name not in form.groups:
+            raise SchemaError('Next group not recognized: ' + str(name))
+        visited.add(name)
+        name = form.groups[name].next_group
+    if len(visited) != len(groups):
+        raise SchemaError('Groups not reachable from ' + form.first_group + ': ' +
+                          ", ".join( sorted( set(form.groups) - visited ) ))
+
+    return form
+
+def _check_keys(item, keys, description):
+
+    if not isinstance(item, dict):
+        raise SchemaError('Expected an object for ' + description)
+
+    for key in item:
+        if key not in keys:
+            raise SchemaError('Unrecognized key ' + repr(key) + ' in ' + description)
+
+
+
+def cache_directory():
+    """
+    Return the directory in which processed schemas are cached
+    """
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join( os.path.expanduser("~"), ".cache" )
+    return os.path.join(base, "qe-gui")
+
+#schemas already loaded by this process, keyed by hash
+_loaded = {}
+
+def load_schema(path = SCHEMA_PATH, cache_dir = None):
+    """
+    Return the processed FormSchema for the schema file at path, using the on-disk cache when possible
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    key = hashlib.sha256( data + str(CACHE_VERSION).encode() ).hexdigest()
+
+    try:
+        return _loaded[key]
+    except KeyError:
+        pass
+
+    cache_path = os.path.join( cache_dir or cache_directory(), "pw_schema-" + key[:32] + ".pickle" )
+
+    try:
+        with open(cache_path, "rb") as f:
+            form = pickle.load(f)
+
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        form = process_schema( json.loads( data.decode("utf-8") ) )
+
+        #the cache is only an optimization, so failing to write it is not an error
+        try:
+            os.makedirs( os.path.dirname(cache_path), exist_ok = True )
+            temp_path = cache_path + "." + str(os.getpid())
+            with open(temp_path, "wb") as f:
+                pickle.dump(form, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+
+    _loaded[key] = form
+
+    return form
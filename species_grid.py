@@ -0,0 +1,218 @@
+"""
+Grid editor of the per-species parameters of a group
+
+SpeciesParameterModel presents some of the parameters of a
+species_parameters.SpeciesParameters to a QTableView, one row per species and
+one column per parameter, reading and editing the array in place.  Text
+pasted into the grid, such as a block copied from a spreadsheet, is parsed
+and stored as a whole block.  Every edit is reported with the names of the
+parameters it changed.
+"""
+
+from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QHeaderView, QLabel, QShortcut, QSpinBox, QTableView,
+        QVBoxLayout, QWidget)
+from PyQt5.QtGui import (QKeySequence)
+from PyQt5.QtCore import (QAbstractTableModel, QModelIndex, Qt, pyqtSignal)
+
+import math
+
+from species_parameters import parse_values
+
+
+
+#largest number of species offered by the spin box
+MAX_SPECIES = 999
+
+#height in pixels of every row, as in the atom table
+ROW_HEIGHT = 22
+
+
+
+class SpeciesParameterModel(QAbstractTableModel):
+    """
+    This class is a table model over some of the parameters of a SpeciesParameters
+    """
+
+    #emitted with the input names of the parameters changed by each edit
+    parameters_changed = pyqtSignal(list)
+
+    def __init__(self, parameters, names, labels, species_names = None, parent = None):
+        super(SpeciesParameterModel, self).__init__(parent)
+
+        self.parameters = parameters
+        self.names = list(names)
+        self.labels = list(labels)
+
+        #names of the species, for the row headers, or None to number them
+        self.species_names = species_names
+
+        #number of rows last reported to the view
+        self.rows = parameters.ntyp
+
+    def rowCount(self, parent = QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return self.parameters.ntyp
+
+    def columnCount(self, parent = QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return len(self.names)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Horizontal:
+            return self.labels[section]
+
+        if self.species_names is not None and section < len(self.species_names):
+            return str(section + 1) + " " + self.species_names[section]
+
+        return section + 1
+
+    def flags(self, index):
+
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role = Qt.DisplayRole):
+
+        if not index.isValid():
+            return None
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            value = float( self.parameters.get( self.names[index.column()] )[index.row()] )
+            return "" if math.isnan(value) else "%.10g" % value
+
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter
+
+        return None
+
+    def setData(self, index, value, role = Qt.EditRole):
+
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+
+        #an empty cell unsets the parameter for that species
+        try:
+            number = parse_values( [ str(value) ] )[0]
+        except ValueError:
+            return False
+
+        name = self.names[index.column()]
+        self.parameters.get(name)[index.row()] = number
+
+        self.dataChanged.emit(index, index, [role])
+        self.parameters_changed.emit( [name] )
+
+        return True
+
+    def set_ntyp(self, ntyp):
+        """
+        Change the number of species of every parameter
+        """
+
+        if ntyp == self.parameters.ntyp:
+            return
+
+        self.parameters.resize(ntyp)
+        self.refresh()
+
+        self.parameters_changed.emit( list(self.parameters.names) )
+
+    def paste(self, text, row = 0, column = 0):
+        """
+        Set a block of values from pasted text, with its top left cell at row and column
+        """
+
+        species, columns = self.parameters.paste( text, row, self.names[column:] )
+        if not species:
+            return
+
+        self.refresh()
+
+        self.parameters_changed.emit( self.names[column:column + columns] )
+
+    def refresh(self):
+        """
+        Show the current values, after the parameters have been changed elsewhere
+        """
+
+        if self.parameters.ntyp != self.rows:
+            self.beginResetModel()
+            self.rows = self.parameters.ntyp
+            self.endResetModel()
+        elif self.rows and self.names:
+            self.dataChanged.emit( self.index(0, 0), self.index(self.rows - 1, len(self.names) - 1) )
+
+
+
+class SpeciesGrid(QWidget):
+    """
+    This class is a widget holding the grid of per-species parameters of a group, and the number of species
+    """
+
+    def __init__(self, parameters, names, labels, species_names = None, parent = None):
+        super(SpeciesGrid, self).__init__(parent)
+
+        self.model = SpeciesParameterModel(parameters, names, labels, species_names, self)
+
+        self.species = QSpinBox()
+        self.species.setRange(1, MAX_SPECIES)
+        self.species.setValue( max(1, parameters.ntyp) )
+        self.species.valueChanged.connect(self.model.set_ntyp)
+        self.model.modelReset.connect(self.on_model_reset)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+
+        header = self.view.verticalHeader()
+        header.setSectionResizeMode(QHeaderView.Fixed)
+        header.setDefaultSectionSize(ROW_HEIGHT)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        #a block copied from a spreadsheet is pasted at the current cell
+        paste = QShortcut(QKeySequence.Paste, self.view)
+        paste.setContext(Qt.WidgetWithChildrenShortcut)
+        paste.activated.connect(self.paste_clipboard)
+
+        species_layout = QHBoxLayout()
+        species_layout.addWidget( QLabel("Number of Species:") )
+        species_layout.addWidget(self.species)
+        species_layout.addStretch()
+
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.addLayout(species_layout)
+        self.layout.addWidget(self.view)
+
+    def set_parameter_shown(self, name, shown):
+        """
+        Show or hide the column of a parameter, as its field is shown or hidden in the form
+        """
+
+        self.view.setColumnHidden( self.model.names.index(name), not shown )
+
+    def paste_clipboard(self):
+
+        index = self.view.currentIndex()
+
+        try:
+            self.model.paste( QApplication.clipboard().text(), max(index.row(), 0), max(index.column(), 0) )
+        except ValueError: #text that is not a block of numbers, or too wide for the grid
+            QApplication.beep()
+
+    def on_model_reset(self):
+
+        self.species.blockSignals(True)
+        self.species.setValue( max(1, self.model.parameters.ntyp) )
+        self.species.blockSignals(False)
@@ -0,0 +1,216 @@
+"""
+Per-species array parameters of a pw.x input
+
+pw.x takes parameters such as starting_magnetization, angle1, angle2,
+Hubbard_U and london_c6 as arrays indexed by species.  SpeciesParameters holds
+every such parameter of the form as one row of a single NumPy array with a
+column per species, NaN marking the species for which a parameter is unset,
+so that a grid of many species and parameters is edited, pasted into and
+written as whole arrays rather than as space-separated text.
+"""
+
+import re
+
+import numpy as np
+
+
+
+#value of a species for which a parameter is unset
+UNSET = np.nan
+
+#separators of the cells of pasted text: tabs if there are any, as from a spreadsheet, otherwise
+#commas, semicolons or spaces
+_TAB = re.compile(r"\t")
+_SEPARATOR = re.compile(r"[,;\s]+")
+
+_FORTRAN_EXPONENT = re.compile(r"(?<=[\d.])[dD](?=[-+]?\d)")
+
+
+
+def per_species_fields(schema):
+    """
+    Return the per-species fields of a schema, one for each input name, in form order
+    """
+
+    fields = []
+    seen = set()
+    for group_name in schema.chain():
+        for field in schema[group_name].fields:
+            if field.per_species and field.input_name not in seen:
+                seen.add(field.input_name)
+                fields.append(field)
+
+    return fields
+
+def parse_values(cells):
+    """
+    Return the float values of a list of strings, with empty cells as UNSET
+    """
+
+    cells = [ _FORTRAN_EXPONENT.sub( "e", cell.strip() ) or "nan" for cell in cells ]
+
+    return np.array(cells, dtype = np.float64)
+
+
+
+class SpeciesParameters():
+    """
+    This class holds the per-species parameters of an input file
+
+    values[p, s] is the value of parameter self.names[p] for species s (0-based), or NaN if
+    it is unset.  keys[p] is the name pw.x gives the parameter, such as "Hubbard_U".
+    """
+
+    def __init__(self, names, keys, ntyp = 1):
+
+        self.names = tuple(names)
+        self.keys = tuple(keys)
+
+        #row of each parameter, by input name
+        self.rows = { name: i for i, name in enumerate(self.names) }
+
+        self.values = np.full( ( len(self.names), int(ntyp) ), UNSET )
+
+    @classmethod
+    def for_schema(cls, schema, ntyp = 1):
+        """
+        Return an empty SpeciesParameters with a row for every per-species field of schema
+        """
+
+        fields = per_species_fields(schema)
+
+        return cls( [ field.input_name for field in fields ], [ field.key for field in fields ], ntyp )
+
+    @property
+    def ntyp(self):
+
+        return self.values.shape[1]
+
+    def resize(self, ntyp):
+        """
+        Change the number of species, keeping the values of the species that remain
+        """
+
+        ntyp = int(ntyp)
+        if ntyp < 0:
+            raise ValueError('The number of species cannot be negative')
+
+        values = np.full( ( len(self.names), ntyp ), UNSET )
+        kept = min(ntyp, self.ntyp)
+        values[:, :kept] = self.values[:, :kept]
+
+        self.values = values
+
+    def row(self, name):
+
+        try:
+            return self.rows[name]
+        except KeyError:
+            raise LookupError('Not a per-species parameter: ' + str(name))
+
+    def get(self, name):
+        """
+        Return the values of a parameter for every species, as a view
+        """
+
+        return self.values[ self.row(name) ]
+
+    def set(self, name, species, value):
+        """
+        Set the value of a parameter for one species (0-based), or unset it if value is None
+        """
+
+        self.values[ self.row(name), species ] = UNSET if value is None else float(value)
+
+    def set_text(self, name, text):
+        """
+        Set a parameter from space-separated values, one per species in order, growing the
+        number of species if there are more values than species
+        """
+
+        values = parse_values( str(text).split() ) if str(text).strip() else np.empty(0)
+
+        if len(values) > self.ntyp:
+            self.resize( len(values) )
+
+        row = self.values[ self.row(name) ]
+        row[:] = UNSET
+        row[:len(values)] = values
+
+    def text(self, name):
+        """
+        Return a parameter as space-separated values, up to its last set species; species
+        without a value before that are written as 0, as pw.x defaults them
+        """
+
+        row = self.get(name)
+        set_species = np.flatnonzero( ~np.isnan(row) )
+        if not len(set_species):
+            return ""
+
+        values = np.nan_to_num( row[ :set_species[-1] + 1 ] )
+
+        return " ".join( [ "%.10g" ] * len(values) ) % tuple( values.tolist() )
+
+    def paste(self, text, species = 0, names = None):
+        """
+        Set a block of values from text with one line per species and one column per parameter,
+        starting at species (0-based) and at the first of names (by default every parameter)
+
+        Returns the number of species and parameters set.  The number of species grows to fit.
+        """
+
+        names = list(self.names if names is None else names)
+
+        lines = [ line for line in str(text).splitlines() if line.strip() ]
+        if not lines:
+            return 0, 0
+
+        separator = _TAB if "\t" in text else _SEPARATOR
+        cells = [ separator.split(line) if separator is _TAB else separator.split( line.strip() ) for line in lines ]
+
+        columns = max( len(row) for row in cells )
+        if columns > len(names):
+            raise ValueError('Pasted ' + str(columns) + ' columns into ' + str( len(names) ) + ' parameters')
+
+        #short rows leave their last parameters unset
+        block = parse_values( [ cell for row in cells for cell in row + [""] * ( columns - len(row) ) ] )
+        block = block.reshape( len(lines), columns )
+
+        if species + len(lines) > self.ntyp:
+            self.resize( species + len(lines) )
+
+        rows = [ self.row(name) for name in names[:columns] ]
+        self.values[ rows, species:species + len(lines) ] = block.T
+
+        return len(lines), columns
+
+    def parameters(self, names = None):
+        """
+        Return the (parameter, text) pairs of the set values of names (by default every parameter),
+        such as ("Hubbard_U(2)", "4.5")
+        """
+
+        names = self.names if names is None else names
+
+        pairs = []
+        for name in names:
+            row = self.row(name)
+            species = np.flatnonzero( ~np.isnan( self.values[row] ) )
+            if not len(species):
+                continue
+
+            #each parameter's keys and values are formatted by a single % over a flat tuple
+            count = len(species)
+            keys = ( "\n".join( [ self.keys[row] + "(%i)" ] * count ) % tuple( (species + 1).tolist() ) ).split("\n")
+            values = ( "\n".join( [ "%.10g" ] * count ) % tuple( self.values[row, species].tolist() ) ).split("\n")
+            pairs.extend( zip(keys, values) )
+
+        return pairs
+
+    def copy(self):
+
+        copy = SpeciesParameters(self.names, self.keys, 0)
+        copy.values = self.values.copy()
+
+        return copy
@@ -0,0 +1,79 @@
+"""
+Startup profile of the form
+
+PROFILE is created when this module is first imported, which window.py does
+before anything else, and records the time of each named step of startup:
+the imports, the creation of the Dialog, its first paint and the building of
+its group boxes.  It only imports modules that Python has already loaded at
+startup, so that it does not add to the time it measures.
+"""
+
+import sys
+import time
+
+
+
+class StartupProfile():
+    """
+    This class records the time of each step of startup
+    """
+
+    def __init__(self):
+
+        #wall clock and performance counter at creation, so marks can be related to other processes
+        self.epoch = time.time()
+        self.start = time.perf_counter()
+
+        #(label, performance counter) of each step, in order
+        self.marks = []
+
+        #should the profile be reported once startup is complete, and as "text" or "json"?
+        self.enabled = False
+        self.format = "text"
+
+    def mark(self, label):
+
+        self.marks.append( (label, time.perf_counter()) )
+
+    def elapsed(self, label):
+        """
+        Return the seconds from the creation of the profile to the first step with label, or None
+        """
+
+        for mark_label, counter in self.marks:
+            if mark_label == label:
+                return counter - self.start
+
+        return None
+
+    def as_dict(self):
+        """
+        Return the wall clock time of each step, as seconds since the epoch
+        """
+
+        return { label: self.epoch + counter - self.start for label, counter in self.marks }
+
+    def report(self, stream = None):
+        """
+        Write the time of each step, from the creation of the profile and from the previous step,
+        or in json format the wall clock time of each step
+        """
+
+        stream = stream or sys.stderr
+
+        #wall clock times, for a benchmark to relate to the time it launched the process
+        if self.format == "json":
+            import json
+            stream.write( json.dumps( self.as_dict() ) + "\n" )
+            return
+
+        stream.write("%-24s %10s %10s\n" % ("startup step", "total (ms)", "step (ms)"))
+
+        previous = self.start
+        for label, counter in self.marks:
+            stream.write("%-24s %10.1f %10.1f\n" % ( label, (counter - self.start) * 1e3, (counter - previous) * 1e3 ))
+            previous = counter
+
+
+
+PROFILE = StartupProfile()
@@ -0,0 +1,309 @@
+"""
+Atomic structure of a pw.x input
+
+A Structure holds the species, positions and if_pos flags of every atom in
+contiguous NumPy arrays, along with the cell, so that structures of millions
+of atoms can be converted between units, wrapped into the cell and written as
+cards without a Python loop over the atoms.
+"""
+
+import re
+
+import numpy as np
+
+from qe_input import Card
+
+
+
+BOHR_TO_ANGSTROM = 0.529177210903
+
+#units of ATOMIC_POSITIONS
+UNITS = ("alat", "bohr", "angstrom", "crystal")
+
+#number of atoms formatted by each string of a card's lines
+CHUNK_ATOMS = 4096
+
+_FORTRAN_EXPONENT = re.compile(r"(?<=[\d.])[dD](?=[-+]?\d)")
+
+
+
+class Species():
+    """
+    This class holds one line of ATOMIC_SPECIES
+    """
+
+    def __init__(self, name, mass = 0.0, pseudopotential = ""):
+
+        self.name = name
+        self.mass = mass
+        self.pseudopotential = pseudopotential
+
+
+
+class Structure():
+    """
+    This class holds the atoms and cell of an input file
+
+    types[i] is the index into self.species of atom i, positions[i] its position in
+    self.units, and if_pos[i] its three if_pos flags (1 if the coordinate may move),
+    or if_pos is None if every atom is free.
+    """
+
+    def __init__(self, species, types, positions, units = "crystal", cell = None, if_pos = None, alat = None):
+
+        if units not in UNITS:
+            raise ValueError('Units not recognized: ' + repr(units))
+
+        self.species = list(species)
+
+        self.types = np.ascontiguousarray(types, dtype = np.int32)
+        self.positions = np.ascontiguousarray(positions, dtype = np.float64).reshape(-1, 3)
+        self.units = units
+
+        if len(self.types) != len(self.positions):
+            raise ValueError('Each atom needs a species and a position')
+        if len(self.types) and ( self.types.min() < 0 or self.types.max() >= len(self.species) ):
+            raise ValueError('Atom species index out of range')
+
+        #lattice vectors in angstrom, one per row, or None if the cell is given by ibrav
+        self.cell = None if cell is None else np.array(cell, dtype = np.float64).reshape(3, 3)
+
+        self.if_pos = None if if_pos is None else np.ascontiguousarray(if_pos, dtype = np.int8).reshape(-1, 3)
+
+        #lattice parameter in angstrom; by default the length of the first lattice vector
+        self._alat = alat
+
+    @property
+    def nat(self):
+
+        return len(self.types)
+
+    @property
+    def ntyp(self):
+
+        return len(self.species)
+
+    @property
+    def alat(self):
+
+        if self._alat is not None:
+            return self._alat
+        if self.cell is not None:
+            return float( np.linalg.norm(self.cell[0]) )
+
+        raise ValueError('The lattice parameter is unknown without a cell')
+
+    def _require_cell(self):
+
+        if self.cell is None:
+            raise ValueError('Crystal coordinates need the cell')
+
+        return self.cell
+
+    def cartesian(self, positions = None, units = None):
+        """
+        Return the positions in angstrom, as a new array
+
+        By default these are the positions of the structure; other positions, in the given
+        units, are converted in this structure's cell.
+        """
+
+        if positions is None:
+            positions, units = self.positions, self.units
+
+        if units == "angstrom":
+            return positions.copy()
+        if units == "bohr":
+            return positions * BOHR_TO_ANGSTROM
+        if units == "alat":
+            return positions * self.alat
+
+        return positions @ self._require_cell()
+
+    def converted(self, units, positions = None, from_units = None):
+        """
+        Return the positions in the given units, as a new array
+
+        By default these are the positions of the structure; other positions, in from_units,
+        are converted in this structure's cell.
+        """
+
+        if units not in UNITS or ( from_units is not None and from_units not in UNITS ):
+            raise ValueError('Units not recognized: ' + repr(units if units not in UNITS else from_units))
+
+        if positions is None:
+            positions, from_units = self.positions, self.units
+
+        if units == from_units:
+            return positions.copy()
+
+        #crystal coordinates convert directly to crystal, without going through angstrom
+        if units == "crystal":
+            return self.cartesian(positions, from_units) @ np.linalg.inv( self._require_cell() )
+
+        positions = self.cartesian(positions, from_units)
+
+        if units == "bohr":
+            positions /= BOHR_TO_ANGSTROM
+        elif units == "alat":
+            positions /= self.alat
+
+        return positions
+
+    def convert(self, units):
+        """
+        Change the units in which the positions are held
+        """
+
+        self.positions = np.ascontiguousarray( self.converted(units) )
+        self.units = units
+
+    def atom_text(self, row):
+        """
+        Return atom row as its line of ATOMIC_POSITIONS, with its if_pos flags, preceded by the
+        units of its position
+        """
+
+        if_pos = (1, 1, 1) if self.if_pos is None else tuple( self.if_pos[row].tolist() )
+
+        return "%s %s %r %r %r %d %d %d" % ( ( self.units, self.species[ self.types[row] ].name ) +
+                                             tuple( self.positions[row].tolist() ) + if_pos )
+
+    def set_atom_text(self, row, text):
+        """
+        Set atom row from a line as atom_text() returns it, converting its position to the units
+        of the structure
+        """
+
+        parts = text.split()
+        names = [ species.name for species in self.species ]
+        if len(parts) != 8 or parts[1] not in names:
+            raise ValueError('Not a line of an atom of the structure: ' + repr(text))
+
+        position = np.array( [ float(v) for v in parts[2:5] ] ).reshape(1, 3)
+        if_pos = [ int(v) for v in parts[5:8] ]
+
+        self.positions[row] = self.converted(self.units, position, parts[0])[0]
+        self.types[row] = names.index( parts[1] )
+
+        #every atom is free until a flag is first cleared
+        if self.if_pos is None and min(if_pos) == 0:
+            self.if_pos = np.ones( (self.nat, 3), dtype = np.int8 )
+        if self.if_pos is not None:
+            self.if_pos[row] = if_pos
+
+    def wrap(self):
+        """
+        Move every atom into the cell, keeping the units of the positions
+        """
+
+        units = self.units
+
+        crystal = self.converted("crystal")
+        crystal -= np.floor(crystal)
+
+        self.positions = crystal
+        self.units = "crystal"
+        if units != "crystal":
+            self.convert(units)
+
+    def species_card(self):
+
+        return Card( "ATOMIC_SPECIES", None,
+                     [ "%s %s %s" % ( s.name, s.mass, s.pseudopotential ) for s in self.species ] )
+
+    def positions_card(self):
+
+        return Card( "ATOMIC_POSITIONS", self.units, self._position_lines() )
+
+    def cell_card(self):
+
+        if self.cell is None:
+            return None
+
+        #pw.x does not accept a cell in angstrom alongside a lattice parameter given by celldm(1) or a
+        if self._alat is not None:
+            return Card( "CELL_PARAMETERS", "alat", [ "%.10f %.10f %.10f" % tuple(v) for v in self.cell / self._alat ] )
+
+        return Card( "CELL_PARAMETERS", "angstrom", [ "%.10f %.10f %.10f" % tuple(v) for v in self.cell ] )
+
+    def cards(self):
+        """
+        Return the cards of this structure
+        """
+
+        cards = [ self.species_card(), self.positions_card() ]
+        if self.cell is not None:
+            cards.append( self.cell_card() )
+
+        return cards
+
+    def _position_lines(self):
+        """
+        Yield the lines of ATOMIC_POSITIONS in chunks of CHUNK_ATOMS atoms, each formatted by a
+        single % operation over a flat tuple of the chunk's values
+        """
+
+        names = np.array( [ s.name for s in self.species ], dtype = object )
+
+        columns = 4 if self.if_pos is None else 7
+        line = "%s %.10f %.10f %.10f" + ( "" if self.if_pos is None else " %d %d %d" )
+
+        for start in range(0, self.nat, CHUNK_ATOMS):
+            stop = min(start + CHUNK_ATOMS, self.nat)
+
+            rows = np.empty( (stop - start, columns), dtype = object )
+            rows[:, 0] = names[ self.types[start:stop] ]
+            rows[:, 1:4] = self.positions[start:stop]
+            if self.if_pos is not None:
+                rows[:, 4:7] = self.if_pos[start:stop]
+
+            yield "\n".join( [line] * (stop - start) ) % tuple( rows.ravel() )
+
+    @classmethod
+    def from_cards(cls, species_card, positions_card, cell = None, alat = None):
+        """
+        Return the Structure described by ATOMIC_SPECIES and ATOMIC_POSITIONS cards
+
+        cell is the lattice vectors in angstrom, if known, and alat the lattice parameter in angstrom.
+        """
+
+        species = []
+        for line in species_card.lines:
+            parts = line.split()
+            species.append( Species( parts[0], float( parts[1].lower().replace("d", "e") ) if len(parts) > 1 else 0.0,
+                                     parts[2] if len(parts) > 2 else "" ) )
+
+        #Fortran double precision exponents, such as 1.0d-3, without touching species names
+        text = _FORTRAN_EXPONENT.sub( "e", "\n".join( positions_card.lines ) )
+        tokens = text.split()
+
+        lines = len( positions_card.lines )
+        if lines and len(tokens) == 7 * lines:
+            columns = 7
+        elif len(tokens) == 4 * lines:
+            columns = 4
+        else:
+            #if_pos flags on only some atoms, as for a slab whose lower layers are fixed; pw.x lets
+            #the atoms without flags move, as 1 1 1
+            rows = [ line.split() for line in text.split("\n") if line.strip() ]
+            if any( len(row) not in (4, 7) for row in rows ):
+                raise ValueError('Every atom of ATOMIC_POSITIONS must have 3 coordinates, and optionally 3 if_pos flags')
+            tokens = [ token for row in rows for token in ( row if len(row) == 7 else row + ["1", "1", "1"] ) ]
+            columns = 7
+
+        #each column is converted on its own, which numpy does without building a table of objects
+        names = np.array( tokens[0::columns] )
+        positions = np.column_stack( [ np.array( tokens[c::columns], dtype = np.float64 ) for c in (1, 2, 3) ] )
+        if columns == 7:
+            if_pos = np.column_stack( [ np.array( tokens[c::columns], dtype = np.int8 ) for c in (4, 5, 6) ] )
+        else:
+            if_pos = None
+
+        types = np.full( len(names), -1, dtype = np.int32 )
+        for i, s in enumerate(species):
+            types[ names == s.name ] = i
+        if ( types < 0 ).any():
+            raise ValueError('Atom species not in ATOMIC_SPECIES: ' + str( names[ np.argmax(types < 0) ] ))
+
+        return cls( species, types, positions, ( positions_card.option or "alat" ).lower(), cell, if_pos, alat )
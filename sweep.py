@@ -0,0 +1,268 @@
+"""
+Parameter sweeps over a pw.x input
+
+A sweep takes a base QuantumEspressoInputFile and a list of values for each of
+several inputs, and writes one pw.x input for each variant: every combination
+of the values, or the values taken in step with each other.  Each variant is
+resolved by its own form, so that only the inputs that are active for that
+variant are written.
+
+Variants are numbered, and each worker of a process pool rebuilds the
+variants of its chunk of numbers from the sweep itself, so that only pairs of
+numbers are sent to the workers.
+
+Many variants can differ only in GUI_* inputs or in inputs hidden by show
+conditions, and so give identical pw.x inputs.  They are all written, since
+writing a variant costs less than computing its key (see input_cache.py); a
+jobs.JobRunner with an input cache runs each distinct input only once.
+
+    python sweep.py base.in sweep_dir ecutwfc=30:80:10 mixing_beta=0.3,0.5,0.7
+"""
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from form import reveal_inputs
+from pw_writer import CARDS
+from qe_input import Card, QuantumEspressoInputFile
+from schema import load_schema
+
+
+
+#largest number of variants in a chunk of work sent to a worker
+MAX_CHUNK = 256
+
+#name of the file that lists the values of each variant
+MANIFEST = "sweep.csv"
+
+
+
+def sweep_range(start, stop, step):
+    """
+    Return the values from start to stop inclusive, in increments of step
+    """
+
+    count = int( math.floor( (stop - start) / step + 1e-9 ) ) + 1
+
+    return [ start + i * step for i in range(count) ]
+
+def format_value(value):
+
+    if isinstance(value, float):
+        return "%.10g" % value
+
+    return str(value)
+
+
+
+class Sweep():
+    """
+    This class describes the variants of a sweep over a base input file
+
+    parameters maps each swept input name to its list of values.  An input may also be
+    a card name, whose values are the lines of the card; K_POINTS values such as
+    "4 4 4 0 0 0" are written as automatic grids.
+    """
+
+    def __init__(self, base, parameters, mode = "product", schema = None):
+
+        if mode not in ("product", "zip"):
+            raise ValueError('Sweep mode must be "product" or "zip": ' + repr(mode))
+
+        self.schema = schema or load_schema()
+
+        for name, values in parameters.items():
+            if name not in self.schema.fields and name not in CARDS:
+                raise ValueError('No field or card sets the swept input: ' + name)
+            if not values:
+                raise ValueError('No values given for the swept input: ' + name)
+
+        if mode == "zip" and len( { len(values) for values in parameters.values() } ) > 1:
+            raise ValueError('The inputs of a zipped sweep must have the same number of values')
+
+        #cards are copied with their lines as lists, so that the base can be sent to other processes
+        self.base = QuantumEspressoInputFile()
+        self.base.inputs = dict(base.inputs)
+        self.base.defaults = set(base.defaults)
+        self.base.cards = { name: Card( card.name, card.option, list(card.lines) ) for name, card in base.cards.items() }
+        self.base.extra_parameters = base.extra_parameters
+        self.base.structure = base.structure
+        self.base.kpoints = base.kpoints
+        self.base.species_parameters = base.species_parameters
+
+        self.names = list(parameters)
+        self.values = [ [ format_value(v) for v in parameters[name] ] for name in self.names ]
+        self.mode = mode
+
+    def __len__(self):
+
+        if not self.names:
+            return 1
+
+        if self.mode == "zip":
+            return len( self.values[0] )
+
+        count = 1
+        for values in self.values:
+            count *= len(values)
+
+        return count
+
+    def variant_values(self, index):
+        """
+        Return the values of the swept inputs of variant number index, in the order of self.names
+        """
+
+        if self.mode == "zip":
+            return [ values[index] for values in self.values ]
+
+        #the last input varies fastest
+        result = []
+        for values in reversed(self.values):
+            index, i = divmod( index, len(values) )
+            result.append( values[i] )
+
+        return result[::-1]
+
+    def variant(self, index):
+        """
+        Return the QuantumEspressoInputFile of variant number index
+        """
+
+        variant = QuantumEspressoInputFile()
+        variant.inputs = dict(self.base.inputs)
+        variant.defaults = self.base.defaults - set(self.names)
+        variant.cards = dict(self.base.cards)
+        variant.extra_parameters = self.base.extra_parameters
+        variant.structure = self.base.structure
+        variant.kpoints = self.base.kpoints
+        variant.species_parameters = self.base.species_parameters
+
+        #a swept per-species input sets that parameter's array in the variant's own copy
+        if variant.species_parameters is not None and any( name in variant.species_parameters.rows for name in self.names ):
+            variant.species_parameters = variant.species_parameters.copy()
+
+        for name, value in zip( self.names, self.variant_values(index) ):
+            if name in CARDS:
+                option = "automatic" if name == "K_POINTS" else getattr( self.base.cards.get(name), "option", None )
+                variant.set_card( name, option, [ line for line in value.split("\n") if line.strip() ] )
+            else:
+                variant.set_input(name, value)
+
+        #a swept input is meant to be written, so its field is shown
+        reveal_inputs( variant.inputs, self.names, self.schema, override = True )
+
+        return variant
+
+    def file_name(self, index):
+
+        return "%05i.in" % index
+
+
+
+#the sweep being written by this worker process
+_sweep = None
+_directory = None
+
+def _initialize_worker(sweep, directory):
+
+    global _sweep, _directory
+
+    _sweep = sweep
+    _directory = directory
+
+def _write_chunk(start, stop):
+    """
+    Write the variants numbered start to stop - 1 of the worker's sweep
+    """
+
+    for index in range(start, stop):
+        with open( os.path.join( _directory, _sweep.file_name(index) ), "w" ) as stream:
+            _sweep.variant(index).write(stream)
+
+    return stop - start
+
+def write_sweep(sweep, directory, workers = None, chunk_size = None):
+    """
+    Write every variant of sweep to directory, along with a manifest of their values
+
+    The variants are split into chunks of chunk_size, which are written by a pool of
+    workers processes (by default, one per core).  With a single worker they are
+    written by this process.  Returns the number of variants written.
+    """
+
+    os.makedirs(directory, exist_ok = True)
+
+    count = len(sweep)
+    workers = workers or os.cpu_count() or 1
+
+    if chunk_size is None:
+        #several chunks per worker, to balance the load
+        chunk_size = max( 1, min( MAX_CHUNK, math.ceil( count / (4 * workers) ) ) )
+
+    chunks = [ (start, min(start + chunk_size, count)) for start in range(0, count, chunk_size) ]
+
+    if workers == 1:
+        _initialize_worker(sweep, directory)
+        written = sum( _write_chunk(start, stop) for start, stop in chunks )
+    else:
+        with ProcessPoolExecutor( workers, initializer = _initialize_worker,
+                                  initargs = (sweep, directory) ) as pool:
+            written = sum( pool.map( _write_chunk, *zip(*chunks) ) )
+
+    with open( os.path.join(directory, MANIFEST), "w" ) as manifest:
+        manifest.write( ",".join( ["file"] + sweep.names ) + "\n" )
+        for index in range(count):
+            values = [ '"' + v.replace('"', '""') + '"' if ( "," in v or "\n" in v ) else v
+                       for v in sweep.variant_values(index) ]
+            manifest.write( ",".join( [ sweep.file_name(index) ] + values ) + "\n" )
+
+    return written
+
+
+
+def parse_values(text):
+    """
+    Return the values of a command line sweep argument, either start:stop:step or a comma-separated list
+    """
+
+    if text.count(":") == 2:
+        start, stop, step = text.split(":")
+        if all( part.lstrip("-").isdigit() for part in (start, stop, step) ):
+            return sweep_range( int(start), int(stop), int(step) )
+        return sweep_range( float(start), float(stop), float(step) )
+
+    return text.split(",")
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Write a sweep of pw.x inputs over a base input")
+    parser.add_argument("base", help = "pw.x input file the variants are based on")
+    parser.add_argument("directory", help = "directory the variants are written to")
+    parser.add_argument("parameters", nargs = "+", metavar = "input=values",
+                        help = "values of a swept input, as start:stop:step or a comma-separated list")
+    parser.add_argument("--zip", action = "store_true",
+                        help = "take the values of the inputs in step, rather than every combination")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--chunk-size", type = int, default = None, help = "variants per chunk of work")
+
+    args = parser.parse_args(argv)
+
+    from pw_reader import read_input
+
+    parameters = {}
+    for argument in args.parameters:
+        name, sep, values = argument.partition("=")
+        if not sep:
+            parser.error("expected input=values: " + argument)
+        parameters[name] = parse_values(values)
+
+    sweep = Sweep( read_input(args.base), parameters, mode = "zip" if args.zip else "product" )
+    written = write_sweep(sweep, args.directory, args.workers, args.chunk_size)
+
+    print( "%i inputs written to %s" % (written, args.directory) )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+The modules of the form are imported from the directory above
+"""
+
+import os
+import sys
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+#the tests do not need a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
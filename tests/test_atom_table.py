@@ -0,0 +1,125 @@
+"""
+Editing the atoms of a structure in its table
+"""
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+
+from autosave import restore
+from history import History
+from pw_reader import parse_input
+from qe_input import ATOM_NAME, UNITS_NAME
+
+from test_pw_roundtrip import ALAT
+
+
+
+#the widgets need an application, which must outlive them
+APP = QApplication.instance() or QApplication( [] )
+
+
+def alat_input():
+
+    input_file = parse_input(ALAT)
+    input_file.load_structure()
+    input_file.history = History()
+
+    return input_file
+
+def editor_of(input_file):
+
+    from atom_table import AtomEditor
+
+    return AtomEditor(input_file)
+
+def test_edits_are_undone_through_the_input_file():
+
+    input_file = alat_input()
+    structure = input_file.structure
+    editor = editor_of(input_file)
+    model = editor.model
+
+    assert model.setData( model.index(1, 1), "0.3" )
+    input_file.history.checkpoint()
+    assert model.setData( model.index(1, 5), Qt.Unchecked, Qt.CheckStateRole )
+    assert structure.positions[1].tolist() == [0.3, 0.25, 0.25]
+    assert structure.if_pos[1].tolist() == [1, 0, 1]
+
+    assert input_file.undo() == [ ATOM_NAME % 1 ]
+    assert structure.if_pos[1].tolist() == [1, 1, 1]
+    assert input_file.undo() == [ ATOM_NAME % 1 ]
+    assert structure.positions[1].tolist() == [0.25, 0.25, 0.25]
+
+    assert input_file.redo() == [ ATOM_NAME % 1 ]
+    assert structure.positions[1].tolist() == [0.3, 0.25, 0.25]
+
+def test_units_are_undone_and_shown():
+
+    input_file = alat_input()
+    editor = editor_of(input_file)
+    model = editor.model
+
+    model.setData( model.index(1, 1), "0.3" )
+    editor.units.setCurrentIndex( editor.units.findData("angstrom") )
+    assert input_file.structure.units == "angstrom"
+
+    #undoing the units shows them again, and the edit before them is undone in its own units
+    assert input_file.undo() == [ UNITS_NAME ]
+    editor.show_change(UNITS_NAME)
+    assert input_file.structure.units == "alat"
+    assert editor.units.currentData() == "alat"
+
+    input_file.undo()
+    assert input_file.structure.positions[1].tolist() == [0.25, 0.25, 0.25]
+
+def test_a_new_structure_shows_its_units():
+
+    input_file = alat_input()
+    editor = editor_of(input_file)
+
+    other = parse_input( ALAT.replace("ATOMIC_POSITIONS alat", "ATOMIC_POSITIONS crystal") )
+    input_file.set_structure( other.load_structure() )
+    editor.set_structure(input_file.structure)
+
+    assert editor.units.currentData() == "crystal"
+
+def test_edits_are_restored_from_the_journal(tmp_path):
+
+    from window import Dialog
+
+    path = str( tmp_path / "journal" )
+    input_file = alat_input()
+    dialog = Dialog(input_file, autosave_path = path)
+    editor = dialog.edit_structure()
+
+    editor.model.setData( editor.model.index(0, 3), "0.125" )
+    editor.units.setCurrentIndex( editor.units.findData("angstrom") )
+    positions = input_file.structure.positions.copy()
+
+    #the journal is left as a crash would leave it
+    dialog.autosave.close()
+    dialog.autosave = None
+
+    restored = parse_input(ALAT)
+    restore(restored, path)
+    assert restored.structure.units == "angstrom"
+    assert np.allclose(restored.structure.positions, positions)
+    assert np.isclose( restored.structure.converted("alat")[0, 2], 0.125 )
+
+def test_updates_are_recorded_under_what_started_them():
+
+    from window import Dialog
+
+    input_file = alat_input()
+    dialog = Dialog(input_file)
+    editor = dialog.edit_structure()
+    recorder = dialog.record_updates()
+
+    editor.model.setData( editor.model.index(0, 3), "0.125" )
+    dialog.undo()
+    dialog.redo()
+
+    name = ATOM_NAME % 0
+    assert [ ( cycle["trigger"], cycle["name"] ) for cycle in recorder.select("input") ] == \
+        [ ("on_structure_changed", name), ("undo", name), ("redo", name) ]
@@ -0,0 +1,34 @@
+"""
+Autosave journals of the form
+"""
+
+import os
+
+from autosave import Autosave, journal_path, restore
+from qe_input import QuantumEspressoInputFile
+
+
+
+def test_journal_is_restored_only_for_its_input(tmp_path, monkeypatch):
+
+    monkeypatch.setenv( "XDG_CACHE_HOME", str( tmp_path / "cache" ) )
+
+    first, second = tmp_path / "first.in", tmp_path / "second.in"
+    first.write_text("")
+    second.write_text("")
+
+    input_file = QuantumEspressoInputFile()
+    autosave = Autosave( input_file, journal_path(first) )
+    autosave.note_input("ecutwfc", "45")
+    autosave.close()
+
+    restored = QuantumEspressoInputFile()
+    assert restore( restored, journal_path(first) ) == []
+    assert restored.inputs == { "ecutwfc": "45" }
+
+    assert restore( QuantumEspressoInputFile(), journal_path(second) ) is None
+    assert restore( QuantumEspressoInputFile(), journal_path() ) is None
+
+    #the journal of a file modified since does not apply to it
+    os.utime( first, ( 0, 0 ) )
+    assert restore( QuantumEspressoInputFile(), journal_path(first) ) is None
@@ -0,0 +1,122 @@
+"""
+Undo and redo of input changes
+"""
+
+from history import MISSING, History
+from qe_input import QuantumEspressoInputFile
+
+
+
+class Clock():
+
+    def __init__(self):
+
+        self.now = 0.0
+
+    def __call__(self):
+
+        return self.now
+
+def input_file_with_history():
+
+    clock = Clock()
+    input_file = QuantumEspressoInputFile()
+    input_file.history = History(clock = clock)
+
+    return input_file, clock
+
+def test_keystrokes_are_coalesced_into_one_step():
+
+    input_file, clock = input_file_with_history()
+
+    for text in ("3", "30", "30.5"):
+        input_file.set_input("ecutwfc", text)
+        clock.now += 0.2
+
+    #a change after a pause is a step of its own
+    clock.now += 5.0
+    input_file.set_input("ecutwfc", "40")
+
+    assert input_file.undo() == ["ecutwfc"]
+    assert input_file.inputs["ecutwfc"] == "30.5"
+    assert input_file.undo() == ["ecutwfc"]
+    assert "ecutwfc" not in input_file.inputs
+    assert input_file.undo() == []
+
+    assert input_file.redo() == ["ecutwfc"]
+    assert input_file.inputs["ecutwfc"] == "30.5"
+
+def test_a_checkpoint_and_another_input_end_a_step():
+
+    input_file, clock = input_file_with_history()
+
+    input_file.set_input("ecutwfc", "30")
+    input_file.history.checkpoint()
+    input_file.set_input("ecutwfc", "40")
+    input_file.set_input("ecutrho", "160")
+
+    assert len(input_file.history) == 3
+    input_file.undo()
+    input_file.undo()
+    assert input_file.inputs == { "ecutwfc": "30" }
+
+def test_a_new_change_drops_the_redo_steps():
+
+    input_file, clock = input_file_with_history()
+
+    input_file.set_input("ecutwfc", "30")
+    input_file.undo()
+    input_file.set_input("ecutrho", "120")
+
+    assert not input_file.history.can_redo()
+    assert input_file.redo() == []
+
+def test_grouped_changes_are_one_step():
+
+    input_file, clock = input_file_with_history()
+
+    input_file.set_inputs( { "ecutwfc": "30", "ecutrho": "120" } )
+    input_file.set_input("ecutwfc", "35")
+
+    input_file.undo()
+    assert input_file.undo() == [ "ecutwfc", "ecutrho" ]
+    assert input_file.inputs == {}
+
+def test_undo_restores_a_filled_default():
+
+    input_file, clock = input_file_with_history()
+    input_file.inputs["occupations"] = "fixed"
+    input_file.defaults.add("occupations")
+
+    input_file.set_input("occupations", "smearing")
+    assert "occupations" not in input_file.defaults
+
+    input_file.undo()
+    assert input_file.inputs["occupations"] == "fixed"
+    assert "occupations" in input_file.defaults
+
+    input_file.redo()
+    assert "occupations" not in input_file.defaults
+
+    #setting a default to its own value makes it a value set, which can be undone
+    input_file.undo()
+    clock.now += 5.0
+    input_file.set_input("occupations", "fixed")
+    assert "occupations" not in input_file.defaults
+    input_file.undo()
+    assert "occupations" in input_file.defaults
+
+def test_oldest_steps_are_dropped():
+
+    history = History(max_steps = 2)
+    inputs = {}
+
+    for i in range(3):
+        history.record( "nbnd", inputs.get("nbnd", MISSING), str(i) )
+        inputs["nbnd"] = str(i)
+        history.checkpoint()
+
+    history.undo(inputs)
+    history.undo(inputs)
+    assert inputs == { "nbnd": "0" }
+    assert not history.can_undo()
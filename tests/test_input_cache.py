@@ -0,0 +1,35 @@
+"""
+Keys of the input cache
+"""
+
+import os
+
+from input_cache import input_key, result_key
+from jobs import pseudopotential_paths
+from pw_reader import parse_input
+
+from test_pw_roundtrip import VC_RELAX
+
+
+
+def test_result_key_covers_command_and_pseudopotentials(tmp_path):
+
+    input_file = parse_input(VC_RELAX)
+    input_file.set_input("pseudo_dir", str(tmp_path))
+
+    pseudopotential = tmp_path / "Si.pbe-n-kjpaw_psl.1.0.0.UPF"
+    pseudopotential.write_text("old")
+
+    paths = pseudopotential_paths( input_file, str( tmp_path / "job" ) )
+    assert paths == [ str(pseudopotential) ]
+
+    key = input_key(input_file)
+    command = ["pw.x", "-in", "{input}"]
+    result = result_key(key, command, paths)
+
+    assert result_key(key, command, paths) == result
+    assert result_key(key, ["echo", "{input}"], paths) != result
+
+    pseudopotential.write_text("new pseudopotential")
+    os.utime( pseudopotential, ( 0, 0 ) )
+    assert result_key(key, command, paths) != result
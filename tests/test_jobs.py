@@ -0,0 +1,133 @@
+"""
+Running jobs on the local job runner, with the pw.x stand-in
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import jobs
+from jobs import CANCELLED, DONE, FAILED, MOCK_COMMAND, JobRunner
+
+from pw_reader import parse_input
+from test_pw_roundtrip import VC_RELAX
+
+
+
+#the stand-in, slowed down so that a job is still running when it is cancelled
+SLOW_COMMAND = MOCK_COMMAND + [ "--iterations", "100", "--delay", "0.5" ]
+
+
+
+def test_jobs_run_in_their_own_directories(tmp_path):
+
+    finished = []
+    runner = JobRunner( str(tmp_path), MOCK_COMMAND, workers = 2, on_finished = finished.append )
+
+    submitted = [ runner.submit( parse_input(VC_RELAX) ) for i in range(3) ]
+    assert runner.wait(60)
+    runner.close()
+
+    assert sorted( job.number for job in finished ) == [0, 1, 2]
+    for job in submitted:
+        assert job.status == DONE and job.returncode == 0
+        assert os.path.dirname(job.input_path) == job.directory == os.path.join( str(tmp_path), "si.%05i" % job.number )
+        with open(job.input_path) as f:
+            assert "outdir = '" + job.directory + "'" in f.read()
+        with open(job.output_path) as f:
+            assert "JOB DONE." in f.read()
+        assert job.run_time is not None
+
+def test_failed_jobs(tmp_path):
+
+    runner = JobRunner( str(tmp_path), [ sys.executable, "-c", "import sys; sys.exit(3)" ], workers = 1 )
+    failed = runner.submit_text("&CONTROL\n/\n")
+    runner.wait(60)
+    runner.close()
+
+    assert ( failed.status, failed.returncode, failed.error ) == ( FAILED, 3, None )
+
+    runner = JobRunner( str(tmp_path), [ str( tmp_path / "no-such-pw.x" ) ], workers = 1 )
+    missing = runner.submit_text("&CONTROL\n/\n")
+    runner.wait(60)
+    runner.close()
+
+    assert missing.status == FAILED and isinstance(missing.error, OSError)
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+
+    finished = []
+    runner = JobRunner( str(tmp_path), SLOW_COMMAND, workers = 1, on_finished = finished.append )
+
+    running = runner.submit( parse_input(VC_RELAX) )
+    queued = runner.submit( parse_input(VC_RELAX) )
+    while running.process is None:
+        time.sleep(0.01)
+
+    runner.cancel(queued)
+    runner.cancel(running)
+    assert runner.wait(10)
+    runner.close()
+
+    assert running.status == CANCELLED and running.returncode != 0
+    assert queued.status == CANCELLED and queued.started is None
+    assert sorted( job.number for job in finished ) == [0, 1]
+
+def test_cancel_while_the_process_starts(tmp_path, monkeypatch):
+
+    runner = JobRunner( str(tmp_path), SLOW_COMMAND, workers = 1 )
+
+    #the job is cancelled after its worker has taken it, but before its process exists
+    start_process = subprocess.Popen
+    def popen(*args, **kwargs):
+        runner.cancel( runner.jobs[0] )
+        return start_process(*args, **kwargs)
+    monkeypatch.setattr( jobs.subprocess, "Popen", popen )
+
+    started = time.perf_counter()
+    job = runner.submit( parse_input(VC_RELAX) )
+    assert runner.wait(10)
+    runner.close()
+
+    assert job.status == CANCELLED
+    assert time.perf_counter() - started < 5
+
+def test_close_cancels_every_unfinished_job(tmp_path):
+
+    runner = JobRunner( str(tmp_path), SLOW_COMMAND, workers = 1 )
+    submitted = [ runner.submit( parse_input(VC_RELAX) ) for i in range(3) ]
+    while submitted[0].process is None:
+        time.sleep(0.01)
+
+    runner.close(cancel = True)
+
+    assert [ job.status for job in submitted ] == [CANCELLED] * 3
+    assert runner.wait(0)
+
+def test_dialog_reports_jobs_and_closes_its_runner(tmp_path):
+
+    from PyQt5.QtWidgets import QApplication
+
+    from window import Dialog
+
+    app = QApplication.instance() or QApplication( [] )
+
+    runner = JobRunner( str(tmp_path), MOCK_COMMAND, workers = 1 )
+    dialog = Dialog( parse_input(VC_RELAX), runner = runner )
+
+    dialog.submit_job(watch = False)
+    assert runner.wait(60)
+
+    #the job is reported from the runner's worker, and shown once the event loop runs
+    app.processEvents()
+    assert dialog.job_label.text() == "Job si finished"
+
+    #closing the form cancels a job that is still running, rather than waiting for it
+    runner.command = SLOW_COMMAND
+    slow = runner.submit_text("&CONTROL\n/\n")
+    while slow.process is None:
+        time.sleep(0.01)
+
+    dialog.done(0)
+    assert runner.closing and slow.status == CANCELLED
@@ -0,0 +1,93 @@
+"""
+K-point grids, their reduction by symmetry and band paths
+"""
+
+import itertools
+
+import numpy as np
+
+from kpoints import (KPoints, band_path, crystal_rotations, irreducible_grid, lattice_rotations,
+                     monkhorst_pack, standard_path)
+from structure import Species, Structure
+
+
+
+CUBIC = np.identity(3) * 5.0
+
+
+
+def stars(grid, rotations):
+    """
+    Return the sizes of the stars of an unshifted grid, found one point at a time
+    """
+
+    n = np.array(grid)
+    labels = []
+    for j in itertools.product( *[ range(size) for size in grid ] ):
+        images = { tuple( ( sign * ( np.array(j) @ rotation ) ) % n ) for rotation in rotations for sign in (1, -1) }
+        labels.append( min( ( a * n[1] + b ) * n[2] + c for a, b, c in images ) )
+
+    return sorted( np.unique(labels, return_counts = True)[1].tolist() )
+
+def test_monkhorst_pack_order_and_shift():
+
+    points = monkhorst_pack( (2, 2, 3), (0, 0, 1) )
+
+    assert points.shape == (12, 3)
+    assert np.allclose( points[0], [0, 0, 1 / 6.0] )
+    assert np.allclose( points[1], [0, 0, 0.5] )
+    assert np.allclose( points[3], [0, 0.5, 1 / 6.0] )
+
+def test_irreducible_grid_weights_stars():
+
+    rotations = lattice_rotations(CUBIC)
+    assert len(rotations) == 48
+
+    reduced = irreducible_grid( (4, 4, 4), rotations = rotations )
+    assert np.isclose( reduced.weights.sum(), 1.0 )
+    assert sorted( np.rint( reduced.weights * 64 ).astype(int).tolist() ) == stars( (4, 4, 4), rotations )
+
+    shifted = irreducible_grid( (4, 4, 4), (1, 1, 1), rotations = rotations )
+    assert np.isclose( shifted.weights.sum(), 1.0 )
+    assert 1 < len(shifted) < 64
+
+def test_atoms_lower_the_symmetry():
+
+    species = [ Species("Si", 28.086, "Si.UPF"), Species("Ge", 72.63, "Ge.UPF") ]
+    structure = Structure( species, [0, 1], [ [0, 0, 0], [0.5, 0, 0] ], cell = CUBIC )
+
+    #the Ge atom along x leaves only the rotations that keep the x axis
+    assert len( crystal_rotations(structure) ) == 16
+
+def test_card_round_trip():
+
+    path = standard_path("fcc", 50)
+    assert np.allclose( path.points[0], [0, 0, 0] ) and np.allclose( path.points[-1], [0.75, 0.75, 0] )
+
+    again = KPoints.from_card( path.card() )
+    assert again.mode == "tpiba"
+    assert np.allclose( again.points, path.points ) and np.allclose( again.weights, path.weights )
+
+    grid = KPoints( "automatic", grid = (4, 4, 4, 1, 1, 1) )
+    assert KPoints.from_card( grid.card() ).grid == grid.grid
+
+def test_band_path_segments():
+
+    path = band_path( [ [0, 0, 0], [1, 0, 0], [1, 1, 0] ], points = 21 )
+
+    assert len(path) == 21
+    assert np.allclose( path.points[10], [1, 0, 0] )
+
+def test_input_file_writes_its_kpoints():
+
+    from pw_reader import parse_input
+
+    from test_pw_roundtrip import VC_RELAX, write
+
+    input_file = parse_input(VC_RELAX)
+    input_file.set_kpoints( band_path( [ [0, 0, 0], [0.5, 0, 0] ], points = 3 ) )
+
+    assert input_file.inputs["GUI_kpoint_type"] == "explicit"
+    text = write(input_file)
+    assert "K_POINTS tpiba\n3\n0.0000000000 0.0000000000 0.0000000000 1\n" in text
+    assert "4 4 4 0 0 0" not in text
@@ -0,0 +1,93 @@
+"""
+Events read from pw.x output
+"""
+
+from pw_output import OutputParser, parse_output
+
+
+
+OUTPUT = """
+     Self-consistent Calculation
+
+     iteration #  1     ecut=    30.00 Ry     beta= 0.70
+     Davidson diagonalization with overlap
+
+     total energy              =     -15.79441848 Ry
+     estimated scf accuracy    <       0.06376226 Ry
+
+     iteration #  2     ecut=    30.00 Ry     beta= 0.70
+
+!    total energy              =     -15.81200000 Ry
+     estimated scf accuracy    <       0.00000040 Ry
+
+     convergence has been achieved in   2 iterations
+
+     Total force =     0.001234     Total SCF correction =     0.000000
+
+     total   stress  (Ry/bohr**3)                   (kbar)     P=       -1.25
+  -0.00000850   0.00000000   0.00000000           -1.25        0.00        0.00
+   0.00000000  -0.00000850   0.00000000            0.00       -1.25        0.00
+   0.00000000   0.00000000  -0.00000850            0.00        0.00       -1.25
+
+CELL_PARAMETERS (alat= 10.20000000)
+  -0.500000000   0.000000000   0.500000000
+   0.000000000   0.500000000   0.500000000
+  -0.500000000   0.500000000   0.000000000
+
+     iteration #  1     ecut=    30.00 Ry     beta= 0.70
+
+     convergence NOT achieved after 100 iterations
+
+   JOB DONE.
+"""
+
+
+
+def events(kind, parsed):
+
+    return [ event for event in parsed if event.kind == kind ]
+
+def test_energies_follow_their_cycle():
+
+    parsed = parse_output(OUTPUT)
+
+    energy, = events("energy", parsed)
+    final, = events("final_energy", parsed)
+    assert ( energy.step, energy.iteration, energy.value ) == ( 1, 1, -15.79441848 )
+    assert ( final.step, final.iteration, final.value ) == ( 1, 2, -15.812 )
+    assert [ event.value for event in events("accuracy", parsed) ] == [ 0.06376226, 4e-7 ]
+
+def test_convergence():
+
+    parsed = parse_output(OUTPUT)
+
+    converged, = events("converged", parsed)
+    not_converged, = events("not_converged", parsed)
+    assert ( converged.step, converged.value ) == ( 1, 2 )
+    assert ( not_converged.step, not_converged.value ) == ( 2, 100 )
+    assert events("force", parsed)[0].value == 0.001234
+    assert parsed[-1].kind == "job_done"
+
+def test_stress_and_cell_have_three_rows():
+
+    parsed = parse_output(OUTPUT)
+
+    stress, = events("stress", parsed)
+    assert stress.value == ( -1.25, [ [-1.25, 0.0, 0.0], [0.0, -1.25, 0.0], [0.0, 0.0, -1.25] ] )
+
+    cell, = events("cell", parsed)
+    assert cell.value == ( "alat= 10.20000000", [ [-0.5, 0.0, 0.5], [0.0, 0.5, 0.5], [-0.5, 0.5, 0.0] ] )
+
+def test_blocks_split_across_chunks():
+
+    data = OUTPUT.encode("ascii")
+    whole = parse_output(data)
+
+    #feeding the output a few bytes at a time cuts blocks and lines at every possible point
+    parser = OutputParser()
+    parsed = []
+    for start in range(0, len(data), 7):
+        parsed.extend( parser.feed( data[start:start + 7] ) )
+    parsed.extend( parser.flush() )
+
+    assert [ repr(event) for event in parsed ] == [ repr(event) for event in whole ]
@@ -0,0 +1,53 @@
+"""
+Reading pw.x inputs into the form
+"""
+
+import pytest
+
+from pw_reader import PwInputError, parse_input, tokenize
+
+from test_pw_roundtrip import VC_RELAX, write
+
+
+
+def test_tokenizer_reads_fortran_namelist_syntax():
+
+    namelists, cards = tokenize( "! a comment before the namelists\n"
+                                 "&control\n  title = 'it''s, a test / run' ! trailing comment\n"
+                                 "  tstress = .true., Tprnfor=T\n/\n"
+                                 "&SYSTEM\n  celldm (1) = 10.2d0, starting_magnetization(2)=0.5\n/\n"
+                                 "ATOMIC_SPECIES\nSi 28.086 Si.UPF\n# a comment in a card\n\n"
+                                 "K_POINTS {automatic}\n4 4 4 0 0 0\n" )
+
+    assert namelists["CONTROL"] == { "title": [ "'it''s, a test / run'" ], "tstress": [ ".true." ], "tprnfor": [ "T" ] }
+    assert namelists["SYSTEM"] == { "celldm(1)": [ "10.2d0" ], "starting_magnetization(2)": [ "0.5" ] }
+    assert cards["ATOMIC_SPECIES"].lines == [ "Si 28.086 Si.UPF" ]
+    assert ( cards["K_POINTS"].option, cards["K_POINTS"].lines ) == ( "automatic", [ "4 4 4 0 0 0" ] )
+
+def test_unterminated_namelist():
+
+    with pytest.raises(PwInputError):
+        parse_input("&CONTROL\n  calculation = 'scf'\n")
+
+def test_gui_inputs_are_inferred():
+
+    input_file = parse_input(VC_RELAX)
+    inputs = input_file.inputs
+
+    assert inputs["calculation"] == "relax"
+    assert inputs["GUI_variable_cell"] == 2
+    assert inputs["GUI_exx_corr"] == "hybrid"
+    assert inputs["GUI_efield_type"] == "none"
+    assert inputs["GUI_charge_type"] == "neutral"
+    assert inputs["GUI_kpoint_type"] == "automatic" and inputs["GUI_kpoint_grid"] == "4 4 4"
+
+    charged = parse_input( VC_RELAX.replace("ecutwfc = 30", "ecutwfc = 30, tot_charge = 1, lda_plus_u = .true.") )
+    assert charged.inputs["GUI_charge_type"] == "homogeneous"
+    assert charged.inputs["GUI_exx_corr"] == "dft+u"
+
+def test_written_input_reads_back_the_same():
+
+    text = write( parse_input(VC_RELAX) )
+
+    assert "calculation = 'vc-relax'" in text and "cell_dofree = 'ibrav'" in text
+    assert write( parse_input(text) ) == text
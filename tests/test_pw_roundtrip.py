@@ -0,0 +1,191 @@
+"""
+Reading a pw.x input and writing it again
+"""
+
+import io
+
+from pw_reader import parse_input
+
+
+
+VC_RELAX = """&CONTROL
+  calculation = 'vc-relax'
+  prefix = 'si'
+/
+&SYSTEM
+  ibrav = 2, celldm(1) = 10.2, nat = 2, ntyp = 1
+  ecutwfc = 30
+  input_dft = 'PBE0'
+/
+&ELECTRONS
+/
+&IONS
+/
+&CELL
+  cell_dofree = 'ibrav'
+/
+ATOMIC_SPECIES
+Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF
+ATOMIC_POSITIONS alat
+Si 0.00 0.00 0.00
+Si 0.25 0.25 0.25
+K_POINTS automatic
+4 4 4 0 0 0
+"""
+
+
+
+def write(input_file):
+
+    stream = io.StringIO()
+    input_file.write(stream)
+
+    return stream.getvalue()
+
+def test_combo_values_are_kept():
+
+    text = write( parse_input(VC_RELAX) )
+
+    assert "input_dft = 'pbe0'" in text.lower()
+    assert "cell_dofree = 'ibrav'" in text
+
+def test_form_defaults_are_not_written():
+
+    text = write( parse_input(VC_RELAX) )
+
+    for parameter in ("cell_dynamics", "disk_io", "wf_collect", "occupations"):
+        assert parameter not in text
+
+def test_set_input_is_written():
+
+    input_file = parse_input(VC_RELAX)
+    input_file.set_input("disk_io", "low")
+
+    assert "disk_io = 'low'" in write(input_file)
+
+
+
+ALAT = """&CONTROL
+  calculation = 'scf'
+/
+&SYSTEM
+  ibrav = 0, celldm(1) = 10.2, nat = 2, ntyp = 1
+  ecutwfc = 30
+/
+&ELECTRONS
+/
+CELL_PARAMETERS alat
+  -0.5 0.0 0.5
+   0.0 0.5 0.5
+  -0.5 0.5 0.0
+ATOMIC_SPECIES
+Si 28.086 Si.pbe-n-kjpaw_psl.1.0.0.UPF
+ATOMIC_POSITIONS alat
+Si 0.00 0.00 0.00
+Si 0.25 0.25 0.25
+K_POINTS tpiba
+2
+0.0 0.0 0.0 1.0
+0.5 0.5 0.5 1.0
+"""
+
+def card_values(input_file, name):
+
+    card = input_file.cards[name]
+
+    return ( card.option or "" ).lower(), [ [ float(v) if v[0] in "-.0123456789" else v for v in line.split() ]
+                                            for line in card.lines ]
+
+def assert_alat_unchanged(input_file):
+
+    assert float( input_file.extra_parameters["SYSTEM"]["celldm(1)"] ) == 10.2
+
+    option, cell = card_values(input_file, "CELL_PARAMETERS")
+    assert option == "alat"
+    assert cell == [ [-0.5, 0.0, 0.5], [0.0, 0.5, 0.5], [-0.5, 0.5, 0.0] ]
+
+    assert card_values(input_file, "ATOMIC_POSITIONS") == ( "alat", [ ["Si", 0.0, 0.0, 0.0], ["Si", 0.25, 0.25, 0.25] ] )
+    assert card_values(input_file, "K_POINTS") == ( "tpiba", [ [2.0], [0.0, 0.0, 0.0, 1.0], [0.5, 0.5, 0.5, 1.0] ] )
+
+def test_alat_cards_are_unchanged():
+
+    input_file = parse_input(ALAT)
+    assert_alat_unchanged(input_file)
+
+    assert_alat_unchanged( parse_input( write(input_file) ) )
+
+def test_alat_structure():
+
+    input_file = parse_input(ALAT)
+    structure = input_file.load_structure()
+
+    #the lattice parameter is celldm(1), not the length of the first lattice vector
+    alat = 10.2 * 0.529177210903
+    assert abs( structure.alat - alat ) < 1e-9
+    assert abs( structure.cartesian()[1] - 0.25 * alat ).max() < 1e-9
+    assert abs( structure.cell[0] - [ -0.5 * alat, 0.0, 0.5 * alat ] ).max() < 1e-9
+
+    assert_alat_unchanged( parse_input( write(input_file) ) )
+
+def test_kpoints_card_replaces_loaded_kpoints():
+
+    from sweep import Sweep
+
+    input_file = parse_input(ALAT)
+    input_file.load_kpoints()
+
+    sweep = Sweep( input_file, { "K_POINTS": ["6 6 6 0 0 0", "8 8 8 1 1 1"] } )
+    assert "K_POINTS automatic\n8 8 8 1 1 1" in write( sweep.variant(1) )
+
+def test_form_kpoints_replace_the_card():
+
+    input_file = parse_input(ALAT)
+    input_file.set_input("GUI_kpoint_type", "automatic")
+    input_file.set_input("GUI_kpoint_grid", "3 3 3")
+
+    assert "K_POINTS automatic\n3 3 3 0 0 0" in write(input_file)
+
+def test_opened_form_writes_what_it_shows():
+
+    from form import InputForm
+    from qe_input import QuantumEspressoInputFile
+
+    input_file = QuantumEspressoInputFile()
+    form = InputForm(input_file)
+    form.open_all()
+    form.set_input("GUI_lattice_vector", "5 0 0\n0 5 0\n0 0 5")
+
+    #ibrav has no default in pw.x, so the choice the form shows is written
+    text = write(input_file)
+    assert "ibrav = 0" in text
+
+    #the form shows pw.x's own occupations, which is left out until another is chosen
+    assert input_file.inputs["occupations"] == "fixed"
+    assert "occupations" not in text
+
+    form.set_input("occupations", "smearing")
+    form.set_input("degauss", "0.02")
+    text = write(input_file)
+    assert "occupations = 'smearing'" in text and "degauss = 0.02" in text
+
+    #a default that depends on the calculation is written once the calculation no longer has it
+    form.set_input("calculation", "relax")
+    assert input_file.inputs["disk_io"] == "low"
+    assert "disk_io = 'low'" in write(input_file)
+
+def test_shared_combo_is_not_written_where_it_is_not_offered():
+
+    from form import InputForm
+    from qe_input import QuantumEspressoInputFile
+
+    input_file = QuantumEspressoInputFile()
+    form = InputForm(input_file)
+    form.open_all()
+
+    #ion_dynamics is filled in by the md group, whose verlet the relaxation group does not offer
+    form.set_input("calculation", "relax")
+    assert input_file.inputs["ion_dynamics"] == "verlet"
+    assert "ion_dynamics" not in write(input_file)
+
+    form.set_input("ion_dynamics", "damp")
+    assert "ion_dynamics = 'damp'" in write(input_file)
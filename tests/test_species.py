@@ -0,0 +1,82 @@
+"""
+Per-species parameters set through the inputs of the form
+"""
+
+import io
+
+from form import InputForm
+from history import History
+from pw_reader import parse_input
+
+
+
+HUBBARD = """&CONTROL
+  calculation = 'scf'
+/
+&SYSTEM
+  ibrav = 2, celldm(1) = 10.2, nat = 2, ntyp = 2
+  ecutwfc = 30
+  nspin = 2
+  starting_magnetization(1) = 0.5
+  lda_plus_u = .true.
+  Hubbard_U(1) = 3
+/
+&ELECTRONS
+/
+ATOMIC_SPECIES
+Fe 55.845 Fe.pbe-spn-kjpaw_psl.0.2.1.UPF
+O 15.999 O.pbe-n-kjpaw_psl.0.1.UPF
+ATOMIC_POSITIONS alat
+Fe 0.00 0.00 0.00
+O 0.25 0.25 0.25
+K_POINTS gamma
+"""
+
+
+
+def parameters(input_file):
+
+    stream = io.StringIO()
+    input_file.write(stream)
+
+    return { line.split("=")[0].strip(): line.split("=")[1].strip() for line in stream.getvalue().splitlines() if "=" in line }
+
+def test_set_input_sets_the_species_arrays():
+
+    input_file = parse_input(HUBBARD)
+    assert input_file.species_parameters is not None
+
+    input_file.set_input("U", "5.0")
+    InputForm(input_file).set_input("starting_magnetization", "0.9 -0.2")
+
+    written = parameters(input_file)
+    assert float( written["Hubbard_U(1)"] ) == 5.0
+    assert float( written["starting_magnetization(1)"] ) == 0.9
+    assert float( written["starting_magnetization(2)"] ) == -0.2
+
+def test_undo_sets_the_species_arrays():
+
+    input_file = parse_input(HUBBARD)
+    input_file.history = History()
+
+    input_file.set_input("U", "5.0")
+    input_file.undo()
+
+    assert float( parameters(input_file)["Hubbard_U(1)"] ) == 3.0
+
+def test_hubbard_j_keeps_its_indices():
+
+    from pw_reader import parse_input
+
+    text = HUBBARD.replace( "  Hubbard_U(1) = 3\n", "  Hubbard_U(1) = 3\n  lda_plus_u_kind = 1\n  Hubbard_J(1,2) = 0.5\n  Hubbard_J(3,1) = 0.25\n" )
+
+    written = parameters( parse_input(text) )
+    #kept as read, in lower case
+    assert float( written["hubbard_j(1,2)"] ) == 0.5
+    assert float( written["hubbard_j(3,1)"] ) == 0.25
+    assert not any( key.lower() == "hubbard_j(1)" for key in written )
+
+    #and again, once written
+    stream = io.StringIO()
+    parse_input(text).write(stream)
+    assert parameters( parse_input( stream.getvalue() ) ) == written
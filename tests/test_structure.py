@@ -0,0 +1,56 @@
+"""
+Structures built from the cards of a pw.x input
+"""
+
+from qe_input import Card
+from pw_reader import parse_input
+from structure import Structure
+
+
+
+SPECIES = Card( "ATOMIC_SPECIES", None, [ "Si 28.086 Si.UPF" ] )
+
+
+
+def test_if_pos_on_some_atoms():
+
+    positions = Card( "ATOMIC_POSITIONS", "angstrom", [ "Si 0.0 0.0 0.0 0 0 0", "Si 1.0 1.0 1.0", "Si 2.0 2.0 2.0 1 1 0" ] )
+
+    structure = Structure.from_cards(SPECIES, positions)
+
+    assert structure.if_pos.tolist() == [ [0, 0, 0], [1, 1, 1], [1, 1, 0] ]
+    assert structure.positions[1].tolist() == [1.0, 1.0, 1.0]
+
+def test_space_group_positions_are_kept_as_the_card():
+
+    input_file = parse_input( "&CONTROL\n/\n&SYSTEM\n  ibrav = 1, celldm(1) = 10.0, nat = 1, ntyp = 1, space_group = 221\n/\n"
+                              "&ELECTRONS\n/\nATOMIC_SPECIES\nSi 28.086 Si.UPF\nATOMIC_POSITIONS crystal_sg\nSi 1a\n" )
+
+    assert input_file.load_structure() is None
+    assert input_file.structure is None
+    assert input_file.cards["ATOMIC_POSITIONS"].lines == [ "Si 1a" ]
+
+def test_set_structure_sets_the_lattice_inputs_as_one_step():
+
+    import io
+
+    from form import InputForm
+    from history import History
+    from structure import Species
+
+    input_file = parse_input( "&CONTROL\n/\n&SYSTEM\n  ibrav = 2, celldm(1) = 10.0, nat = 1, ntyp = 1\n/\n"
+                              "&ELECTRONS\n/\nATOMIC_SPECIES\nSi 28.086 Si.UPF\nATOMIC_POSITIONS crystal\nSi 0 0 0\n" )
+    InputForm(input_file).open_all()
+    input_file.defaults.add("ibrav")
+    input_file.history = History()
+
+    input_file.set_structure( Structure( [ Species("Si", 28.086, "Si.UPF") ], [0], [ [0.0, 0.0, 0.0] ],
+                                         cell = [ [5.0, 0, 0], [0, 5.0, 0], [0, 0, 5.0] ] ) )
+
+    stream = io.StringIO()
+    input_file.write(stream)
+    assert "ibrav = 0" in stream.getvalue()
+    assert "ibrav" not in input_file.defaults
+
+    assert sorted( input_file.undo() ) == [ "GUI_lattice_vector", "ibrav" ]
+    assert input_file.inputs["ibrav"] == "2"
@@ -0,0 +1,81 @@
+"""
+Parameter sweeps over a pw.x input
+"""
+
+import os
+
+import pytest
+
+from pw_reader import parse_input, read_input
+from sweep import MANIFEST, Sweep, main, parse_values, sweep_range, write_sweep
+
+from test_pw_roundtrip import VC_RELAX, write
+
+
+
+def test_values_of_a_range():
+
+    assert sweep_range(30, 50, 10) == [30, 40, 50]
+    assert parse_values("30:50:10") == [30, 40, 50]
+    assert parse_values("0.1:0.3:0.1") == pytest.approx( [0.1, 0.2, 0.3] )
+    assert parse_values("0.3,0.7") == ["0.3", "0.7"]
+
+def test_product_and_zip_variants():
+
+    base = parse_input(VC_RELAX)
+
+    product = Sweep( base, { "ecutwfc": [30, 40], "mixing_beta": [0.3, 0.5, 0.7] } )
+    assert len(product) == 6
+    assert product.variant_values(1) == ["30", "0.5"]
+    assert product.variant_values(3) == ["40", "0.3"]
+
+    zipped = Sweep( base, { "ecutwfc": [30, 40], "mixing_beta": [0.3, 0.5] }, mode = "zip" )
+    assert len(zipped) == 2
+    assert zipped.variant_values(1) == ["40", "0.5"]
+
+    with pytest.raises(ValueError):
+        Sweep( base, { "ecutwfc": [30, 40], "mixing_beta": [0.3] }, mode = "zip" )
+    with pytest.raises(ValueError):
+        Sweep( base, { "not_an_input": [1] } )
+
+def test_variants_write_their_values_and_leave_the_base_alone():
+
+    base = parse_input(VC_RELAX)
+    sweep = Sweep( base, { "ecutwfc": [30, 40], "K_POINTS": ["2 2 2 0 0 0", "6 6 6 1 1 1"] } )
+
+    text = write( sweep.variant(3) )
+    assert "ecutwfc = 40" in text
+    assert "K_POINTS automatic\n6 6 6 1 1 1" in text
+    assert "calculation = 'vc-relax'" in text
+
+    assert base.inputs["ecutwfc"] == "30"
+    assert "K_POINTS automatic\n4 4 4 0 0 0" in write(base)
+
+def test_written_sweep_matches_its_variants(tmp_path):
+
+    sweep = Sweep( parse_input(VC_RELAX), { "ecutwfc": [30, 40, 50], "degauss": [0.01, 0.02] } )
+
+    #one worker writes in this process, two through a process pool, with chunks of uneven size
+    for workers in (1, 2):
+        directory = str( tmp_path / str(workers) )
+        assert write_sweep(sweep, directory, workers = workers, chunk_size = 4) == 6
+
+        for index in range(6):
+            with open( os.path.join( directory, sweep.file_name(index) ) ) as f:
+                assert f.read() == write( sweep.variant(index) )
+
+        with open( os.path.join(directory, MANIFEST) ) as f:
+            lines = f.read().splitlines()
+        assert lines[0] == "file,ecutwfc,degauss"
+        assert lines[6] == "00005.in,50,0.02"
+
+def test_command_line(tmp_path, capsys):
+
+    base = tmp_path / "base.in"
+    base.write_text(VC_RELAX)
+    directory = str( tmp_path / "out" )
+
+    main( [ str(base), directory, "ecutwfc=30:40:10", "--workers", "1" ] )
+
+    assert "2 inputs written" in capsys.readouterr().out
+    assert read_input( os.path.join(directory, "00001.in") ).inputs["ecutwfc"] == "40"
@@ -0,0 +1,58 @@
+"""
+Incremental validation of the inputs
+"""
+
+from qe_input import QuantumEspressoInputFile
+from validation import Validator, number_rule, validate_input
+
+from pw_reader import parse_input
+from test_pw_roundtrip import VC_RELAX
+
+
+
+def test_number_rules():
+
+    check = number_rule("mixing_beta", minimum = 0, maximum = 1, exclusive = True)
+    assert check( ("0.7",) ) is None
+    assert check( ("",) ) is None
+    assert check( ("1.0d-1",) ) is None
+    assert check( ("0",) ) == "Must be greater than 0"
+    assert check( ("1.5",) ) == "Must be at most 1"
+    assert check( ("abc",) ) == "'abc' is not a number"
+
+    grid = number_rule("nqx1", minimum = 1, integer = True, count = 3)
+    assert grid( ("2 2 2",) ) is None
+    assert grid( ("2 2",) ) == "Expected 3 values, separated by spaces"
+    assert grid( ("2 2.5 2",) ) == "'2.5' is not an integer"
+
+def test_only_the_rules_of_a_changed_input_run_again():
+
+    input_file = QuantumEspressoInputFile()
+    validator = Validator(input_file)
+    validator.update_all()
+    runs = validator.runs
+
+    input_file.set_input("ecutwfc", "30")
+    input_file.set_input("ecutrho", "100")
+    assert validator.update("ecutrho") == ["ecutrho"]
+    assert validator.messages("ecutrho") == [ "ecutrho must be at least 4 times ecutwfc (120 Ry)" ]
+
+    #ecutrho's number rule, the ecutrho and ecutfock consistency rules
+    assert validator.runs == runs + 3
+
+    #an input set to the value its rules last read does not run them again
+    runs = validator.runs
+    input_file.set_input("ecutrho", "100")
+    assert validator.update("ecutrho") == []
+    assert validator.runs == runs
+
+    input_file.set_input("ecutwfc", "25")
+    assert validator.update("ecutwfc") == ["ecutrho"]
+    assert validator.errors() == {}
+
+def test_only_active_inputs_are_reported():
+
+    input_file = parse_input( VC_RELAX.replace("ecutwfc = 30", "ecutwfc = -30, degauss = -1") )
+
+    #degauss is not shown without smearing, so its error is not reported
+    assert list( validate_input(input_file) ) == ["ecutwfc"]
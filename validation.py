@@ -0,0 +1,401 @@
+"""
+Validation of the inputs of the Quantum ESPRESSO input form
+
+A Rule reads a fixed tuple of inputs and returns an error message, or None if
+their values are acceptable.  A Validator indexes its rules by the inputs they
+read, the way InputForm indexes show conditions, and memoizes each rule's
+result against the values it last read: after an input changes, only the rules
+that read it are considered, and only those whose values actually differ are
+run again.  Like form.py, this module does not import Qt.
+"""
+
+import math
+
+
+
+#message of a rule that passes
+VALID = None
+
+#text of Fortran logicals, which pw.x accepts in place of numbers for some parameters
+FORTRAN_LOGICALS = (".true.", ".false.", "t", "f", "true", "false")
+
+
+
+class Rule():
+    """
+    This class represents one check over a fixed tuple of inputs
+
+    check is called with the values of inputs, in order, and returns an error message
+    or None.  The message is shown on the fields of targets, which are by default the
+    inputs read.
+    """
+
+    def __init__(self, inputs, check, targets = None):
+
+        self.inputs = tuple(inputs)
+        self.check = check
+        self.targets = tuple(targets or inputs)
+
+    def __call__(self, values):
+
+        return self.check(*values)
+
+    def __repr__(self):
+
+        return "Rule(" + repr(self.inputs) + ")"
+
+
+
+def is_blank(value):
+
+    return value is None or ( isinstance(value, str) and value.strip() == "" )
+
+def parse_number(text):
+    """
+    Return the float value of a Fortran real or integer, such as 1.0d-8, or raise ValueError
+    """
+
+    value = float( str(text).strip().lower().replace("d", "e") )
+    if not math.isfinite(value):
+        raise ValueError('Not a finite number: ' + repr(text))
+
+    return value
+
+def parse_integer(text):
+
+    return int( str(text).strip() )
+
+def number_rule(input_name, minimum = None, maximum = None, exclusive = False, integer = False,
+                count = 1, logical = False):
+    """
+    Return a Rule checking that an input holds count space-separated numbers (any number
+    of them if count is None), each within [minimum, maximum]
+
+    If exclusive is True, the minimum itself is not allowed.  If logical is True, a Fortran
+    logical is accepted in place of a number.
+    """
+
+    kind = "an integer" if integer else "a number"
+    parse = parse_integer if integer else parse_number
+
+    def check(value):
+
+        if is_blank(value): #unset, so pw.x uses its default
+            return VALID
+
+        values = str(value).split()
+        if count is not None and len(values) != count:
+            return "Expected " + str(count) + " values, separated by spaces"
+
+        for text in values:
+
+            if logical and text.lower() in FORTRAN_LOGICALS:
+                continue
+
+            try:
+                number = parse(text)
+            except ValueError:
+                return repr(text) + " is not " + kind
+
+            if minimum is not None:
+                if exclusive and number <= minimum:
+                    return "Must be greater than " + format_bound(minimum)
+                if number < minimum:
+                    return "Must be at least " + format_bound(minimum)
+            if maximum is not None and number > maximum:
+                return "Must be at most " + format_bound(maximum)
+
+        return VALID
+
+    return Rule( (input_name,), check )
+
+def format_bound(bound):
+
+    return "%g" % bound
+
+
+
+def check_ecutrho(ecutwfc, ecutrho):
+    """
+    The charge density cutoff must be at least four times the wavefunction cutoff
+    (pw.x's own default); ultrasoft and PAW pseudopotentials usually need 8 to 12 times
+    """
+
+    try:
+        ecutwfc = parse_number(ecutwfc)
+        ecutrho = parse_number(ecutrho)
+    except ValueError: #reported by the number rules
+        return VALID
+
+    if ecutrho < 4 * ecutwfc:
+        return "ecutrho must be at least 4 times ecutwfc (%g Ry)" % ( 4 * ecutwfc )
+
+    return VALID
+
+def check_ecutfock(ecutwfc, ecutrho, ecutfock):
+    """
+    The cutoff of the exact exchange operator may not exceed the charge density cutoff
+    """
+
+    try:
+        ecutfock = parse_number(ecutfock)
+        ecutrho = parse_number(ecutrho) if not is_blank(ecutrho) else 4 * parse_number(ecutwfc)
+    except ValueError:
+        return VALID
+
+    if ecutfock > ecutrho:
+        return "ecutfock must not exceed ecutrho (%g Ry)" % ecutrho
+
+    return VALID
+
+def check_trust_radius(trust_radius_min, trust_radius_ini):
+
+    try:
+        if parse_number(trust_radius_min) > parse_number(trust_radius_ini):
+            return "trust_radius_ini must be at least trust_radius_min"
+    except ValueError:
+        pass
+
+    return VALID
+
+def check_conv_thr_init(conv_thr, conv_thr_init):
+
+    try:
+        if parse_number(conv_thr_init) < parse_number(conv_thr):
+            return "conv_thr_init must be at least conv_thr"
+    except ValueError:
+        pass
+
+    return VALID
+
+
+
+#the rules of the pw.x form; number rules read one input each, so that typing in a field
+#only re-runs the rules of that field and of the consistency checks that read it
+RULES = [
+
+    #basic and system
+    number_rule("tot_charge"),
+    number_rule("ecutwfc", minimum = 0, exclusive = True),
+    number_rule("ecutrho", minimum = 0, exclusive = True),
+    number_rule("etot_conv_thr", minimum = 0, exclusive = True),
+    number_rule("forc_conv_thr", minimum = 0, exclusive = True),
+    number_rule("nstep", minimum = 0, integer = True),
+    number_rule("nbnd", minimum = 1, integer = True),
+    number_rule("degauss", minimum = 0, exclusive = True),
+    number_rule("exx_fraction", minimum = 0, maximum = 1),
+    number_rule("ecutfock", minimum = 0, exclusive = True),
+    number_rule("screening_parameter", minimum = 0),
+    number_rule("ecutvcut", minimum = 0),
+    number_rule("x_gamma_extrapolation", logical = True),
+    number_rule("nqx1", minimum = 1, integer = True, count = 3),
+
+    #per-species values
+    number_rule("starting_magnetization", minimum = -1, maximum = 1, count = None),
+    number_rule("angle1", count = None),
+    number_rule("angle2", count = None),
+    number_rule("U", minimum = 0, count = None),
+    number_rule("J0", count = None),
+    number_rule("alpha", count = None),
+    number_rule("beta", count = None),
+    number_rule("london_c6", minimum = 0, count = None),
+    number_rule("london_rvdw", minimum = 0, count = None),
+
+    #cell
+    number_rule("esm_w"),
+    number_rule("esm_efield"),
+    number_rule("esm_nfit", minimum = 1, integer = True),
+    number_rule("press"),
+    number_rule("wmass", minimum = 0, exclusive = True),
+    number_rule("cell_factor", minimum = 0, exclusive = True),
+    number_rule("press_conv_thr", minimum = 0, exclusive = True),
+
+    #van der Waals
+    number_rule("london_rcut", minimum = 0, exclusive = True),
+    number_rule("london_s6", minimum = 0),
+    number_rule("ts_vdw_econv_thr", minimum = 0, exclusive = True),
+    number_rule("ts_vdw_isolated", logical = True),
+    number_rule("xdm_a1"),
+    number_rule("xdm_a2"),
+
+    #dynamics and relaxation
+    number_rule("dt", minimum = 0, exclusive = True),
+    number_rule("tempw", minimum = 0, exclusive = True),
+    number_rule("tolp", minimum = 0, exclusive = True),
+    number_rule("delta_t"),
+    number_rule("nraise", minimum = 1, integer = True),
+    number_rule("upscale", minimum = 1),
+    number_rule("bfgs_ndim", minimum = 1, integer = True),
+    number_rule("trust_radius_min", minimum = 0, exclusive = True),
+    number_rule("trust_radius_ini", minimum = 0, exclusive = True),
+    number_rule("w_1", minimum = 0, exclusive = True),
+    number_rule("w_2", minimum = 0, exclusive = True),
+
+    #magnetization and fields
+    number_rule("tot_magnetization"),
+    number_rule("fixed_magnetization", count = 3),
+    number_rule("lambda", minimum = 0),
+    number_rule("report", integer = True),
+    number_rule("edir", minimum = 1, maximum = 3, integer = True),
+    number_rule("emaxpos", minimum = 0, maximum = 1, exclusive = True),
+    number_rule("eopreg", minimum = 0, maximum = 1, exclusive = True),
+    number_rule("eamp"),
+    number_rule("efield"),
+    number_rule("efield_cart", count = 3),
+    number_rule("nberrycyc", minimum = 1, integer = True),
+    number_rule("nppstr", minimum = 1, integer = True),
+    number_rule("fcp_mu"),
+    number_rule("zmon"),
+    number_rule("block_1", minimum = 0, maximum = 1),
+    number_rule("block_2", minimum = 0, maximum = 1),
+    number_rule("block_height"),
+
+    #k-points
+    number_rule("GUI_kpoint_grid", minimum = 1, integer = True, count = 3),
+    number_rule("nosym", logical = True),
+    number_rule("nosym_evc", logical = True),
+    number_rule("noinv", logical = True),
+
+    #electrons
+    number_rule("electron_maxstep", minimum = 1, integer = True),
+    number_rule("conv_thr", minimum = 0, exclusive = True),
+    number_rule("conv_thr_init", minimum = 0, exclusive = True),
+    number_rule("conv_thr_multi", minimum = 0, exclusive = True),
+    number_rule("diago_thr_init", minimum = 0, exclusive = True),
+    number_rule("mixing_beta", minimum = 0, maximum = 1, exclusive = True),
+    number_rule("mixing_ndim", minimum = 1, integer = True),
+    number_rule("mixing_fixed_ns", minimum = 0, integer = True),
+    number_rule("diago_cg_maxiter", minimum = 1, integer = True),
+    number_rule("diago_david_ndim", minimum = 2, integer = True),
+    number_rule("diago_full_acc", logical = True),
+
+    #print
+    number_rule("max_seconds", minimum = 0, exclusive = True),
+    number_rule("iprint", minimum = 1, integer = True),
+
+    #consistency between inputs
+    Rule( ("ecutwfc", "ecutrho"), check_ecutrho, targets = ("ecutrho",) ),
+    Rule( ("ecutwfc", "ecutrho", "ecutfock"), check_ecutfock, targets = ("ecutfock",) ),
+    Rule( ("trust_radius_min", "trust_radius_ini"), check_trust_radius, targets = ("trust_radius_ini",) ),
+    Rule( ("conv_thr", "conv_thr_init"), check_conv_thr_init, targets = ("conv_thr_init",) ),
+    ]
+
+
+
+class Validator():
+    """
+    This class runs the rules over the inputs of an input file incrementally, and holds their results
+    """
+
+    def __init__(self, input_file, rules = None):
+
+        self.input_file = input_file
+        self.rules = list(RULES if rules is None else rules)
+
+        #reverse index from each input name to the rules that read it, and to the rules
+        #whose messages are shown on its field
+        self.dependents = {}
+        self.targeted = {}
+        for rule in self.rules:
+            for input_name in rule.inputs:
+                self.dependents.setdefault(input_name, []).append(rule)
+            for input_name in rule.targets:
+                self.targeted.setdefault(input_name, []).append(rule)
+
+        #values each rule last read, and its message for those values
+        self.values = {}
+        self.results = {}
+
+        #number of times a rule has actually been run
+        self.runs = 0
+
+    def run(self, rule):
+        """
+        Run rule if the values it reads have changed, and return whether its message changed
+        """
+
+        inputs = self.input_file.inputs
+        values = tuple( inputs.get(input_name) for input_name in rule.inputs )
+
+        if rule in self.values and self.values[rule] == values:
+            return False
+
+        self.values[rule] = values
+        self.runs += 1
+
+        message = rule(values)
+        changed = message != self.results.get(rule)
+        self.results[rule] = message
+
+        return changed
+
+    def update(self, input_name):
+        """
+        Re-run the rules that read input_name
+
+        Returns the names of the inputs whose messages changed
+        """
+
+        changed = []
+
+        for rule in self.dependents.get(input_name, ()):
+            if self.run(rule):
+                changed.extend( target for target in rule.targets if target not in changed )
+
+        return changed
+
+    def update_all(self):
+        """
+        Re-run every rule whose values have changed, returning the names of the inputs whose messages changed
+        """
+
+        changed = []
+
+        for rule in self.rules:
+            if self.run(rule):
+                changed.extend( target for target in rule.targets if target not in changed )
+
+        return changed
+
+    def messages(self, input_name):
+        """
+        Return the current error messages shown on the field of input_name
+        """
+
+        results = self.results
+
+        return [ results[rule] for rule in self.targeted.get(input_name, ()) if results.get(rule) ]
+
+    def errors(self, input_names = None):
+        """
+        Return a dictionary of the error messages of each input that has any
+
+        If input_names is given, only those inputs are reported.
+        """
+
+        if input_names is None:
+            input_names = self.targeted
+
+        errors = {}
+        for input_name in input_names:
+            messages = self.messages(input_name)
+            if messages:
+                errors[input_name] = messages
+
+        return errors
+
+
+
+def validate_input(input_file, rules = None):
+    """
+    Return the error messages of the active inputs of input_file, as a dictionary keyed by input name
+    """
+
+    from pw_writer import resolve_form
+
+    form = resolve_form(input_file)
+
+    validator = Validator(form.input_file, rules)
+    validator.update_all()
+
+    return validator.errors( form.active_inputs() )
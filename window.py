@@ -2,21 +2,75 @@
 Simple GUI for Quantum ESPRESSO
 """
 
+#imported first, so that the startup profile covers every import below
+from startup import PROFILE
+
 from PyQt5.QtWidgets import (QApplication, QCheckBox, QComboBox, QDialog,
-        QDialogButtonBox, QFormLayout, QGridLayout, QGroupBox, QHBoxLayout,
-        QLabel, QLineEdit, QMenu, QMenuBar, QPushButton, QScrollArea, QSpinBox, 
-        QTextEdit, QVBoxLayout, QWidget, QPlainTextEdit )
-from PyQt5.QtCore import (pyqtSlot)
-from PyQt5.QtCore import (Qt)
+        QFormLayout, QGroupBox, QLabel, QLineEdit, QPushButton, QScrollArea, QShortcut,
+        QVBoxLayout, QWidget, QPlainTextEdit )
+from PyQt5.QtGui import (QKeySequence)
+from PyQt5.QtCore import (pyqtSignal, pyqtSlot)
+from PyQt5.QtCore import (QEvent, Qt, QTimer)
  
 import sys
+
+PROFILE.mark("import Qt")
+
+from form import GroupState, InputForm
+from history import History, MISSING
+from instrumentation import COUNTERS, TRIGGERS
+from qe_input import QuantumEspressoInputFile, is_structure_name
+from validation import Validator
+
+PROFILE.mark("import form")
+
+
+
+#estimated height in pixels of each row, and of the frame, of a group box that has not been materialized
+PLACEHOLDER_ROW_HEIGHT = 30
+PLACEHOLDER_MARGIN = 40
+
+#style of the label and widget of a field whose input is not valid
+ERROR_LABEL_STYLE = "color: #c00000"
+ERROR_WIDGET_STYLE = "border: 1px solid #c00000"
+
  
 class Dialog(QDialog):
+
+    #emitted on the UI thread with each jobs.Job submitted by submit_job() as it finishes
+    job_finished = pyqtSignal(object)
  
-    def __init__(self, input_file):
+    def __init__(self, input_file, update_interval = 0, reuse_widgets = True, schema = None, lazy = False,
+                 autosave_path = None, defer_boxes = False, runner = None):
         super(Dialog, self).__init__()
 
-        self.input_file = input_file
+        #headless model of the form, which decides which groups and fields are shown
+        self.form = InputForm(input_file, schema)
+
+        self.input_file = self.form.input_file
+        self.schema = self.form.schema
+
+        #rules checking the inputs, re-run only for the inputs that change
+        self.validator = Validator(self.input_file)
+        self.validator.update_all()
+
+        #every change made through the widgets can be undone
+        if self.input_file.history is None:
+            self.input_file.history = History()
+        self.history = self.input_file.history
+
+        #if True, hidden rows keep their widgets and are only hidden; otherwise
+        #their widgets are destroyed and rebuilt when they are shown again
+        self.reuse_widgets = reuse_widgets
+
+        #updates from text fields are coalesced, and run once no text has changed for
+        #update_interval milliseconds (0 runs them on the next turn of the event loop)
+        self.scheduler = UpdateScheduler(self, update_interval)
+
+        #if True, the group boxes opened by open_all() are placeholders, whose widgets are
+        #only created once the box is scrolled into view
+        self.lazy = lazy
+        self.materialize_pending = False
 
         self.central_widget = QWidget()
 
@@ -27,6 +81,9 @@ class Dialog(QDialog):
         #list of all associated group boxes
         self.group_boxes = []
 
+        #group box of each open group, by group name
+        self.boxes = {}
+
         #inside of the main layout is a scroll area
         self.scroll_area = QScrollArea(self.central_widget)
         self.scroll_area.setWidgetResizable(True)
@@ -36,1174 +93,776 @@ class Dialog(QDialog):
         self.boxes_widget = QWidget()
         self.boxes_layout = QVBoxLayout(self.boxes_widget)
 
-        #create the box for basic information
-        basic_box = self.create_box('basic')
-        self.boxes_layout.addWidget(basic_box)
-
-
         self.scroll_area.setWidget(self.boxes_widget)
         self.setLayout(self.main_layout)
 
-        #set the dimensions of the form
-#        self.setGeometry(10,10,500,500)
- 
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.schedule_materialize)
 
-    def create_box(self,group_name):
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
 
-        group_box = InputBox(group_name)
+        #table of the atoms of input_file.structure, created by edit_structure()
+        self.atom_editor = None
 
-        group_box.initialize_widgets()
-
-        group_box.setLayout(group_box.layout)
-        
-        self.group_boxes.append(group_box)
-
-        self.boxes_layout.addWidget(group_box)
-
-        group_box.update_visibility()
-
-        #if the new group box is not visible, create the next one
-        if not group_box.shown:
-            self.create_box(group_box.next_group_box)
-
-        return group_box
-
-    def on_window_update(self):
-
-        #print("Window Updating")
-
-        for group_box in self.group_boxes:
-            group_box.update_layout()
+        #label below the form reporting a problem that did not stop the form, created by show_message()
+        self.message_label = None
 
+        #journal of the inputs and open groups, written on a background thread, or None
+        self.autosave = None
+        if autosave_path is not None:
+            from autosave import Autosave
+            self.autosave = Autosave(self.input_file, autosave_path)
 
+        #instrumentation.UpdateRecorder of the update cycles, or None; see record_updates()
+        self.recorder = None
 
+        #convergence_plot.ConvergencePanel of the job being watched, created by watch_output()
+        self.convergence_panel = None
 
+        #label below the form reporting how the last job ended, created by on_job_finished()
+        self.job_label = None
 
+        #jobs.JobRunner that submit_job() queues the input on, or None
+        self.runner = runner
+        if runner is not None:
+            QShortcut(QKeySequence("Ctrl+R"), self, self.submit_job)
+            #the runner reports from its worker threads; the signal carries each job to the UI thread
+            if runner.on_finished is None:
+                runner.on_finished = self.job_finished.emit
+            self.job_finished.connect(self.on_job_finished)
 
-#not included:
-#nat
-#ntyp
-#london, xdm
-#ortho_para
-
-#probably shouldn't include:
-#title
-#space_group, uniqueb, origin_choice, rhombohedral
-#ion_positions
-
-#not sure where to place:
-#no_t_rev
-#force_symmorphic
-#use_all_frac
-
-#one_atom_occupations
-
-#q2sigma, ecfixed, qcutz
+        #work deferred by defer() until the dialog has first been painted
+        self.painted = False
+        self.deferred = []
 
+        #create the box for basic information, or, if defer_boxes is True, let the empty
+        #window paint first and create it on the next turn of the event loop
+        #NOTE: the layouts must be in place first, so that the box's window() is this dialog
+        self.defer_boxes = defer_boxes
+        if defer_boxes:
+            self.defer(self.create_first_box)
+        else:
+            self.create_first_box()
 
-class InputBox(QGroupBox):
-    """
-    This class represents a collection of input widgets that 
-    correspond to a single type of input parameter
-    """
+        #set the dimensions of the form
+#        self.setGeometry(10,10,500,500)
  
-    def __init__(self, group_name):
-        self.group_name = group_name
-        self.label = self.group_name + " Information"
-
-        super(QGroupBox, self).__init__(self.label)
-        
-        self.layout = QFormLayout()
-        self.layout.setFormAlignment(Qt.AlignLeft)
-
-
-        #self.layout.setSpacing(0)
-
-
-        self.widgets = []
 
-        self.input_file = input_file
-
-        #conditions under which this group box should be shown
-        self.show_conditions = []
-        self.shown = True
+    def create_first_box(self):
 
+        basic_box = self.create_box(self.schema.first_group)
+        self.boxes_layout.addWidget(basic_box)
 
-    def initialize_widgets(self):
-        """
-        Add GUI elements for each of the input parameters associated with self.group_name
+    def defer(self, function):
         """
+        Call function once the dialog has been painted for the first time, in the order deferred
 
-        #for w in self.widgets:
-        #    self.layout.removeWidget(w)
-
-        #reset any widgets
-        #NOTE: need to check whether this clears memory correctly
-        #self.widgets = []
-        
-        #self.layout = QFormLayout()
-
-        #start with a fresh layout
-#        self.clear_layout()
+        Without defer_boxes, nothing is waiting on the first paint, so function is called at once.
+        """
 
-        #print("start of initialize_widgets")
-        #print(self.window())
-        
-        if self.group_name == 'basic':
-            self.create_basic_box()
-        elif self.group_name == 'cell':
-            self.create_cell_box()
-        elif self.group_name == 'hubbard':
-            self.create_hubbard_box()
-            self.show_conditions.append( [ ["GUI_exx_corr","==","dft+u"], 
-                                           "or", ["GUI_exx_corr","==","dft+u+j"] ] )
-        elif self.group_name == 'system':
-            self.create_system_box()
-        elif self.group_name == 'vdw':
-            self.create_vdw_box()
-            self.show_conditions.append( [ [ ["vdw_corr","==","grimme-d2"], "or",
-                                           ["vdw_corr","==","tkatchenko-scheffler"] ], "or",
-                                           ["vdw_corr","==","xdm"] ])
-        elif self.group_name == 'md':
-            self.create_md_box()
-            self.show_conditions.append( ["calculation","==","md"] )
-        elif self.group_name == 'relaxation':
-            self.create_ions_box()
-            self.show_conditions.append( ["calculation","==","relax"] )
-        elif self.group_name == 'cell dynamics':
-            self.create_celld_box()
-            self.show_conditions.append( [ [ ["calculation","==","relax"], "and", 
-                                           ["GUI_variable_cell","==",2] ], "or", 
-                                           [ ["calculation","==","md"], "and", 
-                                             ["GUI_variable_cell","==",2] ] ] )
-        elif self.group_name == 'magnetization':
-            self.create_magnetization_box()
-            self.show_conditions.append( [ ["nspin","==","2"], 
-                                           "or", ["nspin","==","4"] ] )
-        elif self.group_name == 'noncollinear':
-            self.create_noncollinear_box()
-            self.show_conditions.append( ["nspin","==","4"] )
-        elif self.group_name == 'efield':
-            self.create_efield_box()
-            self.show_conditions.append( [ ["GUI_efield_type","==","tefield"], 
-                                           "or", ["GUI_efield_type","==","lefield"] ] )
-        elif self.group_name == 'monopole':
-            self.create_monopole_box()
-            self.show_conditions.append( ["GUI_charge_type","==","monopole"] )
-        elif self.group_name == 'kpoint':
-            self.create_kpoint_box()
-        elif self.group_name == 'electrons':
-            self.create_electrons_box()
-        elif self.group_name == 'print':
-            self.create_print_box()
+        if self.painted or not self.defer_boxes:
+            function()
         else:
-            raise LookupError('Group name not recognized: ' + str(self.group_name))
+            self.deferred.append(function)
 
-        self.apply_layout()
-        self.update_layout()
+    def paintEvent(self, event):
 
-        #print("end of initialize_widgets")
-        #print(self.window())
+        super(Dialog, self).paintEvent(event)
 
-    def update_visibility(self):
+        if not self.painted:
+            self.painted = True
+            PROFILE.mark("first paint")
+            QTimer.singleShot(0, self.run_deferred)
 
-        #if this group should not be shown, hide it and then initialize the next box
-        should_show = self.check_show_conditions(self)
+    def run_deferred(self):
 
-        if should_show:
-            self.setVisible(True)
-            self.shown = True
-        else:
-            self.setVisible(False)
-            self.shown = False
-            #self.window().create_box(self.next_group_box)
+        #work deferred while running deferred work joins the end of the queue
+        while self.deferred:
+            self.deferred.pop(0)()
 
-    def apply_layout(self):
+        PROFILE.mark("form built")
 
-        for w in self.widgets:
+        if PROFILE.enabled:
+            PROFILE.report()
+            self.done(0)
 
-            try:
-                if w.label:
-                    self.layout.addRow( w.label, w.widget )
-                else:
-                    self.layout.addRow( w.widget )
-
-            except AttributeError: #legacy code - delete when possible
-                try: #check if the widget has a label
-                    self.layout.addRow( w.label, w)
-                except AttributeError:
-                    self.layout.addRow( w )
-
-            w.shown = True
-
-    def clear_layout(self):
-        """
-        Remove all objects from layout
+    def record_updates(self, recorder = None):
         """
+        Record the work and wall time of every update cycle from now on, returning the UpdateRecorder
 
-        for i in reversed( range( self.layout.count() ) ):
-            w = self.layout.itemAt(i).widget()
-            self.layout.removeWidget( w )
-            #w.setParent( None )
-            w.deleteLater()
-
-        self.widgets = []
-
-    def update_layout(self):
+        Pass an existing recorder to add to it.  stop_recording() detaches it again.
+        """
 
-        self.update_visibility()
-        
-        for w in self.widgets:
+        from instrumentation import UpdateRecorder
 
-            should_show = self.check_show_conditions(w)
+        self.recorder = recorder or UpdateRecorder()
 
-            if should_show and not w.shown:
-                w.set_visible(True)
+        return self.recorder
 
-            elif not should_show and w.shown:
-                w.set_visible(False)
+    def stop_recording(self):
 
-    def check_show_conditions(self, widget):
+        recorder = self.recorder
+        self.recorder = None
 
-        show = True
+        return recorder
 
-        for condition in widget.show_conditions:
+    def create_box(self,group_name):
 
+        recorder = self.recorder
+        if recorder is not None:
+            start = recorder.begin()
 
-            if condition[0] == "no_next_box": #show only if the next group box has not been initialized
+        #the form opens the group, along with any hidden groups that follow it
+        opened, changed = self.form.open_group(group_name)
 
-                if self.window() is not self: #confirm that the group_box has been initialized
-                    for box in self.window().group_boxes:
-                        if box.group_name == self.next_group_box:
-                            show = False
+        for group in opened:
+            self.add_box(group)
 
-            else:
+        self.apply_changes(changed)
 
-                if self.evaluate_condition(condition) == False:
-                    show = False
+        if recorder is not None:
+            recorder.end(start, "open", "create_box", group_name)
 
-        return show
+        return self.boxes[ opened[0].name ]
 
-    def evaluate_condition(self, condition):
+    def open_all(self):
+        """
+        Open every remaining group of the form at once, as when loading a complete input
 
-        try:
-        
-            #evaluate this condition
-            try:
-                input = input_file.inputs[ condition[0] ]
-            except KeyError:
-                input = None
+        The chain of groups is resolved by the headless form alone.  In lazy mode the new
+        group boxes are placeholders until they are scrolled into view.
+        """
 
-            if condition[1] == "==":
+        recorder = self.recorder
+        if recorder is not None:
+            start_cycle = recorder.begin()
 
-                if input == condition[2]:
-                    return True
-                else:
-                    return False
+        start = len(self.form.groups)
+        changed = []
 
-            elif condition[1] == "!=":
-                
-                if input == condition[2]:
-                    return False
-                else:
-                    return True
+        while self.form.groups[-1].next_group is not None:
+            opened, group_changed = self.form.open_group( self.form.groups[-1].next_group )
+            changed.extend(group_changed)
 
+        for group in self.form.groups[start:]:
+            self.add_box(group, materialize = not self.lazy)
 
-        except TypeError: #the condition must be a list of conditions
-            
-            #evaluate each condition in the list
-            c1 = self.evaluate_condition(condition[0])
-            c2 = self.evaluate_condition(condition[2])
-            
-            if condition[1] == "or":
-                #print("HERE: " + str(c1) + " " + str(c2) + " " + str(c1 or c2))
-                return (c1 or c2)
-
-            elif condition[1] == "and":
-                return (c1 and c2)
-
-    def create_basic_box(self):
-        group_box = self
-
-        #title
-#        widget = InputText( group_box, input_name="title" )
-#        widget.label = QLabel("Title:")
-#        widget.setToolTip('Enter a title for the calculation.\nThis has no impact on the results.')
-#        widget.textChanged.connect( widget.on_text_changed )
-#        self.widgets.append(widget)
-
-        #calculation
-        widget = InputField( group_box, "combo", label_name = "Calculation:", input_name = "calculation")
-        widget.add_combo_choice( "SCF (Self-Consistent Field)", "scf" )
-        widget.add_combo_choice( "NSCF (Non-Self-Consistent Field)", "nscf" ) #replace with maximum_iterations?
-        widget.add_combo_choice( "Bands", "bands" ) #how is this different from NSCF?
-        widget.add_combo_choice( "Geometry Relaxation", "relax" ) #note: includes vc-relax
-        widget.add_combo_choice( "Molecular Dynamics", "md" ) #note: includes vc-md
-
-        #GUI_charge_type
-        widget = InputField( group_box, "combo", label_name = "Charge Type:", input_name = "GUI_charge_type")
-        widget.add_combo_choice( "Neutral", "neutral" )
-        widget.add_combo_choice( "Charged (Counter With Homogenous Background)", "homogeneous" )
-        widget.add_combo_choice( "Charged (Counter With Charged Plate)", "monopole" )
-
-        #tot_charge
-        widget = InputField( group_box, "text", label_name = "System Charge:", input_name = "tot_charge")
-        widget.show_conditions.append( ["GUI_charge_type","!=","neutral"] )
-
-        #GUI_exx_corr (custom)
-        widget = InputField( group_box, "combo", label_name = "Exchange Correction:", input_name = "GUI_exx_corr")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "LDA+U", "dft+u" )
-        widget.add_combo_choice( "LDA+U+J", "dft+u+j" )
-        widget.add_combo_choice( "Hybrid Functional", "hybrid" )
-
-        #vdw_corr
-        widget = InputField( group_box, "combo", label_name = "Van der Waals Correction:", input_name = "vdw_corr")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "Grimme-D2", "grimme-d2" )
-        widget.add_combo_choice( "Tkatchenko-Scheffler", "tkatchenko-scheffler" )
-        widget.add_combo_choice( "XDM", "xdm" )
-
-        #nspin
-        widget = InputField( group_box, "combo", label_name = "Spin Polarization:", input_name = "nspin")
-        widget.add_combo_choice( "None", "1" )
-        widget.add_combo_choice( "Spin-Polarized", "2" )
-        widget.add_combo_choice( "Noncollinear Spin-Polarized", "4" )
-
-        #GUI_efield_type
-        widget = InputField( group_box, "combo", label_name = "Electric Field:", input_name = "GUI_efield_type")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "Saw-Like", "tefield" )
-        widget.add_combo_choice( "Homogeneous", "lefield" )
-
-        #widget = InputField( group_box, "button", label_name = " ", input_name = "Next")
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
-
-        group_box.next_group_box = 'cell'
-
-    #--------------------------------------------------------#
-    # Cell Inputs
-    #--------------------------------------------------------#
-    def create_cell_box(self):
-        group_box = self
-
-        #ibrav
-        widget = InputField( group_box, "combo", label_name = "Lattice Type:", input_name = "ibrav")
-        widget.add_combo_choice( "Custom", "0" )
-        widget.add_combo_choice( "Simple Cubic", "1" )
-        widget.add_combo_choice( "Face-Centered Cubic", "2" )
-        widget.add_combo_choice( "Body-Centered Cubic", "3" )
-        widget.add_combo_choice( "Hexagonal and Trigonal P", "4" )
-        widget.add_combo_choice( "Trigonal R, 3-fold axis c", "5" )
-        widget.add_combo_choice( "Trigonal R, 3-fold axis <111>", "-5" )
-        widget.add_combo_choice( "Tetragonal P", "6" )
-        widget.add_combo_choice( "Tetragonal I", "7" )
-        widget.add_combo_choice( "Orthorhombic P", "8" )
-        widget.add_combo_choice( "Base-Centered Orthorhombic", "9" )
-        widget.add_combo_choice( "Face-Centered Orthorhombic", "10" )
-        widget.add_combo_choice( "Body-Centered Orthorhombic", "11" )
-        widget.add_combo_choice( "Monoclinic P, unique axis c", "12" )
-        widget.add_combo_choice( "Monoclinic P, unique axis b", "-12" )
-        widget.add_combo_choice( "Base-Centered Monoclinic", "13" )
-        widget.add_combo_choice( "Triclinic", "14" )
-
-        #GUI_lattice_vector
-        widget = InputField( group_box, "plain_text", label_name = "Lattice Vector:", input_name = "GUI_lattice_vector")
-        widget.widget.setMaximumHeight(60)
-        
-        #v1
-        #widget = InputField( group_box, "text", label_name = "v1:", input_name = "v1")
-
-        #v2
-        #widget = InputField( group_box, "text", label_name = "v2:", input_name = "v2")
-
-        #v3
-        #widget = InputField( group_box, "text", label_name = "v3:", input_name = "v3")
-
-        #GUI_variable_cell
-        widget = InputField( group_box, "check", label_name = "Cell Relaxation:", input_name = "GUI_variable_cell")
-        widget.show_conditions.append( ["calculation","==","relax"] )
-
-        #GUI_variable_cell
-        widget = InputField( group_box, "check", label_name = "Cell Dynamics:", input_name = "GUI_variable_cell")
-        widget.show_conditions.append( ["calculation","==","md"] )
-
-        #assume_isolated
-        widget = InputField( group_box, "combo", label_name = "Cell Periodicity:", input_name = "assume_isolated")
-        widget.add_combo_choice( "Periodic", "none" )
-        widget.add_combo_choice( "ESM (Effective Screening Medium)", "esm" )
-        widget.add_combo_choice( "Vacuum (Makov-Payne Method)", "makov-payne" )
-        widget.add_combo_choice( "Vacuum (Martyna-Tuckerman Method)", "martyna-tuckerman" )
-
-        #esm_bc
-        widget = InputField( group_box, "combo", label_name = "ESM Boundary Conditions:", input_name = "esm_bc")
-        widget.add_combo_choice( "Periodic", "pbc" )
-        widget.add_combo_choice( "Vacuum-Slab-Vacuum", "bc1" )
-        widget.add_combo_choice( "Metal-Slab-Metal", "bc2" )
-        widget.add_combo_choice( "Vacuum-Slab-Metal", "bc3" )
-        widget.show_conditions.append( ["assume_isolated","==","esm"] )
-
-        #esm_w
-        widget = InputField( group_box, "text", label_name = "Effective Screening Region Offset:", input_name = "esm_w")
-        widget.show_conditions.append( ["assume_isolated","==","esm"] )
-
-        #esm_efield
-        widget = InputField( group_box, "text", label_name = "ESM Electric Field (Ry/a.u.):", input_name = "esm_efield")
-        widget.show_conditions.append( ["assume_isolated","==","esm"] )
-        widget.show_conditions.append( ["esm_bc","==","bc2"] )
-
-        #esm_nfit
-        widget = InputField( group_box, "text", label_name = "Number of ESM Grid Points:", input_name = "esm_nfit")
-        widget.show_conditions.append( ["assume_isolated","==","esm"] )
-
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
-
-        group_box.next_group_box = 'cell dynamics'
-
-
-
-    #--------------------------------------------------------#
-    # Cell Dynamics Inputs
-    #--------------------------------------------------------#
-    def create_celld_box(self):
-        group_box = self
-
-        #cell_dynamics
-        widget = InputField( group_box, "combo", label_name = "cell_dynamics:", input_name = "cell_dynamics")
-        widget.add_combo_choice( "none", "none" )
-        widget.add_combo_choice( "sd", "sd" )
-        widget.add_combo_choice( "damp-pr", "damp-pr" )
-        widget.add_combo_choice( "damp-w", "damp-w" )
-        widget.add_combo_choice( "bfgs", "bfgs" )
-        widget.add_combo_choice( "none", "none" )
-        widget.add_combo_choice( "pr", "pr" )
-        widget.add_combo_choice( "w", "w" )
-
-        #press
-        widget = InputField( group_box, "text", label_name = "press:", input_name = "press")
-
-        #wmass
-        widget = InputField( group_box, "text", label_name = "wmass:", input_name = "wmass")
-
-        #cell_factor
-        widget = InputField( group_box, "text", label_name = "cell_factor:", input_name = "cell_factor")
-
-        #press_conv_thr
-        widget = InputField( group_box, "text", label_name = "press_conv_thr:", input_name = "press_conv_thr")
-
-        #cell_dofree
-        widget = InputField( group_box, "combo", label_name = "cell_dofree:", input_name = "cell_dofree")
-        widget.add_combo_choice( "all", "all" )
-        widget.add_combo_choice( "x", "x" )
-        widget.add_combo_choice( "y", "y" )
-        widget.add_combo_choice( "z", "z" )
-        widget.add_combo_choice( "xy", "xy" )
-        widget.add_combo_choice( "xz", "xz" )
-        widget.add_combo_choice( "yz", "yz" )
-        widget.add_combo_choice( "xyz", "xyz" )
-        widget.add_combo_choice( "shape", "shape" )
-        widget.add_combo_choice( "volume", "volume" )
-        widget.add_combo_choice( "2Dxy", "2Dxy" )
-        widget.add_combo_choice( "2Dshape", "2Dshape" )
-
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
-
-        group_box.next_group_box = 'system'
+        self.apply_changes(changed)
 
-        
+        if recorder is not None:
+            recorder.end(start_cycle, "open", "open_all")
 
+    def add_box(self, group, materialize = True):
+        """
+        Add the group box of an open group to the end of the form
+        """
 
-    #--------------------------------------------------------#
-    # System Inputs
-    #--------------------------------------------------------#
-    def create_system_box(self):
-        group_box = self
+        group_box = InputBox(group, self.input_file, self.reuse_widgets, self.validator)
 
-        #ecutwfc
-        widget = InputField( group_box, "text", label_name = "ecutwfc:", input_name = "ecutwfc")
+        if materialize:
+            group_box.materialize()
+        else:
+            group_box.update_placeholder()
+            self.schedule_materialize()
 
-        #input_dft
-        widget = InputField( group_box, "combo", label_name = "DFT Functional:", input_name = "input_dft")
-        widget.add_combo_choice( "BLYP", "blyp" )
-        widget.add_combo_choice( "PBE", "pbe" )
-        widget.add_combo_choice( "PBE0", "pbe0" )
-        widget.add_combo_choice( "HSE", "hse" )
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        self.group_boxes.append(group_box)
+        self.boxes[group.name] = group_box
 
-        #etot_conv_thr
-        widget = InputField( group_box, "text", label_name = "Energy Convergence:", input_name = "etot_conv_thr")
+        if self.autosave is not None:
+            self.autosave.note_groups( [group.name] )
 
-        #forc_conv_thr
-        widget = InputField( group_box, "text", label_name = "Force Convergence:", input_name = "forc_conv_thr")
-        widget.show_conditions.append( ["calculation","==","relax"] )
+        self.boxes_layout.addWidget(group_box)
 
-        #nstep
-        widget = InputField( group_box, "text", label_name = "Maximum Relaxation Steps:", input_name = "nstep")
-        widget.show_conditions.append( ["calculation","==","relax"] )
+        return group_box
 
-        #nstep
-        widget = InputField( group_box, "text", label_name = "Number of Timesteps:", input_name = "nstep")
-        widget.show_conditions.append( ["calculation","==","md"] )
+    def load_structure(self):
+        """
+        Build the structure of the input file from its cards, and show its table of atoms
 
-        #nbnd
-        widget = InputField( group_box, "text", label_name = "Number of Bands:", input_name = "nbnd")
+        Cards that cannot be read as a structure are kept as they were written, and the reason
+        is shown below the form, which stays usable.
+        """
 
-        #ecutrho
-        widget = InputField( group_box, "text", label_name = "ecutrho:", input_name = "ecutrho")
+        try:
+            structure = self.input_file.load_structure()
+        except (ValueError, IndexError) as error: #a card pw.x would also reject, or one the arrays cannot hold
+            self.show_message( "The atoms are kept as written, without the table of atoms: " + str(error) )
+            return None
 
-        #nr1, nr2, and nr3
-        #nr1s, nr2s, and nr3s
+        if structure is None:
+            return None
 
-        #occupations
-        widget = InputField( group_box, "combo", label_name = "occupations:", input_name = "occupations")
-        widget.add_combo_choice( "Gaussian Smearing", "smearing" )
-        widget.add_combo_choice( "Tetrahedron (Bloechl Method)", "tetrahedra" )
-        widget.add_combo_choice( "Tetrahedron (Linear Method)", "tetrahedra_lin" )
-        widget.add_combo_choice( "Tetrahedron (Kawamura Method)", "tetrahedra_opt" )
-        widget.add_combo_choice( "Fixed", "fixed" )
-        widget.add_combo_choice( "Custom", "from_input" )
+        #the lattice vectors of the structure replace those of the form
+        self.show_inputs( ["ibrav", "GUI_lattice_vector"], "load_structure" )
 
-#NOTE: for occupations, default to 'smearing', unless doing DOS or phonons, in which case use 'tetrahedra_opt' - the Kawamura Method
-        
-        #smearing
-        widget = InputField( group_box, "combo", label_name = "Smearing Method:", input_name = "smearing")
-        widget.add_combo_choice( "Ordinary Gaussian", "gaussian" )
-        widget.add_combo_choice( "Methfessel-Paxton", "methfessel-paxton" )
-        widget.add_combo_choice( "Marzari-Vanderbilt", "marzari-vanderbilt" )
-        widget.add_combo_choice( "Fermi-Dirac", "Fermi-Dirac" )
-        widget.show_conditions.append( ["occupations","==","smearing"] )
-        
-#NOTE: default to Marzari-Vanderbilt 'cold smearing'
+        return self.edit_structure()
 
-        #degauss
-        widget = InputField( group_box, "text", label_name = "degauss:", input_name = "degauss")
-        widget.show_conditions.append( ["occupations","==","smearing"] )
+    def show_message(self, text):
+        """
+        Show a problem below the form
+        """
 
-#NOTE: degauss has suggested values of 0.06-0.10 Ry
+        if self.message_label is None:
+            self.message_label = QLabel()
+            self.message_label.setWordWrap(True)
+            self.message_label.setStyleSheet(ERROR_LABEL_STYLE)
+            self.main_layout.addWidget(self.message_label)
 
-        #exx_fraction
-        widget = InputField( group_box, "text", label_name = "exx_fraction:", input_name = "exx_fraction")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        self.message_label.setText(text)
+        self.message_label.show()
 
-        #ecutfock
-        widget = InputField( group_box, "text", label_name = "ecutfock:", input_name = "ecutfock")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+    def edit_structure(self):
+        """
+        Show the table of atoms of the input file's structure below the form
+        """
 
-        #screening_parameter
-        widget = InputField( group_box, "text", label_name = "screening_parameter:", input_name = "screening_parameter")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        from atom_table import AtomEditor
 
-        #exxdiv_treatment
-        widget = InputField( group_box, "text", label_name = "exxdiv_treatment:", input_name = "exxdiv_treatment")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        if self.atom_editor is None:
+            self.atom_editor = AtomEditor(self.input_file)
+            self.atom_editor.model.value_changed.connect(self.on_structure_changed)
+            self.main_layout.addWidget(self.atom_editor)
+        else:
+            self.atom_editor.set_structure(self.input_file.structure)
 
-        #x_gamma_extrapolation
-        widget = InputField( group_box, "text", label_name = "x_gamma_extrapolation:", input_name = "x_gamma_extrapolation")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        return self.atom_editor
 
-        #ecutvcut
-        widget = InputField( group_box, "text", label_name = "ecutvcut:", input_name = "ecutvcut")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+    def schedule_materialize(self):
+        """
+        Request that the placeholder boxes in view be materialized on the next turn of the event loop
+        """
 
-        #nqx1, nqx2, nqx3
-        widget = InputField( group_box, "text", label_name = "nqx1, nqx2, nqx3:", input_name = "nqx1")
-        widget.show_conditions.append( ["GUI_exx_corr","==","hybrid"] )
+        if not self.materialize_pending:
+            self.materialize_pending = True
+            QTimer.singleShot(0, self.materialize_visible)
 
+    def materialize_visible(self):
+        """
+        Create the widgets of the placeholder boxes within a page of the visible part of the form
+        """
 
+        self.materialize_pending = False
 
+        #geometry is only meaningful once the dialog has been laid out on screen
+        if not self.isVisible():
+            return
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        self.boxes_layout.activate()
 
-        group_box.next_group_box = 'hubbard'
+        page = self.scroll_area.viewport().height()
+        top = self.scroll_area.verticalScrollBar().value() - page
+        bottom = top + 3 * page
 
+        materialized = False
+        for group_box in self.group_boxes:
+            if group_box.materialized or not group_box.shown:
+                continue
+            geometry = group_box.geometry()
+            if geometry.bottom() >= top and geometry.top() <= bottom:
+                group_box.materialize()
+                materialized = True
 
-    #--------------------------------------------------------#
-    # Hubbard Inputs
-    #--------------------------------------------------------#
-    def create_hubbard_box(self):
-        group_box = self
+        #materialized boxes change height, which moves the boxes below them
+        if materialized:
+            self.schedule_materialize()
 
-        #lda_plus_u
-        widget = InputField( group_box, "check", label_name = "DFT+U:", input_name = "lda_plus_u")
+    def showEvent(self, event):
 
-#NOTE: Instead of having a checkbox, just turn DFT+U on if a non-zero U is applied to any species
+        super(Dialog, self).showEvent(event)
+        self.schedule_materialize()
 
-        #lda_plus_u_kind
-        widget = InputField( group_box, "check", label_name = "DFT+U+J:", input_name = "lda_plus_u_kind")
+    def resizeEvent(self, event):
 
-#NOTE: Instead of having a checkbox, just turn DFT+U+J on if a non-zero J is applied to any species
+        super(Dialog, self).resizeEvent(event)
+        self.schedule_materialize()
 
-        #U_projection_type
-        widget = InputField( group_box, "combo", label_name = "U Projection Type:", input_name = "U_projection_type")
-        widget.add_combo_choice( "Atomic", "atomic" )
-        widget.add_combo_choice( "Ortho-Atomic", "ortho-atomic" )
-        widget.add_combo_choice( "Norm-Atomic", "norm-atomic" )
-        widget.add_combo_choice( "File", "file" )
-        widget.add_combo_choice( "Pseudo", "pseudo" )
+    def apply_changes(self, changed):
+        """
+        Show or hide the group boxes and widgets whose shown state has changed in the form
+        """
 
-        #starting_ns_eigenvalue(m,ispin,l)
-        widget = InputField( group_box, "text", label_name = "starting_ns_eigenvalue:", input_name = "starting_ns_eigenvalue")
+        for item in changed:
+            group_box = self.boxes[item.group.name]
+            if isinstance(item, GroupState):
+                group_box.update_visibility()
+                if not group_box.materialized:
+                    self.schedule_materialize()
+            elif group_box.materialized:
+                group_box.update_widget( group_box.widgets[item.index] )
+            else:
+                group_box.update_placeholder()
 
-        #--------------------------------------------------------#
-        # Per-species information
-        #--------------------------------------------------------#
+    def on_input_changed(self, input_name, trigger = None):
+        """
+        Re-evaluate only the group boxes and widgets whose show conditions reference input_name
 
-        #Hubbard_U
-        widget = InputField( group_box, "text", label_name = "U:", input_name = "U")
+        trigger names what changed the input, for the recorder; by default it is the slot of
+        the input's field, as when the user edits it.
+        """
 
-        #Hubbard_J0
-        widget = InputField( group_box, "text", label_name = "J0:", input_name = "J0")
+        recorder = self.recorder
+        if recorder is not None:
+            start = recorder.begin()
 
-        #Hubbard_alpha
-        widget = InputField( group_box, "text", label_name = "alpha:", input_name = "alpha")
+        self.apply_changes( self.form.update(input_name) )
 
-        #Hubbard_beta
-        widget = InputField( group_box, "text", label_name = "beta:", input_name = "beta")
+        self.apply_errors( self.validator.update(input_name) )
 
-        #Hubbard_J
-        widget = InputField( group_box, "text", label_name = "J:", input_name = "J")
+        self.refresh_species_grids(input_name)
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        #an input undone back to a default the form filled in is left for the form to fill in again
+        if self.autosave is not None:
+            input_file = self.input_file
+            if is_structure_name(input_name):
+                self.autosave.note_input( input_name, input_file.structure_changes.get(input_name, MISSING) )
+            else:
+                self.autosave.note_input( input_name, MISSING if input_name in input_file.defaults else input_file.inputs.get(input_name, MISSING) )
 
-        group_box.next_group_box = 'vdw'
+        if recorder is not None:
+            if trigger is None:
+                fields = self.schema.fields.get(input_name)
+                trigger = TRIGGERS.get(fields[0].type) if fields else "set_input"
+            recorder.end( start, "input", trigger, input_name )
 
+    def on_structure_changed(self, name):
+        """
+        Update the form for an atom, or the units of the positions, edited in the table of atoms
+        """
 
+        self.on_input_changed(name, "on_structure_changed")
 
+    def refresh_species_grids(self, input_name):
+        """
+        Show a per-species parameter in the grids, once the input file has set it from the text of its input
+        """
 
-    #--------------------------------------------------------#
-    # VdW Inputs
-    #--------------------------------------------------------#
-    def create_vdw_box(self):
-        group_box = self
+        parameters = self.input_file.species_parameters
+        if parameters is None or input_name not in parameters.rows:
+            return
 
-        #london_rcut
-        widget = InputField( group_box, "text", label_name = "london_rcut:", input_name = "london_rcut")
+        for group_box in self.group_boxes:
+            if group_box.species_grid is not None:
+                group_box.species_grid.model.refresh()
 
-        #ts_vdw_econv_thr
-        widget = InputField( group_box, "text", label_name = "ts_vdw_econv_thr:", input_name = "ts_vdw_econv_thr")
+    def apply_errors(self, input_names):
+        """
+        Show the current error messages on the fields of input_names
+        """
 
-        #ts_vdw_isolated
-        widget = InputField( group_box, "text", label_name = "ts_vdw_isolated:", input_name = "ts_vdw_isolated")
+        if not input_names:
+            return
 
-        #london_s6
-        widget = InputField( group_box, "text", label_name = "london_s6:", input_name = "london_s6")
+        for group_box in self.group_boxes:
+            if not group_box.materialized:
+                continue
+            for input_name in input_names:
+                for w in group_box.fields.get(input_name, ()):
+                    w.display_errors()
 
-        #xdm_a1
-        widget = InputField( group_box, "text", label_name = "xdm_a1:", input_name = "xdm_a1")
+    def open_groups(self, group_names):
+        """
+        Open groups along the chain of next groups until every group of group_names is open,
+        as when restoring an autosaved form
+        """
 
-        #xdm_a2
-        widget = InputField( group_box, "text", label_name = "xdm_a2:", input_name = "xdm_a2")
+        while ( any( name not in self.form.opened for name in group_names )
+                and self.form.groups[-1].next_group is not None ):
+            self.create_box( self.form.groups[-1].next_group )
 
-        #--------------------------------------------------------#
-        # Per-species information
-        #--------------------------------------------------------#
+    def done(self, result):
 
-        #london_c6
-        widget = InputField( group_box, "text", label_name = "london_c6:", input_name = "london_c6")
+        #a form closed on purpose has nothing to restore
+        if self.autosave is not None:
+            self.autosave.close(discard = True)
+            self.autosave = None
 
-        #london_rvdw
-        widget = InputField( group_box, "text", label_name = "london_rvdw:", input_name = "london_rvdw")
+        if self.convergence_panel is not None:
+            self.convergence_panel.stop()
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        #jobs of a closed form are not left running
+        if self.runner is not None:
+            self.runner.close(cancel = True)
 
-        group_box.next_group_box = 'md'
+        super(Dialog, self).done(result)
 
+    def submit_job(self, watch = True):
+        """
+        Queue a job running the current input on self.runner, and return its jobs.Job
 
+        If watch is True, its convergence is shown below the form as it runs.
+        """
 
-    #--------------------------------------------------------#
-    # MD Inputs
-    #--------------------------------------------------------#
-    def create_md_box(self):
-        group_box = self
+        if self.runner is None:
+            return None
 
-        #dt
-        widget = InputField( group_box, "text", label_name = "Timestep:", input_name = "dt")
+        self.scheduler.flush()
 
-        #ion_dynamics
-        widget = InputField( group_box, "combo", label_name = "ion_dynamics:", input_name = "ion_dynamics")
-        widget.add_combo_choice( "verlet", "verlet" )
-        widget.add_combo_choice( "langevin", "langevin" )
-        widget.add_combo_choice( "langevin-smc", "langevin-smc" )
-        widget.show_conditions.append( ["GUI_variable_cell","==",0] )
+        job = self.runner.submit(self.input_file)
 
-        #ion_dynamics
-        widget = InputField( group_box, "combo", label_name = "ion_dynamics:", input_name = "ion_dynamics")
-        widget.add_combo_choice( "beeman", "beeman" )
-        widget.show_conditions.append( ["GUI_variable_cell","==",2] )
+        if watch:
+            self.watch_output(job.output_path, job.done)
 
-        #pot_extrapolation
-        widget = InputField( group_box, "combo", label_name = "Potential Extrapolation:", input_name = "pot_extrapolation")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "Atomic", "atomic" )
-        widget.add_combo_choice( "First-Order", "first_order" )
-        widget.add_combo_choice( "Second-Order", "first_order" )
+        return job
 
-        #wfc_extrapolation
-        widget = InputField( group_box, "combo", label_name = "Wavefunction Extrapolation:", input_name = "wfc_extrapolation")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "First-Order", "first_order" )
-        widget.add_combo_choice( "Second-Order", "first_order" )
+    def on_job_finished(self, job):
+        """
+        Report below the form how a job submitted by submit_job() ended
+        """
 
-        #remove_rigid_rot
-        widget = InputField( group_box, "check", label_name = "remove_rigid_rot:", input_name = "remove_rigid_rot")
-        widget.show_conditions.append( ["assume_isolated","!=","none"] )
+        from jobs import CANCELLED, DONE
 
-        #ion_temperature
-        widget = InputField( group_box, "combo", label_name = "ion_temperature:", input_name = "ion_temperature")
-        widget.add_combo_choice( "rescaling", "rescaling" )
-        widget.add_combo_choice( "rescale-v", "rescale-v" )
-        widget.add_combo_choice( "rescale-T", "rescale-T" )
-        widget.add_combo_choice( "reduce-T", "reduce-T" )
-        widget.add_combo_choice( "berendsen", "berendsen" )
-        widget.add_combo_choice( "andersen", "andersen" )
-        widget.add_combo_choice( "initial", "initial" )
-        widget.add_combo_choice( "not_controlled", "not_controlled" )
+        if job.status == DONE:
+            text = "Job " + job.name + " finished" + ( " (output from the cache)" if job.cached else "" )
+        elif job.status == CANCELLED:
+            text = "Job " + job.name + " cancelled"
+        elif job.error is not None:
+            text = "Job " + job.name + " failed: " + str(job.error)
+        else:
+            text = "Job " + job.name + " failed with exit status " + str(job.returncode)
 
-        #tempw
-        widget = InputField( group_box, "text", label_name = "tempw:", input_name = "tempw")
+        if self.job_label is None:
+            self.job_label = QLabel()
+            self.job_label.setWordWrap(True)
+            self.main_layout.addWidget(self.job_label)
 
-        #tolp
-        widget = InputField( group_box, "text", label_name = "tolp:", input_name = "tolp")
+        self.job_label.setText(text)
+        self.job_label.show()
 
-        #delta_t
-        widget = InputField( group_box, "text", label_name = "delta_t:", input_name = "delta_t")
+    def watch_output(self, path, stop = None):
+        """
+        Show the convergence of the pw.x output file at path below the form, as it is written,
+        against the convergence settings of the current inputs
+        """
 
-        #nraise
-        widget = InputField( group_box, "text", label_name = "nraise:", input_name = "nraise")
+        from convergence_plot import ConvergencePanel
 
-        #refold_pos
-        widget = InputField( group_box, "check", label_name = "refold_pos:", input_name = "refold_pos")
+        if self.convergence_panel is None:
+            self.convergence_panel = ConvergencePanel(self.input_file.inputs)
+            self.main_layout.addWidget(self.convergence_panel)
+        else:
+            self.convergence_panel.set_settings(self.input_file.inputs)
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        self.convergence_panel.watch(path, stop)
 
-        group_box.next_group_box = 'relaxation'
+        return self.convergence_panel
 
+    def undo(self):
+        """
+        Undo the last change to the inputs, and show the restored values
+        """
 
+        #pending updates belong to the change being undone, so they must run first
+        self.scheduler.flush()
 
-    #--------------------------------------------------------#
-    # Ions Inputs NOTE: ONLY FOR RELAXATION CALCULATIONS
-    #--------------------------------------------------------#
-    def create_ions_box(self):
-        group_box = self
+        self.show_inputs( self.input_file.undo(), "undo" )
 
-        #ion_dynamics
-        widget = InputField( group_box, "combo", label_name = "ion_dynamics:", input_name = "ion_dynamics")
-        widget.add_combo_choice( "bfgs", "bfgs" )
-        widget.add_combo_choice( "damp", "damp" )
+    def redo(self):
 
-        #ion_positions
-#        widget = InputField( group_box, "combo", label_name = "ion_positions:", input_name = "ion_positions")
-#        widget.add_combo_choice( "default", "default" )
-#        widget.add_combo_choice( "from_input", "from_input" )
+        self.scheduler.flush()
 
-        #pot_extrapolation
-        widget = InputField( group_box, "combo", label_name = "Potential Extrapolation:", input_name = "pot_extrapolation")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "Atomic", "atomic" )
-        widget.add_combo_choice( "First-Order", "first_order" )
-        widget.add_combo_choice( "Second-Order", "first_order" )
+        self.show_inputs( self.input_file.redo(), "redo" )
 
-        #wfc_extrapolation
-        widget = InputField( group_box, "combo", label_name = "Wavefunction Extrapolation:", input_name = "wfc_extrapolation")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "First-Order", "first_order" )
-        widget.add_combo_choice( "Second-Order", "first_order" )
+    def show_inputs(self, input_names, trigger = None):
+        """
+        Show the current values of input_names in their widgets, and update the form for them
 
-        #remove_rigid_rot
-        widget = InputField( group_box, "check", label_name = "remove_rigid_rot:", input_name = "remove_rigid_rot")
-        widget.show_conditions.append( ["assume_isolated","!=","none"] )
+        trigger names what changed them, as for on_input_changed().
+        """
 
-        #upscale
-        widget = InputField( group_box, "text", label_name = "upscale:", input_name = "upscale")
+        for input_name in input_names:
+            if is_structure_name(input_name):
+                if self.atom_editor is not None:
+                    self.atom_editor.show_change(input_name)
+                continue
+            for group_box in self.group_boxes:
+                if not group_box.materialized:
+                    continue
+                for w in group_box.fields.get(input_name, ()):
+                    if w.widget is not None:
+                        w.display_value()
+
+        for input_name in input_names:
+            self.on_input_changed(input_name, trigger)
 
-        #bfgs_ndim
-        widget = InputField( group_box, "text", label_name = "bfgs_ndim:", input_name = "bfgs_ndim")
+    def on_window_update(self):
+        """
+        Re-evaluate the show conditions of every group box and widget
+        """
 
-        #trust_radius_min
-        widget = InputField( group_box, "text", label_name = "trust_radius_min:", input_name = "trust_radius_min")
+        #print("Window Updating")
 
-        #trust_radius_ini
-        widget = InputField( group_box, "text", label_name = "trust_radius_ini:", input_name = "trust_radius_ini")
+        recorder = self.recorder
+        if recorder is not None:
+            start = recorder.begin()
 
-        #w_1
-        widget = InputField( group_box, "text", label_name = "w_1:", input_name = "w_1")
+        self.form.update_all()
 
-        #w_2
-        widget = InputField( group_box, "text", label_name = "w_2:", input_name = "w_2")
+        for group_box in self.group_boxes:
+            if group_box.materialized:
+                group_box.update_layout()
+            else:
+                group_box.update_placeholder()
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        self.apply_errors( self.validator.update_all() )
 
-        group_box.next_group_box = 'magnetization'
+        #the defaults filled in by the form are filled in again as the groups are restored
+        if self.autosave is not None:
+            defaults = self.input_file.defaults
+            self.autosave.note_inputs( { name: value for name, value in self.input_file.inputs.items() if name not in defaults } )
 
+        if recorder is not None:
+            recorder.end(start, "window", "on_window_update")
 
 
-    #--------------------------------------------------------#
-    # Magnetization Inputs
-    #--------------------------------------------------------#
-    def create_magnetization_box(self):
-        group_box = self
 
-        #tot_magnetization
-        widget = InputField( group_box, "text", label_name = "tot_magnetization:", input_name = "tot_magnetization")
 
-        #starting_spin_angle
-        widget = InputField( group_box, "check", label_name = "starting_spin_angle:", input_name = "starting_spin_angle")
 
-        #constrainted_magnetization
-        widget = InputField( group_box, "combo", label_name = "Magnetization Constraint:", input_name = "constrained_magnetization")
-        widget.add_combo_choice( "None", "none" )
-        widget.add_combo_choice( "Total", "total" )
-        widget.add_combo_choice( "Atomic", "atomic" )
-        widget.add_combo_choice( "Total Direction", "total_direction" )
-        widget.add_combo_choice( "Atomic Direction", "atomic_direction" )
 
-        #fixed_magnetization
-        widget = InputField( group_box, "text", label_name = "fixed_magnetization:", input_name = "fixed_magnetization")
+#not included:
+#nat
+#ntyp
+#london, xdm
+#ortho_para
 
-        #lambda
-        widget = InputField( group_box, "text", label_name = "lambda:", input_name = "lambda")
+#probably shouldn't include:
+#title
+#space_group, uniqueb, origin_choice, rhombohedral
+#ion_positions
 
-        #report
-        widget = InputField( group_box, "text", label_name = "report:", input_name = "report")
+#not sure where to place:
+#no_t_rev
+#force_symmorphic
+#use_all_frac
 
-        #--------------------------------------------------------#
-        # Per-species information
-        #--------------------------------------------------------#
+#one_atom_occupations
 
-        #starting_magnetization
-        widget = InputField( group_box, "text", label_name = "starting_magnetization:", input_name = "starting_magnetization")
+#q2sigma, ecfixed, qcutz
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
 
-        group_box.next_group_box = 'noncollinear'
+class InputBox(QGroupBox):
+    """
+    This class represents a collection of input widgets that 
+    correspond to a single type of input parameter
+    """
+ 
+    def __init__(self, group, input_file, reuse_widgets = True, validator = None):
 
+        #the GroupState of this box in the form
+        self.group = group
 
+        self.group_name = group.name
+        self.next_group_box = group.next_group
 
-    #--------------------------------------------------------#
-    # Noncollinear Inputs
-    #--------------------------------------------------------#
-    def create_noncollinear_box(self):
-        group_box = self
+        self.label = self.group_name + " Information"
 
-        #lspinorb
-        widget = InputField( group_box, "check", label_name = "lspinorb:", input_name = "lspinorb")
+        super(QGroupBox, self).__init__(self.label)
         
-        #--------------------------------------------------------#
-        # Per-species information
-        #--------------------------------------------------------#
-
-        #angle1
-        widget = InputField( group_box, "text", label_name = "angle1:", input_name = "angle1")
-
-        #angle2
-        widget = InputField( group_box, "text", label_name = "angle2:", input_name = "angle2")
-
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
-
-        group_box.next_group_box = 'efield'
-
-
-
-    #--------------------------------------------------------#
-    # Electric Field Inputs
-    #--------------------------------------------------------#
-    def create_efield_box(self):
-        group_box = self
-
-        #tefield
-        widget = InputField( group_box, "check", label_name = "Saw-Like Electric Field:", input_name = "tefield")
-                
-        #edir
-        widget = InputField( group_box, "text", label_name = "edir:", input_name = "edir")
-
-        #emaxpos
-        widget = InputField( group_box, "text", label_name = "emaxpos:", input_name = "emaxpos")
-
-        #eopreg
-        widget = InputField( group_box, "text", label_name = "eopreg:", input_name = "eopreg")
-
-        #eamp
-        widget = InputField( group_box, "text", label_name = "eamp:", input_name = "eamp")
-
-        #dipfield
-        widget = InputField( group_box, "check", label_name = "Dipole Correction:", input_name = "dipfield")
-
-        #lefield
-        widget = InputField( group_box, "check", label_name = "Homogeneous Electric Field:", input_name = "lefield")
-
-        #efield
-        widget = InputField( group_box, "text", label_name = "efield:", input_name = "efield")
-
-        #efield_cart(3)
-        widget = InputField( group_box, "text", label_name = "efield_cart:", input_name = "efield_cart")
-
-        #efield_phase
-        widget = InputField( group_box, "combo", label_name = "efield_phase:", input_name = "efield_phase")
-        widget.add_combo_choice( "Read", "read" )
-        widget.add_combo_choice( "Write", "write" )
-        widget.add_combo_choice( "None", "none" )
-
-        #nberrycyc
-        widget = InputField( group_box, "text", label_name = "nberrycyc:", input_name = "nberrycyc")
-
-        #lorbm
-        widget = InputField( group_box, "check", label_name = "lorbm:", input_name = "lorbm")
-
-        #lberry
-        widget = InputField( group_box, "check", label_name = "lberry:", input_name = "lberry")
-
-        #gdir
-        widget = InputField( group_box, "combo", label_name = "gdir:", input_name = "gdir")
-        widget.add_combo_choice( "First Reciprocal Lattice Vector", "1" )
-        widget.add_combo_choice( "First Reciprocal Lattice Vector", "2" )
-        widget.add_combo_choice( "First Reciprocal Lattice Vector", "3" )
-
-        #nppstr
-        widget = InputField( group_box, "text", label_name = "nppstr:", input_name = "nppstr")
-
-        #lfcpopt
-        widget = InputField( group_box, "check", label_name = "lfcpopt:", input_name = "lfcpopt")
-
-        #fcp_mu
-        widget = InputField( group_box, "text", label_name = "fcp_mu:", input_name = "fcp_mu")
-
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
-
-        group_box.next_group_box = 'monopole'
-
-
-    #--------------------------------------------------------#
-    # Monopole Inputs
-    #--------------------------------------------------------#
-    def create_monopole_box(self):
-        group_box = self
-
-        #monopole
-        widget = InputField( group_box, "check", label_name = "monopole:", input_name = "monopole")
-
-        #zmon
-        widget = InputField( group_box, "text", label_name = "zmon:", input_name = "zmon")
-
-        #realxz
-        widget = InputField( group_box, "check", label_name = "realxz:", input_name = "realxz")
-
-        #block
-        widget = InputField( group_box, "check", label_name = "block:", input_name = "block")
-
-        #block_1
-        widget = InputField( group_box, "text", label_name = "block_1:", input_name = "block_1")
-
-        #block_2
-        widget = InputField( group_box, "text", label_name = "block_2:", input_name = "block_2")
-
-        #block_height
-        widget = InputField( group_box, "text", label_name = "block_height:", input_name = "block_height")
+        self.layout = QFormLayout()
+        self.layout.setFormAlignment(Qt.AlignLeft)
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
 
-        group_box.next_group_box = 'kpoint'
+        #self.layout.setSpacing(0)
 
 
+        self.widgets = []
 
-    #--------------------------------------------------------#
-    # K-Point Inputs
-    #--------------------------------------------------------#
-    def create_kpoint_box(self):
-        group_box = self
-        
-        #nosym
-        widget = InputField( group_box, "text", label_name = "nosym:", input_name = "nosym")
+        #the widgets of each input name, which a few inputs have more than one of
+        self.fields = {}
 
-        #nosym_evc
-        widget = InputField( group_box, "text", label_name = "nosym_evc:", input_name = "nosym_evc")
+        #tracks which of self.widgets currently occupy a row of self.layout
+        self.rows = RowModel()
 
-        #noinv
-        widget = InputField( group_box, "text", label_name = "noinv:", input_name = "noinv")
+        self.input_file = input_file
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+        #Validator whose messages are shown on the widgets, or None
+        self.validator = validator
 
-        group_box.next_group_box = 'electrons'
-        
+        #hide rows instead of destroying their widgets
+        self.reuse_widgets = reuse_widgets
 
+        self.shown = True
 
-    #--------------------------------------------------------#
-    # Electrons Inputs
-    #--------------------------------------------------------#
-    def create_electrons_box(self):
-        group_box = self
+        #have the widgets of this box been created? Until then the box is an empty placeholder
+        self.materialized = False
 
-        #GUI_convergence_standards
-        widget = InputField( group_box, "combo", label_name = "Convergence Standards:", input_name = "GUI_convergence_standards")
-        widget.add_combo_choice( "Low", "low" )
-        widget.add_combo_choice( "Medium", "medium" )
-        widget.add_combo_choice( "High", "high" )
-        widget.add_combo_choice( "Custom", "custom" )
+        #species_grid.SpeciesGrid of the per-species inputs of this group, or None if it has none
+        self.species_grid = None
 
-        #electron_maxstep
-        widget = InputField( group_box, "text", label_name = "electron_maxstep:", input_name = "electron_maxstep")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
 
-        #scf_must_converge
-        widget = InputField( group_box, "check", label_name = "scf_must_converge:", input_name = "scf_must_converge")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+    def materialize(self):
+        """
+        Create the widgets of this box, if they have not been created yet
+        """
 
-        #conv_thr
-        widget = InputField( group_box, "text", label_name = "conv_thr:", input_name = "conv_thr")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+        if self.materialized:
+            return
 
-        #adaptive_thr
-        widget = InputField( group_box, "check", label_name = "adaptive_thr:", input_name = "adaptive_thr")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+        self.materialized = True
 
-        #conv_thr_init
-        widget = InputField( group_box, "text", label_name = "conv_thr_init:", input_name = "conv_thr_init")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+        self.setMinimumHeight(0)
+        self.initialize_widgets()
+        self.setLayout(self.layout)
 
-        #conv_thr_multi
-        widget = InputField( group_box, "text", label_name = "conv_thr_multi:", input_name = "conv_thr_multi")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+    def update_placeholder(self):
+        """
+        Size an unmaterialized box by the number of rows it will show, so that the
+        scroll area is about as long as it will be once every box is materialized
+        """
 
-        #diago_thr_init
-        widget = InputField( group_box, "text", label_name = "diago_thr_init:", input_name = "diago_thr_init")
-        widget.show_conditions.append( ["GUI_convergence_standards","==","custom"] )
+        self.update_visibility()
 
-        #GUI_convergence_acceleration
-        widget = InputField( group_box, "combo", label_name = "Convergence Acceleration:", input_name = "GUI_convergence_acceleration")
-        widget.add_combo_choice( "Default", "default" )
-        widget.add_combo_choice( "Custom", "custom" )
+        rows = sum( 1 for field in self.group.fields if field.shown )
+        self.setMinimumHeight( PLACEHOLDER_MARGIN + rows * PLACEHOLDER_ROW_HEIGHT )
 
-        #mixing_mode
-        widget = InputField( group_box, "combo", label_name = "mixing_mode:", input_name = "mixing_mode")
-        widget.add_combo_choice( "Plain", "plain" )
-        widget.add_combo_choice( "TF", "TF" )
-        widget.add_combo_choice( "Local-TF", "local-TF" )
-        widget.show_conditions.append( ["GUI_convergence_acceleration","==","custom"] )
+    def initialize_widgets(self):
+        """
+        Add GUI elements for each of the input parameters associated with self.group_name
+        """
 
-        #mixing_beta
-        widget = InputField( group_box, "text", label_name = "mixing_beta:", input_name = "mixing_beta")
-        widget.show_conditions.append( ["GUI_convergence_acceleration","==","custom"] )
+        for state in self.group.fields:
+            InputField(self, state)
 
-        #mixing_ndim
-        widget = InputField( group_box, "text", label_name = "mixing_ndim:", input_name = "mixing_ndim")
-        widget.show_conditions.append( ["GUI_convergence_acceleration","==","custom"] )
+        self.apply_layout()
+        self.add_species_grid()
+        self.update_layout()
 
-        #mixing_fixed_ns
-        widget = InputField( group_box, "text", label_name = "mixing_fixed_ns:", input_name = "mixing_fixed_ns")
-        widget.show_conditions.append( ["GUI_convergence_acceleration","==","custom"] )
+    def add_species_grid(self):
+        """
+        Add a grid of the per-species inputs of this group below its fields, one row per species
+        """
 
-        #diagonalization
-        widget = InputField( group_box, "combo", label_name = "diagonalization:", input_name = "diagonalization")
-        widget.add_combo_choice( "david", "david" )
-        widget.add_combo_choice( "cg", "cg" )
+        fields = [ state.schema for state in self.group.fields if state.schema.per_species ]
+        if not fields:
+            return
 
-        #diago_cg_maxiter
-        widget = InputField( group_box, "text", label_name = "diago_cg_maxiter:", input_name = "diago_cg_maxiter")
-        widget.show_conditions.append( ["diagonalization","==","cg"] )
+        #imported here, so that numpy is only loaded once a group with per-species inputs is opened
+        from species_grid import SpeciesGrid
 
-        #diago_david_ndim
-        widget = InputField( group_box, "text", label_name = "diago_david_ndim:", input_name = "diago_david_ndim")
-        widget.show_conditions.append( ["diagonalization","==","david"] )
+        parameters = self.input_file.species_parameters
+        if parameters is None:
+            parameters = self.input_file.load_species_parameters()
 
-        #diago_full_acc
-        widget = InputField( group_box, "text", label_name = "diago_full_acc:", input_name = "diago_full_acc")
+        structure = self.input_file.structure
+        species_names = None if structure is None else [ species.name for species in structure.species ]
 
-        #startingpot
-        widget = InputField( group_box, "combo", label_name = "startingpot:", input_name = "startingpot")
-        widget.add_combo_choice( "atomic", "atomic" )
-        widget.add_combo_choice( "file", "file" )
+        labels = [ ( field.label_name or field.input_name ).rstrip(":") for field in fields ]
 
-        #startingwfc
-        widget = InputField( group_box, "combo", label_name = "startingwfc:", input_name = "startingwfc")
-        widget.add_combo_choice( "atomic", "atomic" )
-        widget.add_combo_choice( "atomic+random", "atomic+random" )
-        widget.add_combo_choice( "random", "random" )
-        widget.add_combo_choice( "file", "file" )
+        self.species_grid = SpeciesGrid( parameters, [ field.input_name for field in fields ], labels, species_names )
+        self.species_grid.model.parameters_changed.connect(self.on_species_changed)
+        COUNTERS.created += 1
 
-        #tqr
-        widget = InputField( group_box, "check", label_name = "tqr:", input_name = "tqr")
+        self.layout.addRow( QLabel("Per Species:"), self.species_grid )
 
-        widget = InputField( group_box, "button", input_name = "Next")
-        widget.show_conditions.append( ["no_next_box"] )
+    def on_species_changed(self, input_names):
+        """
+        Set the text inputs of per-species parameters edited in the grid
+        """
 
-        group_box.next_group_box = 'print'
+        window = self.window()
+        window.scheduler.flush()
 
+        parameters = self.input_file.species_parameters
 
+        #a paste or a change in the number of species is undone as one step
+        history = self.input_file.history
+        if history is not None:
+            history.begin_group()
+        try:
+            for input_name in input_names:
+                self.input_file.set_input( input_name, parameters.text(input_name) )
+        finally:
+            if history is not None:
+                history.end_group()
 
-    #--------------------------------------------------------#
-    # Print Inputs
-    #--------------------------------------------------------#
-    def create_print_box(self):
-        group_box = self
+        window.show_inputs(input_names, "on_species_changed")
 
-        #disk_io
-        widget = InputField( group_box, "combo", label_name = "disk_io:", input_name = "disk_io")
-        widget.add_combo_choice( "High", "high" )
-        widget.add_combo_choice( "Medium", "medium" )
-        widget.add_combo_choice( "Low", "low" )
-        widget.add_combo_choice( "None", "none" )
+    def update_visibility(self):
 
-        #verbosity
-        widget = InputField( group_box, "check", label_name = "Verbosity:", input_name = "verbosity")
+        #show or hide this group box as decided by the form
+        if self.group.shown:
+            self.setVisible(True)
+            self.shown = True
+        else:
+            self.setVisible(False)
+            self.shown = False
 
-        #restart_mode
-        widget = InputField( group_box, "check", label_name = "restart_mode:", input_name = "restart_mode")
+    def apply_layout(self):
 
-        #wf_collect - just set to .true.
-        widget = InputField( group_box, "check", label_name = "wf_collect:", input_name = "wf_collect")
+        for w in self.widgets:
 
-        #max_seconds
-        widget = InputField( group_box, "text", label_name = "Checkpoint Time (hrs):", input_name = "max_seconds")
+            try:
+                if w.label:
+                    self.layout.addRow( w.label, w.widget )
+                else:
+                    self.layout.addRow( w.widget )
 
-        #iprint
-        widget = InputField( group_box, "text", label_name = "iprint:", input_name = "iprint")
+            except AttributeError: #legacy code - delete when possible
+                try: #check if the widget has a label
+                    self.layout.addRow( w.label, w)
+                except AttributeError:
+                    self.layout.addRow( w )
 
-        #outdir
-        widget = InputField( group_box, "text", label_name = "Output Directory:", input_name = "outdir")
+            w.shown = True
+            self.rows.set_occupied(w.index, True)
 
-        #wfcdir
-        widget = InputField( group_box, "text", label_name = "Scratch Directory:", input_name = "wfcdir")
+    def clear_layout(self):
+        """
+        Remove all objects from layout
+        """
 
-        #pseudo_dir
-        widget = InputField( group_box, "text", label_name = "Pseudopotential Directory:", input_name = "pseudo_dir")
+        for i in reversed( range( self.layout.count() ) ):
+            w = self.layout.itemAt(i).widget()
+            self.layout.removeWidget( w )
+            #w.setParent( None )
+            w.deleteLater()
+            COUNTERS.destroyed += 1
 
-        #prefix
-        widget = InputField( group_box, "text", label_name = "Prefix:", input_name = "prefix")
+        self.widgets = []
+        self.fields = {}
+        self.rows = RowModel()
+        self.species_grid = None
 
-        #tstress
-        widget = InputField( group_box, "check", label_name = "tstress:", input_name = "tstress")
+    def update_layout(self):
 
-        #tprnfor
-        widget = InputField( group_box, "check", label_name = "tprnfor:", input_name = "tprnfor")
+        self.update_visibility()
+        
+        for w in self.widgets:
+            self.update_widget(w)
 
-        #lkpoint_dir
-        widget = InputField( group_box, "check", label_name = "lkpoint_dir:", input_name = "lkpoint_dir")
+    def update_widget(self, w):
 
-        widget = InputField( group_box, "button", input_name = "Next")
+        should_show = w.state.shown
 
-        group_box.next_group_box = '???'
+        if should_show and not w.shown:
+            w.set_visible(True)
 
+        elif not should_show and w.shown:
+            w.set_visible(False)
 
+        #the grid only has a column for the per-species inputs that are shown
+        if self.species_grid is not None and w.state.schema.per_species:
+            self.species_grid.set_parameter_shown( w.input_name, should_show )
 
-    def on_update(self):
+    def on_update(self, input_name = None):
 
         #print("Box updating")
         #print(self)
         #print(self.window())
 
-        self.window().on_window_update()
+        #run any coalesced updates first, so that they are applied in order
+        self.window().scheduler.flush()
+
+        if input_name is None:
+            self.window().on_window_update()
+        else:
+            self.window().on_input_changed(input_name)
+
+    def schedule_update(self, input_name):
+        """
+        Request an update for input_name, to be coalesced with other pending updates
+        """
+
+        self.window().scheduler.schedule(input_name)
 
         #self.update_layout()
 
@@ -1222,41 +881,47 @@ class InputField():
     This class manages input fields of all types
     """
 
-    def __init__(self, parent_, type, label_name = None, input_name = None):
+    def __init__(self, parent_, state):
 
-        self.type = type
-        self.label_name = label_name
-        self.input_name = input_name
+        #the FieldState of this field in the form
+        self.state = state
+
+        self.type = state.type
+        self.label_name = state.schema.label_name
+        self.input_name = state.input_name
 
         #is this widget currently being shown to the user?
         self.shown = False
 
-        #conditions under which this text box should be shown
-        self.show_conditions = []
-
         #list of all possible combo choices
-        self.combo_choices = []
+        self.combo_choices = state.schema.choices
 
         self.group_box = parent_
 
+        #position of this field within the group box
+        self.index = len(self.group_box.widgets)
+
         self.group_box.widgets.append(self)
+        self.group_box.fields.setdefault(self.input_name, []).append(self)
+        self.group_box.rows.append()
 
         self.initialize_widget()
 
-        self.initialize_value()
-
     def initialize_widget(self):
 
         if self.label_name:
             self.label = QLabel(self.label_name)
             #self.label.setAlignment(Qt.AlignLeft)
+            COUNTERS.created += 2
         else:
             self.label = None
+            COUNTERS.created += 1
 
         if self.type == "text":
 
             self.widget = InputText(self.group_box, self.input_name)
             self.widget.textChanged.connect( self.widget.on_text_changed )
+            self.widget.editingFinished.connect( self.widget.on_editing_finished )
 
         elif self.type == "plain_text":
 
@@ -1266,6 +931,8 @@ class InputField():
         elif self.type == "combo":
 
             self.widget = InputCombo(self.group_box, self.input_name)
+            for label, name in self.combo_choices:
+                self.add_combo_choice(label, name)
             self.widget.currentIndexChanged.connect( self.widget.on_index_changed )
             
         elif self.type == "check":
@@ -1279,78 +946,146 @@ class InputField():
 #            self.widget.clicked.connect( self.group_box.on_click )
             self.widget.clicked.connect( self.widget.on_click )
 
-    def initialize_value(self):
+        if self.state.schema.max_height:
+            self.widget.setMaximumHeight(self.state.schema.max_height)
+
+        self.display_value()
+
+    def display_value(self):
+        """
+        Show the current value of this field's input in its widget
+        """
+
+        value = self.group_box.input_file.inputs.get(self.input_name)
+
+        #the input already holds this value, so the widget should not report a change
+        self.widget.blockSignals(True)
 
         if self.type == "text":
 
-            self.group_box.input_file.inputs[self.input_name] = ""
+            self.widget.setText(value)
 
         elif self.type == "plain_text":
 
-            self.group_box.input_file.inputs[self.input_name] = ""            
+            self.widget.setPlainText(value)
 
         elif self.type == "combo":
 
-            pass #must wait until an item is added before initializing this value
+            self.widget.setCurrentIndex( max( self.widget.findData(value), 0 ) )
             
         elif self.type == "check":
 
-            self.group_box.input_file.inputs[self.input_name] = 0
-            
-        elif self.type == "button":
+            self.widget.setCheckState(value)
 
-            pass
-        
-    def add_combo_choice(self, label, name):
-        
-        self.widget.currentIndexChanged.disconnect()
-        self.widget.addItem( label, userData = name )
-        self.widget.currentIndexChanged.connect( self.widget.on_index_changed )
+        self.widget.blockSignals(False)
 
-        #self.combo_choices.append( (label,name) )
-        self.combo_choices.append( (label,name) )
+        self.display_errors()
 
+    def display_errors(self):
+        """
+        Mark this field's widget and label if the validator reports errors for its input
+        """
 
-        #if this is the first choice, initialize the value associated with this widget
-        if len(self.combo_choices) == 1:
+        validator = self.group_box.validator
 
-            self.group_box.input_file.inputs[self.input_name] = self.widget.itemData(0)
+        #widgets destroyed while hidden show their errors when they are created again
+        if validator is None or self.widget is None or self.type == "button":
+            return
 
+        messages = validator.messages(self.input_name)
+        tooltip = "\n".join(messages)
 
+        #only touch the style when it changes, since restyling a widget is not cheap
+        if tooltip == self.widget.toolTip():
+            return
+
+        self.widget.setToolTip(tooltip)
+        self.widget.setStyleSheet(ERROR_WIDGET_STYLE if messages else "")
+        if self.label:
+            self.label.setToolTip(tooltip)
+            self.label.setStyleSheet(ERROR_LABEL_STYLE if messages else "")
+        
+    def add_combo_choice(self, label, name):
+        
+        #adding the first item changes the current index, which should not trigger an update
+        self.widget.blockSignals(True)
+        self.widget.addItem( label, userData = name )
+        self.widget.blockSignals(False)
 
     def set_visible(self, visible):
+
+        if visible:
+            COUNTERS.shown += 1
+        else:
+            COUNTERS.hidden += 1
+
+        if self.group_box.reuse_widgets:
+            #keep the widgets alive and only hide or show them
+            self.widget.setVisible(visible)
+            if self.label:
+                self.label.setVisible(visible)
+            self.shown = visible
+            return
         
+        rows = self.group_box.rows
+
         if visible:
             #create a new widget
             self.initialize_widget()
             self.shown = True
 
-            #determine where this new row needs to be inserted
-            index = self.group_box.widgets.index(self)
+            #insert the new row after the rows of the preceding visible fields
+            row = rows.row(self.index)
 
             if self.label:
-                self.group_box.layout.insertRow( index, self.label, self.widget )
+                self.group_box.layout.insertRow( row, self.label, self.widget )
             else:
-                self.group_box.layout.insertRow( index, self.widget )
+                self.group_box.layout.insertRow( row, self.widget )
 
-            if self.type == "combo":
-                #add all of the combo choices to the new widget
-                temp_choices = [ self.combo_choices[i] for i in range(len(self.combo_choices)) ]
-                self.combo_choices = []
-                for combo_choice in temp_choices:
-                    self.add_combo_choice(combo_choice[0],combo_choice[1])
+            rows.set_occupied(self.index, True)
 
         else:
-            #delete this widget
+            #remove this row from the layout and delete its widgets
+            self.group_box.layout.takeRow( rows.row(self.index) )
+            rows.set_occupied(self.index, False)
+
             self.widget.deleteLater()
             self.widget = None
             self.shown = False
+            COUNTERS.destroyed += 1
             if self.label:
                 self.label.deleteLater()
                 self.label = None
+                COUNTERS.destroyed += 1
                 
 
 
+def is_history_shortcut(event):
+    """
+    Return whether event asks a text widget to handle the undo or redo shortcut itself
+
+    Text widgets keep their own undo history by default; declining the override
+    leaves the key to the Dialog's shortcuts, which undo through the form's history.
+    """
+
+    if event.type() != QEvent.ShortcutOverride:
+        return False
+
+    if event.matches(QKeySequence.Undo) or event.matches(QKeySequence.Redo):
+        event.ignore()
+        return True
+
+    return False
+
+def end_history_step(input_file):
+    """
+    End the history step of a text field left by the user, so that typing into it again,
+    however soon, is undone on its own rather than with the text typed before
+    """
+
+    if input_file.history is not None:
+        input_file.history.checkpoint()
+
 class InputText(QLineEdit):
     """
     This class represents a text box in the GUI
@@ -1361,21 +1096,26 @@ class InputText(QLineEdit):
 
         self.input_name = input_name
 
-        #initialize the input text
-        try:
-            text = self.parent().input_file.inputs[self.input_name]
-            self.setText(text)
-        except KeyError:
-            pass
+    def event(self, event):
+
+        if is_history_shortcut(event):
+            return False
+
+        return super(InputText, self).event(event)
 
     @pyqtSlot(str)
     def on_text_changed(self, string):
         
-        self.parent().input_file.inputs[self.input_name] = string
-        self.parent().on_update()
+        self.parent().input_file.set_input(self.input_name, string)
+        self.parent().schedule_update(self.input_name)
 
         #print(input_file.inputs)
 
+    @pyqtSlot()
+    def on_editing_finished(self):
+
+        end_history_step(self.parent().input_file)
+
 class InputPlainText(QPlainTextEdit):
     """
     This class represents a multi-line text box in the GUI
@@ -1386,18 +1126,27 @@ class InputPlainText(QPlainTextEdit):
 
         self.input_name = input_name
 
-        #initialize the input text
-        try:
-            text = self.parent().input_file.inputs[self.input_name]
-            self.setText(text)
-        except KeyError:
-            pass
+        #undo and redo are kept by the form's history, across every field
+        self.setUndoRedoEnabled(False)
+
+    def event(self, event):
+
+        if is_history_shortcut(event):
+            return False
+
+        return super(InputPlainText, self).event(event)
 
     @pyqtSlot()
     def on_text_changed(self):
         
-        self.parent().input_file.inputs[self.input_name] = self.toPlainText()
-        self.parent().on_update()
+        self.parent().input_file.set_input(self.input_name, self.toPlainText())
+        self.parent().schedule_update(self.input_name)
+
+    def focusOutEvent(self, event):
+
+        end_history_step(self.parent().input_file)
+
+        super(InputPlainText, self).focusOutEvent(event)
 
 
 class InputCombo(QComboBox):
@@ -1413,8 +1162,8 @@ class InputCombo(QComboBox):
     @pyqtSlot(int)
     def on_index_changed(self, index):
         
-        self.parent().input_file.inputs[self.input_name] = self.itemData(index)
-        self.parent().on_update()
+        self.parent().input_file.set_input(self.input_name, self.itemData(index))
+        self.parent().on_update(self.input_name)
 
 class InputCheck(QCheckBox):
     """
@@ -1429,8 +1178,8 @@ class InputCheck(QCheckBox):
     @pyqtSlot(int)
     def on_state_changed(self, value):
         
-        self.parent().input_file.inputs[self.input_name] = value
-        self.parent().on_update()
+        self.parent().input_file.set_input(self.input_name, value)
+        self.parent().on_update(self.input_name)
 
 class InputButton(QPushButton):
     """
@@ -1450,7 +1199,6 @@ class InputButton(QPushButton):
 
         #create the next group box
         self.parent().window().create_box(self.parent().next_group_box)
-        self.parent().on_update()
 
 
 
@@ -1461,27 +1209,177 @@ class InputButton(QPushButton):
 
 
 
-class QuantumEspressoInputFile():
+class RowModel():
     """
-    This class holds all of the information associated with a QE input file
+    This class tracks which widgets of a group box occupy a row of its layout
+
+    It is a Fenwick tree over the widgets in order, so the layout row of any
+    widget can be found, and a row marked as added or removed, in O(log n)
     """
- 
+
     def __init__(self):
 
-        self.inputs = {}
+        #whether each widget currently occupies a row
+        self.occupied = []
 
-    def set_input(self, name, value):
+        #Fenwick tree of the occupied flags (1-based; self.tree[0] is unused)
+        self.tree = [0]
 
-        self.inputs[name] = value
+    def append(self, occupied = False):
+        """
+        Add a widget after all existing widgets
+        """
+
+        i = len(self.tree)
+
+        #the new node covers the widgets in (i - lowbit(i), i]
+        total = int(occupied)
+        j = i - 1
+        while j > i - (i & -i):
+            total += self.tree[j]
+            j -= j & -j
+
+        self.tree.append(total)
+        self.occupied.append(occupied)
+
+    def set_occupied(self, index, occupied):
+
+        if self.occupied[index] == occupied:
+            return
+
+        self.occupied[index] = occupied
+
+        delta = 1 if occupied else -1
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def row(self, index):
+        """
+        Return the layout row of the widget at index, which is the number of
+        preceding widgets that occupy a row
+        """
+
+        total = 0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+
+
+
+
+
+class UpdateScheduler():
+    """
+    This class coalesces bursts of input changes into a single update of the form
+    """
+
+    def __init__(self, dialog, interval = 0):
+
+        self.dialog = dialog
+
+        #names of the inputs changed since the last update, in order of first change
+        self.pending = {}
+
+        #restarted on every change, so the update runs after a quiet interval
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect( self.flush )
+
+    def schedule(self, input_name):
+
+        self.pending[input_name] = None
+        self.timer.start()
+
+    def flush(self):
+        """
+        Run the pending updates now
+        """
+
+        self.timer.stop()
+
+        pending = self.pending
+        self.pending = {}
+
+        for input_name in pending:
+            self.dialog.on_input_changed(input_name)
 
 
 
 
 
 
- 
 if __name__ == '__main__':
+    #with --profile-startup (or --profile-startup=json), the time of each step of startup is
+    #reported once the form is built, and the form closes
+    #with --instrument=dump.json, every update cycle is recorded and written to dump.json on closing
+    #with --run (or --run="command -in {input}"), Ctrl+R runs pw.x (or the command) on the input,
+    #in a directory under ./jobs; an input that has run before takes its output from the input cache
+    instrument_path = None
+    runner = None
+    for argument in sys.argv[1:]:
+        if argument.startswith("--profile-startup"):
+            PROFILE.enabled = True
+            PROFILE.format = argument.partition("=")[2] or "text"
+        elif argument.startswith("--instrument="):
+            instrument_path = argument.partition("=")[2]
+        elif argument.startswith("--run"):
+            from input_cache import InputCache
+            from jobs import JobRunner
+            runner = JobRunner( "jobs", argument.partition("=")[2] or None, cache = InputCache() )
+    arguments = [ argument for argument in sys.argv[1:] if not argument.startswith( ("--profile-startup", "--instrument=", "--run") ) ]
+
     app = QApplication(sys.argv)
-    input_file = QuantumEspressoInputFile()
-    dialog = Dialog(input_file)
-sys.exit(dialog.exec_())
+    PROFILE.mark("QApplication")
+
+    #a form carries on from the autosave journal of a session of the same input, or of a new form,
+    #that did not close; while another session has the journal, or in a profiling run, the form
+    #is not autosaved
+    input_path = arguments[0] if arguments else None
+    journal_path = groups = None
+    if not PROFILE.enabled:
+        from autosave import journal_path as autosave_journal_path, lock_journal, restore
+        journal_path = autosave_journal_path(input_path)
+        if not lock_journal(journal_path):
+            journal_path = None
+
+    #the window is shown empty first, and its group boxes are built once it has painted
+    if arguments:
+        #open an existing pw.x input with every group, creating the widgets as they come into view
+        from pw_reader import read_input
+        input_file = read_input(input_path)
+        PROFILE.mark("read input")
+        if journal_path is not None:
+            restore(input_file, journal_path)
+        dialog = Dialog(input_file, lazy = True, autosave_path = journal_path, defer_boxes = True, runner = runner)
+        dialog.defer(dialog.open_all)
+        if "ATOMIC_SPECIES" in input_file.cards and "ATOMIC_POSITIONS" in input_file.cards:
+            #building the structure imports numpy, which can wait until the window is up
+            dialog.defer(dialog.load_structure)
+        elif input_file.structure is not None: #built to restore the edits made to its atoms
+            dialog.defer(dialog.edit_structure)
+    else:
+        input_file = QuantumEspressoInputFile()
+        if journal_path is not None:
+            groups = restore(input_file, journal_path)
+        dialog = Dialog(input_file, autosave_path = journal_path, defer_boxes = True, runner = runner)
+        if groups:
+            dialog.defer( lambda: dialog.open_groups(groups) )
+
+    if instrument_path:
+        dialog.record_updates()
+
+    PROFILE.mark("Dialog created")
+    dialog.show()
+    result = dialog.exec_()
+
+    if instrument_path:
+        dialog.recorder.dump(instrument_path)
+
+    sys.exit(result)